@@ -19,15 +19,19 @@
  *                                                                         *
  ***************************************************************************/
 """
+import hashlib
 import json
 import os
 
 from PyQt5.QtCore import QDir
+from qgis.core import QgsProject
 
-from .conf import DEBUG_MODE
+from .conf import DEBUG_MODE, PLUGIN_VERSION
 from .datamanager import ImageManager
 from .builddem import DEMLayerBuilder
 from .buildvector import VectorLayerBuilder
+from .exportmanifest import ExportManifest
+from .texturecache import layerFingerprint, mapSettingsFingerprint
 from . import q3dconst
 from . import qgis2threejstools as tools
 
@@ -95,14 +99,23 @@ class ThreeJSBuilder:
 
 class ThreeJSExporter(ThreeJSBuilder):
 
+  # DEM layer properties which are used only to build block textures
+  DEM_TEXTURE_PROPERTIES = ["radioButton_MapCanvas", "radioButton_LayerImage", "radioButton_ImageFile", "radioButton_SolidColor",
+                            "layerImageIds", "lineEdit_ImageFile", "colorButton_Color", "spinBox_Opacity",
+                            "checkBox_TransparentBackground", "comboBox_ImageFormat", "spinBox_ImageQuality"]
+
   def __init__(self, settings, progress=None):
     ThreeJSBuilder.__init__(self, settings, progress)
 
-    self._index = -1
-
     self.modelManagers = []
 
-  def export(self):
+    self.manifest = None
+    self.layerIds = None
+    self.sceneFingerprint = None
+
+  def export(self, layerIds=None):
+    """layerIds: ids of layers to be built. other layers are not rebuilt if they have been exported
+                 into the output directory. if None, layers changed since previous export are built."""
     config = self.settings.templateConfig()
 
     # create output data directory if not exists
@@ -110,11 +123,25 @@ class ThreeJSExporter(ThreeJSBuilder):
     if not QDir(dataDir).exists():
       QDir().mkpath(dataDir)
 
+    self.manifest = ExportManifest(dataDir, "./data/{0}/".format(self.settings.outputFileTitle()))
+    self.layerIds = layerIds
+
+    json_object = self.buildScene(False)
+    self.sceneFingerprint = json.dumps([PLUGIN_VERSION, json_object["properties"], self.settings.sceneProperties(),
+                                        self.settings.materialType(), self.settings.base64], sort_keys=True, default=str)
+
     # write scene data to a file in json format
-    json_object = self.buildScene()
+    json_object["layers"] = self.buildLayers()
     with open(os.path.join(dataDir, "scene.json"), "w", encoding="utf-8") as f:
       json.dump(json_object, f, indent=2 if DEBUG_MODE else None)
 
+    # wait for image files to be written, and then update the manifest
+    self.imageManager.flush()
+    self.manifest.save()
+
+    if DEBUG_MODE:
+      self.imageManager.logStats()
+
     # copy files
     self.progress(90, "Copying library files")
     tools.copyFiles(self.filesToCopy(), self.settings.outputDirectory())
@@ -165,21 +192,121 @@ class ThreeJSExporter(ThreeJSBuilder):
 
     return True
 
-  def nextLayerIndex(self):
-    self._index += 1
-    return self._index
-
   def buildLayer(self, layer):
-    title = tools.abchex(self.nextLayerIndex())
-    pathRoot = os.path.join(self.settings.outputDataDirectory(), title)
-    urlRoot = "./data/{0}/{1}".format(self.settings.outputFileTitle(), title)
-
+    prefix = self.manifest.prefix(layer.layerId)
+    inputs = self.layerInputs(layer, prefix)
+    fingerprint = self.layerFingerprint(inputs)
+
+    # reuse data exported previously if the layer is not changed or is not to be exported this time
+    isModelFile = (layer.properties or {}).get("comboBox_ObjectType") == "Model File"   # model files need to be copied
+    if not isModelFile and (fingerprint is not None or self.layerIds is not None):
+      if self.layerIds is not None and layer.layerId not in self.layerIds:
+        data = self.manifest.layerData(layer.layerId)
+      else:
+        data = self.manifest.layerData(layer.layerId, fingerprint)
+
+      if data is not None:
+        if DEBUG_MODE:
+          tools.logMessage("Layer not changed: " + layer.name)
+        return data
+
+    pathRoot = os.path.join(self.settings.outputDataDirectory(), prefix)
+    urlRoot = "./data/{0}/{1}".format(self.settings.outputFileTitle(), prefix)
+
+    # parts of DEM blocks whose inputs have not been changed are reused without being built.
+    # vector blocks are reused only as a whole layer, since features are assigned to blocks
+    # after their geometries have been converted
+    blockCache = None
     if layer.geomType == q3dconst.TYPE_DEM:
-      builder = DEMLayerBuilder(self.settings, self.imageManager, layer, pathRoot, urlRoot)
+      blockCache = self.manifest.blockCache(layer.layerId, inputs)
+      builder = DEMLayerBuilder(self.settings, self.imageManager, layer, pathRoot, urlRoot, blockCache=blockCache)
     else:
       builder = VectorLayerBuilder(self.settings, self.imageManager, layer, pathRoot, urlRoot)
       self.modelManagers.append(builder.modelManager)
-    return builder.build(True)
+
+    data = builder.build(True)
+
+    # image files read for vector layer, e.g. icons
+    files = [] if layer.geomType == q3dconst.TYPE_DEM else builder.materialManager.filePaths()
+    self.manifest.addLayer(layer.layerId, prefix, fingerprint, data, files, blockCache)
+    return data
+
+  def layerFingerprint(self, inputs):
+    """returns a hash of inputs of the layer, or None if any of the inputs cannot be fingerprinted"""
+    if None in inputs.values():
+      return None
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+  def layerInputs(self, layer, prefix):
+    """returns fingerprints of inputs of the layer: scene settings, layer properties, map settings and
+       fingerprints of layers and files whose data is used to build the layer. inputs of DEM layer are
+       divided into "grid" and "texture" so that block parts can be reused separately. a value is None
+       if the inputs cannot be fingerprinted."""
+    if layer.layerId.startswith("plugin:"):
+      return {"layer": None}
+
+    properties = layer.properties or {}
+    project = QgsProject.instance()
+    items = [self.sceneFingerprint, prefix, layer.jsLayerId]
+
+    if layer.geomType != q3dconst.TYPE_DEM:
+      if properties.get("comboBox_ObjectType") == "Overlay":
+        # textures are rendered with other layers
+        layers = list(project.mapLayers().values())
+        items.append(mapSettingsFingerprint(self.settings.mapSettings))
+      else:
+        layers = [layer.mapLayer, project.mapLayer(properties.get("comboBox_altitudeMode") or "")]
+
+      return {"layer": self._fingerprint(items + [self.jsonString(layer.toDict())], layers)}
+
+    # grid: DEM layer and properties other than texture ones
+    obj = layer.toDict()
+    obj["properties"] = {k: v for k, v in properties.items() if k not in self.DEM_TEXTURE_PROPERTIES}
+    layers = [layer.mapLayer]
+    if properties.get("checkBox_Clip", False):
+      layers.append(project.mapLayer(properties.get("comboBox_ClipLayer") or ""))
+
+    grid = self._fingerprint(items + [self.jsonString(obj)], layers)
+
+    # texture: layers which are rendered into textures, map settings and image file
+    texture_items = items + [self.jsonString({k: properties.get(k) for k in self.DEM_TEXTURE_PROPERTIES})]
+    layers = []
+    if properties.get("radioButton_MapCanvas", False):
+      layers = self.settings.mapSettings.layers()
+      texture_items.append(mapSettingsFingerprint(self.settings.mapSettings))
+
+    elif properties.get("radioButton_LayerImage", False):
+      layers = [project.mapLayer(id) for id in properties.get("layerImageIds", [])]
+      if None in layers:
+        layers = [None]     # some of the layers have been removed from the project
+      texture_items.append(mapSettingsFingerprint(self.settings.mapSettings))
+
+    elif properties.get("radioButton_ImageFile", False):
+      path = properties.get("lineEdit_ImageFile")
+      if path and os.path.isfile(path):
+        stat = os.stat(path)
+        texture_items += [path, str(stat.st_mtime_ns), str(stat.st_size)]
+
+    texture = self._fingerprint(texture_items, layers, skip_none=False)
+    return {"grid": grid, "texture": texture}
+
+  def _fingerprint(self, items, layers, skip_none=True):
+    """returns a hash of items and fingerprints of map layers, or None if any of the layers cannot be fingerprinted.
+       None in layers is skipped if skip_none is True"""
+    items = list(items)
+    for lyr in layers:
+      if lyr is None and skip_none:
+        continue
+      fp = layerFingerprint(lyr) if lyr is not None else None
+      if fp is None:
+        return None
+      items.append(fp)
+
+    return hashlib.sha1("\n".join(str(item) for item in items).encode("utf-8")).hexdigest()
+
+  @staticmethod
+  def jsonString(obj):
+    return json.dumps(obj, sort_keys=True, default=str)
 
   def filesToCopy(self):
     # three.js library
@@ -20,24 +20,28 @@
  ***************************************************************************/
 """
 import struct
+import numpy
 from PyQt5.QtCore import QByteArray, QSize
-from qgis.core import QgsPoint, QgsProject
+from qgis.core import QgsPoint, QgsProject, QgsRectangle
 
-from .conf import DEBUG_MODE
+from .conf import DEBUG_MODE, MIN_TEXTURE_SIZE
 from .datamanager import MaterialManager
 from .buildlayer import LayerBuilder
 from .geometry import PolygonGeometry, TriangleMesh, IndexedTriangles2D, dissolvePolygonsOnCanvas
 from .propertyreader import DEMPropertyReader
+from .qgis2threejstools import writeFile
 from .rotatedrect import RotatedRect
 
 
 class DEMLayerBuilder(LayerBuilder):
 
-  def __init__(self, settings, imageManager, layer, pathRoot=None, urlRoot=None, progress=None):
-    """if both pathRoot and urlRoot are None, object is built in all_in_dict mode."""
+  def __init__(self, settings, imageManager, layer, pathRoot=None, urlRoot=None, progress=None, blockCache=None):
+    """if both pathRoot and urlRoot are None, object is built in all_in_dict mode.
+       blockCache: BlockCache which has grid and texture data of blocks exported previously"""
     LayerBuilder.__init__(self, settings, imageManager, layer, pathRoot, urlRoot, progress)
     self.provider = settings.demProviderByLayerId(layer.layerId)
     self.prop = DEMPropertyReader(layer.layerId, layer.properties)
+    self.blockCache = blockCache if pathRoot is not None else None
 
   def build(self, build_blocks=False):
     if self.provider is None:
@@ -73,6 +77,12 @@ class DEMLayerBuilder(LayerBuilder):
     rotation = baseExtent.rotation()
     base_grid_size = self.prop.demSize(self.settings.mapSettings.outputSize())
 
+    # texture size of a block which has the same size as the base extent
+    canvas_size = self.settings.mapSettings.outputSize()
+    texture_scale = self.properties.get("comboBox_TextureSize", 100) // 100
+    texture_width = canvas_size.width() * texture_scale
+    texture_height = canvas_size.height() * texture_scale
+
     # clipping
     clip_geometry = None
     clip_option = self.properties.get("checkBox_Clip", False)
@@ -88,47 +98,119 @@ class DEMLayerBuilder(LayerBuilder):
     size = self.properties["spinBox_Size"] if surroundings else 1
     size2 = size * size
 
+    # texture size of surrounding blocks is divided by this value per ring around the center block.
+    # 0 means the roughening factor (not compounded).
+    texture_falloff = self.properties.get("comboBox_TextureFalloff", 1) if surroundings else 1
+
+    # maximum number of vertices in a block. 0 means no limit.
+    max_vertices = self.properties.get("comboBox_MaxBlockVertices") or 0
+
+    # maximum width/height of a texture image. 0 means no limit.
+    # only rendered textures (map canvas image and layer image) are limited.
+    layer_image = self.properties.get("radioButton_LayerImage", False)
+    rendered_texture = layer_image or self.properties.get("radioButton_MapCanvas", False)
+    max_texture_size = (self.properties.get("comboBox_MaxTextureSize") or 0) if rendered_texture else 0
+
+    half = (size - 1) // 2
     blks = []
     for i in range(size2):
-      sx = i % size - (size - 1) // 2
-      sy = i // size - (size - 1) // 2
+      sx = i % size - half
+      sy = i // size - half
       dist2 = sx * sx + sy * sy
       blks.append([dist2, i, sx, sy])
 
-    for dist2, blockIndex, sx, sy in sorted(blks):
+    blocks = []
+    for dist2, _, sx, sy in sorted(blks):
       #self.progress(20 * i / size2 + 10)
       is_center = (sx == 0 and sy == 0)
 
       if is_center:
         extent = baseExtent
         grid_size = base_grid_size
+        texture_factor = 1
       else:
         block_center = QgsPoint(center.x() + sx * baseExtent.width(), center.y() + sy * baseExtent.height())
         extent = RotatedRect(block_center, baseExtent.width(), baseExtent.height()).rotate(rotation, center)
         grid_size = QSize(max(2, (base_grid_size.width() - 1) // roughening + 1),
                           max(2, (base_grid_size.height() - 1) // roughening + 1))
-
-      block = DEMBlockBuilder(self.settings,
-                              self.imageManager,
-                              self.layer,
-                              blockIndex,
-                              self.provider,
-                              grid_size,
-                              extent,
-                              mapTo3d.planeWidth,
-                              mapTo3d.planeHeight,
-                              offsetX=mapTo3d.planeWidth * sx,
-                              offsetY=mapTo3d.planeHeight * sy,
-                              edgeRougheness=roughening if is_center else 1,
-                              clip_geometry=clip_geometry if is_center else None,
-                              pathRoot=self.pathRoot,
-                              urlRoot=self.urlRoot)
+        if texture_falloff:
+          texture_factor = 1 / texture_falloff ** max(abs(sx), abs(sy))
+        else:
+          texture_factor = 1 / roughening
+
+      # split block into sub-blocks which share their edges, so that center block does not have
+      # more than max_vertices vertices and texture size of each sub-block does not exceed max_texture_size.
+      # clipped block is not split because it is built with polygons, not with grid.
+      segments_x = grid_size.width() - 1
+      segments_y = grid_size.height() - 1
+      max_tile_x = max_tile_y = 0
+      if max_texture_size:
+        tsize = textureSize(texture_width, texture_height, texture_factor)
+        if tsize.width() > max_texture_size:
+          max_tile_x = max(1, segments_x * max_texture_size // tsize.width())
+        if tsize.height() > max_texture_size:
+          max_tile_y = max(1, segments_y * max_texture_size // tsize.height())
+
+      split_vertices = max_vertices if is_center else 0
+      if (split_vertices or max_tile_x or max_tile_y) and not (is_center and clip_geometry):
+        tiles = splitGrid(segments_x, segments_y, split_vertices, roughening if is_center else 1, max_tile_x, max_tile_y)
+      else:
+        tiles = [(0, 0, segments_x, segments_y)]
+
+      for x0, y0, x1, y1 in tiles:
+        rx0, ry0, rx1, ry1 = x0 / segments_x, y0 / segments_y, x1 / segments_x, y1 / segments_y
+        if len(tiles) == 1:
+          block_extent = extent
+        else:
+          block_extent = extent.subrectangle(QgsRectangle(rx0, ry0, rx1, ry1), y_inverted=True)
+
+        block = DEMBlockBuilder(self.settings,
+                                self.imageManager,
+                                self.layer,
+                                len(blocks),
+                                self.provider,
+                                QSize(x1 - x0 + 1, y1 - y0 + 1),
+                                block_extent,
+                                mapTo3d.planeWidth * (rx1 - rx0),
+                                mapTo3d.planeHeight * (ry1 - ry0),
+                                offsetX=mapTo3d.planeWidth * (sx + (rx0 + rx1) / 2 - 0.5),
+                                offsetY=mapTo3d.planeHeight * (sy + 0.5 - (ry0 + ry1) / 2),
+                                edgeRougheness=roughening if is_center else 1,
+                                edges=(y0 == 0, x1 == segments_x, y1 == segments_y, x0 == 0),
+                                boundaries=(y0 == 0 and sy == size - 1 - half, x1 == segments_x and sx == size - 1 - half,
+                                            y1 == segments_y and sy == -half, x0 == 0 and sx == -half),
+                                texture_size=textureSize(texture_width * (rx1 - rx0), texture_height * (ry1 - ry0), texture_factor),
+                                image_rect=(rx0, ry0, rx1, ry1) if len(tiles) > 1 else None,
+                                clip_geometry=clip_geometry if is_center else None,
+                                pathRoot=self.pathRoot,
+                                urlRoot=self.urlRoot,
+                                blockCache=self.blockCache)
+        blocks.append(block)
+
+    # render map images for all blocks at once and slice them into block textures.
+    # textures exported previously are not rendered
+    if rotation == 0 and rendered_texture:
+      layerids = self.properties.get("layerImageIds", []) if layer_image else None
+      transp_background = self.properties.get("checkBox_TransparentBackground", False)
+      self.imageManager.prerender([(b.texture_size.width(), b.texture_size.height(), b.extent) for b in blocks
+                                   if b.cachedPart("texture") is None],
+                                  transp_background, layerids)
+
+    for block in blocks:
       yield block
 
 
 class DEMBlockBuilder:
 
-  def __init__(self, settings, imageManager, layer, blockIndex, provider, grid_size, extent, planeWidth, planeHeight, offsetX=0, offsetY=0, edgeRougheness=1, clip_geometry=None, pathRoot=None, urlRoot=None):
+  def __init__(self, settings, imageManager, layer, blockIndex, provider, grid_size, extent, planeWidth, planeHeight, offsetX=0, offsetY=0, edgeRougheness=1, edges=None, boundaries=None, texture_size=None, image_rect=None, clip_geometry=None, pathRoot=None, urlRoot=None, blockCache=None):
+    """edges: tuple of four booleans (top, right, bottom, left) which indicate whether
+              each edge of the block is on the boundary of its parent block. all True if None.
+       boundaries: tuple of four booleans which indicate whether each edge of the block is on the outer boundary
+                   of the DEM including surroundings. same as edges if None.
+       texture_size: QSize of texture image. canvas size if None.
+       image_rect: normalized rectangle (x0, y0, x1, y1) of sub-block in its parent block, whose origin is top-left.
+                   a part of image file is mapped to sub-block.
+       blockCache: BlockCache. grid and texture of the block are not built if they have been exported previously."""
     self.settings = settings
     self.imageManager = imageManager
     self.materialManager = MaterialManager(settings.materialType())
@@ -145,35 +227,52 @@ class DEMBlockBuilder:
     self.offsetX = offsetX
     self.offsetY = offsetY
     self.edgeRougheness = edgeRougheness
+    self.edges = edges or (True, True, True, True)
+    self.boundaries = boundaries or self.edges
+    self.texture_size = texture_size or settings.mapSettings.outputSize()
+    self.image_rect = image_rect
     self.clip_geometry = clip_geometry
     self.pathRoot = pathRoot
     self.urlRoot = urlRoot
+    self.blockCache = blockCache
+    self._parts = {}
+
+  def partParams(self, name):
+    """parameters of the block which determine the part together with inputs common to the blocks of the layer"""
+    ext = self.extent
+    params = [self.blockIndex, [ext.center().x(), ext.center().y(), ext.width(), ext.height(), ext.rotation()]]
+    if name == "grid":
+      return params + [self.grid_size.width(), self.grid_size.height(), self.edges, self.boundaries, self.edgeRougheness, self.hasNormals()]
+    return params + [self.texture_size.width(), self.texture_size.height()]
+
+  def cachedPart(self, name):
+    """returns data of the part ("grid" or "texture") exported previously, or None if it needs to be built"""
+    if self.blockCache is None:
+      return None
 
-  def build(self):
-    if self.edgeRougheness == 1:
-      ba = self.provider.read(self.grid_size.width(), self.grid_size.height(), self.extent)
-    else:
-      grid_values = list(self.provider.readValues(self.grid_size.width(), self.grid_size.height(), self.extent))
-      self.processEdges(grid_values, self.edgeRougheness)
-      ba = struct.pack("{0}f".format(self.grid_size.width() * self.grid_size.height()), *grid_values)
+    if name not in self._parts:
+      fp = self.blockCache.fingerprint(name, self.partParams(name))
+      self._parts[name] = (fp, self.blockCache.get("{0}{1}".format(self.blockIndex, name), fp))
+    return self._parts[name][1]
 
-    # write grid values to an external binary file
-    if self.pathRoot is not None:
-      with open(self.pathRoot + "{0}.bin".format(self.blockIndex), "wb") as f:
-        f.write(ba)
+  def putPart(self, name, data):
+    if self.blockCache is not None:
+      self.blockCache.put("{0}{1}".format(self.blockIndex, name), self._parts[name][0], data)
 
-    # block data
-    g = {"width": self.grid_size.width(),
-         "height": self.grid_size.height()}
+  def hasNormals(self):
+    return self.properties.get("checkBox_Shading", True) and self.properties.get("checkBox_PrecomputeNormals", False) and not self.clip_geometry
 
-    if self.urlRoot is None:
-      g["binary"] = QByteArray(ba)
-      # g["array"] = grid_values
-    else:
-      g["url"] = self.urlRoot + "{0}.bin".format(self.blockIndex)
+  def build(self):
+    g = self.cachedPart("grid")
+    if g is None:
+      g = self.buildGrid()
+      self.putPart("grid", g)
 
     # material
-    material = self.material()
+    material = self.cachedPart("texture")
+    if material is None:
+      material = self.material()
+      self.putPart("texture", material)
 
     mapTo3d = self.settings.mapTo3d()
     b = {"type": "block",
@@ -199,25 +298,90 @@ class DEMBlockBuilder:
     if self.properties.get("checkBox_Frame", False) and not self.properties.get("checkBox_Clip", False):
       b["frame"] = True 
 
+    # sub-block: map a part of image file
+    if self.image_rect and self.properties.get("radioButton_ImageFile", False):
+      x0, y0, x1, y1 = self.image_rect
+      b["uv"] = [x0, 1 - y1, x1, 1 - y0]
+
+    # sub-block: sides and frame are built only along the edges on the DEM boundary
+    if not all(self.edges):
+      b["edges"] = [int(e) for e in self.edges]
+
     return b
 
+  def buildGrid(self):
+    """reads grid values (and calculates vertex normals), writes them to files, and returns grid data"""
+    w, h = self.grid_size.width(), self.grid_size.height()
+    z = None
+    if self.hasNormals():
+      # read one more row/column around the block at the same interval, so that normals on the edges shared
+      # with neighboring blocks are calculated with central differences and the blocks have no lighting seams.
+      # grid values are the inner part of it
+      ext = self.extent
+      dx, dy = ext.width() / (w - 1), ext.height() / (h - 1)
+      padded_extent = RotatedRect(ext.center(), ext.width() + 2 * dx, ext.height() + 2 * dy, ext.rotation())
+      z = numpy.frombuffer(self.provider.read(w + 2, h + 2, padded_extent), dtype=numpy.float32).reshape(h + 2, w + 2).copy()
+
+      if self.edgeRougheness == 1 or not any(self.edges):
+        ba = z[1:-1, 1:-1].tobytes()
+      else:
+        grid_values = z[1:-1, 1:-1].ravel().tolist()
+        self.processEdges(grid_values, self.edgeRougheness)
+        ba = struct.pack("{0}f".format(w * h), *grid_values)
+        z[1:-1, 1:-1] = numpy.frombuffer(ba, dtype=numpy.float32).reshape(h, w)
+
+    elif self.edgeRougheness == 1 or not any(self.edges):
+      ba = self.provider.read(w, h, self.extent)
+    else:
+      grid_values = list(self.provider.readValues(w, h, self.extent))
+      self.processEdges(grid_values, self.edgeRougheness)
+      ba = struct.pack("{0}f".format(w * h), *grid_values)
+
+    # write grid values to an external binary file
+    if self.pathRoot is not None:
+      writeFile(self.pathRoot + "{0}.bin".format(self.blockIndex), ba)
+
+    # vertex normals
+    nba = None
+    if z is not None:
+      nba = self.normals(z)
+      if self.pathRoot is not None:
+        writeFile(self.pathRoot + "{0}n.bin".format(self.blockIndex), nba)
+
+    # block data
+    g = {"width": self.grid_size.width(),
+         "height": self.grid_size.height()}
+
+    if self.urlRoot is None:
+      g["binary"] = QByteArray(ba)
+      # g["array"] = grid_values
+    else:
+      g["url"] = self.urlRoot + "{0}.bin".format(self.blockIndex)
+
+    if nba is not None:
+      if self.urlRoot is None:
+        g["normals"] = {"binary": QByteArray(nba)}
+      else:
+        g["normals"] = {"url": self.urlRoot + "{0}n.bin".format(self.blockIndex)}
+
+    return g
+
   def material(self):
     # properties
-    texture_scale = self.properties.get("comboBox_TextureSize", 100) // 100
     opacity = self.properties.get("spinBox_Opacity", 100) / 100
     transp_background = self.properties.get("checkBox_TransparentBackground", False)
 
     # display type
-    canvas_size = self.settings.mapSettings.outputSize()
+    texture_size = self.texture_size
     if self.properties.get("radioButton_MapCanvas", False):
       #if texture_scale == 1:
       #  mi = self.materialManager.getCanvasImageIndex(opacity, transp_background)
       #else:
-      mi = self.materialManager.getMapImageIndex(canvas_size.width() * texture_scale, canvas_size.height() * texture_scale, self.extent, opacity, transp_background)
+      mi = self.materialManager.getMapImageIndex(texture_size.width(), texture_size.height(), self.extent, opacity, transp_background)
 
     elif self.properties.get("radioButton_LayerImage", False):
       layerids = self.properties.get("layerImageIds", [])
-      mi = self.materialManager.getLayerImageIndex(layerids, canvas_size.width() * texture_scale, canvas_size.height() * texture_scale, self.extent, opacity, transp_background)
+      mi = self.materialManager.getLayerImageIndex(layerids, texture_size.width(), texture_size.height(), self.extent, opacity, transp_background)
 
     elif self.properties.get("radioButton_ImageFile", False):
       filepath = self.properties.get("lineEdit_ImageFile", "")
@@ -232,12 +396,44 @@ class DEMBlockBuilder:
     # build material
     filepath = None if self.pathRoot is None else "{0}{1}.png".format(self.pathRoot, self.blockIndex)
     url = None if self.urlRoot is None else "{0}{1}.png".format(self.urlRoot, self.blockIndex)
-    return self.materialManager.build(mi, self.imageManager, filepath, url, self.settings.base64)
+    return self.materialManager.build(mi, self.imageManager, filepath, url, self.settings.base64,
+                                      self.properties.get("comboBox_ImageFormat", "PNG"),
+                                      self.properties.get("spinBox_ImageQuality", -1))
+
+  def normals(self, z):
+    """calculate vertex normals of the grid in 3D world coordinates (vertical exaggeration applied)
+       and return them as a byte array of int8 triplets (unit vector components multiplied by 127).
+       z: grid values with one more row/column around the block, in a numpy array of shape (h + 2, w + 2).
+          it is modified in place"""
+    w, h = self.grid_size.width(), self.grid_size.height()
+
+    # on the outer boundary of the DEM, extrapolate linearly so that the differences there are one-sided
+    top, right, bottom, left = self.boundaries
+    if top:
+      z[0] = 2 * z[1] - z[2]
+    if bottom:
+      z[-1] = 2 * z[-2] - z[-3]
+    if left:
+      z[:, 0] = 2 * z[:, 1] - z[:, 2]
+    if right:
+      z[:, -1] = 2 * z[:, -2] - z[:, -3]
+
+    z *= self.settings.mapTo3d().multiplierZ
+
+    # central differences. grid rows are ordered from north to south
+    dz_dy, dz_dx = numpy.gradient(z, self.planeHeight / (h - 1), self.planeWidth / (w - 1))
+    dz_dy, dz_dx = dz_dy[1:-1, 1:-1], dz_dx[1:-1, 1:-1]
+
+    n = numpy.empty((h, w, 3), dtype=numpy.float32)
+    n[:, :, 0] = -dz_dx
+    n[:, :, 1] = dz_dy
+    n[:, :, 2] = 1
+    n /= numpy.sqrt(numpy.sum(n * n, axis=2))[:, :, numpy.newaxis]
+    return numpy.round(n * 127).astype(numpy.int8).tobytes()
 
   def clipped(self):
     mapTo3d = self.settings.mapTo3d()
     z_func = lambda x, y: 0
-    transform_func = lambda x, y, z: mapTo3d.transform(x, y, z)
 
     # create triangle mesh
     hw = 0.5 * mapTo3d.planeWidth
@@ -247,7 +443,7 @@ class DEMBlockBuilder:
                          self.grid_size.width() - 1, self.grid_size.height() - 1)
 
     # split polygons with triangle mesh
-    geom = PolygonGeometry.fromQgsGeometry(self.clip_geometry, z_func, transform_func)
+    geom = PolygonGeometry.fromQgsGeometry(self.clip_geometry, z_func, mapTo3d)
     geom.splitPolygon(tmesh, z_func)
 
     triangles = IndexedTriangles2D()
@@ -255,13 +451,14 @@ class DEMBlockBuilder:
     for polygon in geom.split_polygons:
       boundary = polygon[0]
       if len(polygon) == 1 and len(boundary) == 4:
+        boundary = boundary.tolist()
         triangles.addTriangle(boundary[0], boundary[2], boundary[1])    # vertex order should be counter-clockwise
       else:
-        bnds = [[[pt.x, pt.y] for pt in bnd] for bnd in polygon]
+        bnds = [bnd[:, :2].tolist() for bnd in polygon]
         split_polygons.append(bnds)
 
     return {"polygons": geom.asList2(),
-            "triangles": {"v": [[pt.x, pt.y] for pt in triangles.vertices],
+            "triangles": {"v": [v[:2] for v in triangles.vertices],
                           "f": triangles.faces},
             "split_polygons": split_polygons}
 
@@ -271,37 +468,43 @@ class DEMBlockBuilder:
     rg_grid_width = (grid_width - 1) // roughness + 1
     rg_grid_height = (grid_height - 1) // roughness + 1
     ii = range(roughness)[1:]
+    top, right, bottom, left = self.edges
 
     for x0 in range(rg_grid_width - 1):
-      # top edge
       ix0 = x0 * roughness
-      z0 = grid_values[ix0]
-      z1 = grid_values[ix0 + roughness]
-      for i in ii:
-        grid_values[ix0 + i] = (z1 - z0) * i / roughness + z0
+
+      # top edge
+      if top:
+        z0 = grid_values[ix0]
+        z1 = grid_values[ix0 + roughness]
+        for i in ii:
+          grid_values[ix0 + i] = (z1 - z0) * i / roughness + z0
 
       # bottom edge
-      iy0 = grid_width * (grid_height - 1)
-      z0 = grid_values[iy0 + ix0]
-      z1 = grid_values[iy0 + ix0 + roughness]
-      for i in ii:
-        grid_values[iy0 + ix0 + i] = (z1 - z0) * i / roughness + z0
+      if bottom:
+        iy0 = grid_width * (grid_height - 1)
+        z0 = grid_values[iy0 + ix0]
+        z1 = grid_values[iy0 + ix0 + roughness]
+        for i in ii:
+          grid_values[iy0 + ix0 + i] = (z1 - z0) * i / roughness + z0
 
     rw = roughness * grid_width
     for y0 in range(rg_grid_height - 1):
       # left edge
       iy0 = y0 * grid_width
-      z0 = grid_values[iy0]
-      z1 = grid_values[iy0 + rw]
-      for i in ii:
-        grid_values[iy0 + i * grid_width] = (z1 - z0) * i / roughness + z0
+      if left:
+        z0 = grid_values[iy0]
+        z1 = grid_values[iy0 + rw]
+        for i in ii:
+          grid_values[iy0 + i * grid_width] = (z1 - z0) * i / roughness + z0
 
       # right edge
-      iy0 += grid_width - 1
-      z0 = grid_values[iy0]
-      z1 = grid_values[iy0 + rw]
-      for i in ii:
-        grid_values[iy0 + i * grid_width] = (z1 - z0) * i / roughness + z0
+      if right:
+        iy0 += grid_width - 1
+        z0 = grid_values[iy0]
+        z1 = grid_values[iy0 + rw]
+        for i in ii:
+          grid_values[iy0 + i * grid_width] = (z1 - z0) * i / roughness + z0
 
   def getValue(self, x, y):
 
@@ -388,5 +591,54 @@ class DEMBlocks:
     return stats
 
 
+def textureSize(width, height, factor=1):
+  """return QSize of texture image scaled by factor. the smaller side is not scaled down below MIN_TEXTURE_SIZE
+     unless the original size is already smaller than it."""
+  if factor < 1:
+    factor = max(factor, min(1, MIN_TEXTURE_SIZE / min(width, height)))
+  return QSize(max(1, round(width * factor)), max(1, round(height * factor)))
+
+
+def splitGrid(segments_x, segments_y, max_vertices=0, unit=1, max_tile_x=0, max_tile_y=0):
+  """split grid into tiles each of which has max_vertices vertices at most, and
+     max_tile_x x max_tile_y segments at most (0 means no limit).
+     adjacent tiles share their edge vertices. tile edges are aligned to multiples of unit.
+     returns a list of (x0, y0, x1, y1) in grid segment units. (x0, y0) is top-left."""
+  nx = ny = 1
+  while True:
+    tx = max(unit, -(-segments_x // nx) // unit * unit)
+    ty = max(unit, -(-segments_y // ny) // unit * unit)
+    if tx == unit and ty == unit:
+      break
+
+    over_x = max_tile_x and tx > max_tile_x
+    over_y = max_tile_y and ty > max_tile_y
+    if not (over_x or over_y or (max_vertices and (tx + 1) * (ty + 1) > max_vertices)):
+      break
+
+    if over_x and tx > unit:
+      nx += 1
+    elif over_y and ty > unit:
+      ny += 1
+
+    # divide longer side of tile
+    elif tx >= ty and tx > unit:
+      nx += 1
+    else:
+      ny += 1
+
+  # even out tile sizes
+  nx = -(-segments_x // tx)
+  ny = -(-segments_y // ty)
+  tx = -(-(-(-segments_x // nx)) // unit) * unit
+  ty = -(-(-(-segments_y // ny)) // unit) * unit
+
+  tiles = []
+  for y0 in range(0, segments_y, ty):
+    for x0 in range(0, segments_x, tx):
+      tiles.append((x0, y0, min(x0 + tx, segments_x), min(y0 + ty, segments_y)))
+  return tiles
+
+
 def dummyProgress(progress=None, statusMsg=None):
   pass
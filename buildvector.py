@@ -20,24 +20,123 @@
  ***************************************************************************/
 """
 import json
-from PyQt5.QtCore import QVariant
-from qgis.core import QgsCoordinateTransform, QgsFeatureRequest, QgsGeometry, QgsProject, QgsRenderContext, QgsWkbTypes
-
-from .conf import BLOCK_FEATURES, DEBUG_MODE
+import queue
+import struct
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy
+from PyQt5.QtCore import QByteArray, QVariant
+from qgis.core import (QgsCoordinateTransform, QgsCsException, QgsFeatureRequest, QgsProject, QgsRenderContext,
+                       QgsSimplifyMethod, QgsWkbTypes)
+
+from .conf import (BINARY_VERTEX_BYTES, BLOCK_FEATURES, DEBUG_MODE, EXPRESSION_CHUNK_SIZE, GEOMETRY_CHUNK_SIZE,
+                   MAX_BLOCK_FEATURES, SIMPLIFY_TOLERANCE, SPATIAL_ORDER_BATCH, VERTEX_BYTES)
 from .datamanager import MaterialManager, ModelManager
 from .buildlayer import LayerBuilder
-from .geometry import Geometry, PointGeometry, LineGeometry, PolygonGeometry, TriangleMesh
+from .geometry import (CoordinateList, Geometry, GeometryUtils, PointGeometry, LineGeometry, PolygonGeometry, PreparedExtent,
+                       TriangleMesh, transformGeometries)
 from .propertyreader import VectorPropertyReader
-from .qgis2threejstools import logMessage
+from .qgis2threejstools import logMessage, writeFile
 from .vectorobject import objectTypeRegistry
 
 
 def json_default(o):
+  if isinstance(o, CoordinateList):
+    return o.toList()
+  if isinstance(o, numpy.ndarray):
+    return o.tolist()
   if isinstance(o, QVariant):
     return repr(o)
   raise TypeError(repr(o) + " is not JSON serializable")
 
 
+def attributeColumns(rows, numeric):
+  """converts attribute rows of features into columns. a numeric column has a list of values,
+     and other columns are dictionary-encoded into a list of unique strings and indices into it"""
+  columns = []
+  for i, isNumeric in enumerate(numeric):
+    values = [row[i] for row in rows]
+    if isNumeric:
+      columns.append({"values": values})
+    else:
+      d = {}
+      columns.append({"idx": [d.setdefault(v, len(d)) for v in values],
+                      "dict": list(d)})
+  return columns
+
+
+def packFeatures(features):
+  """packs coordinate lists (CoordinateList) and index arrays in feature geometries into a float32 array
+     of coordinates and an uint32 array of offsets and indices. returns a list of features in which they are
+     replaced with {"packed": {"coords": [start, length], "dim": dim, "offsets": [[start, length], ...]}} or
+     {"packed": {"indices": [start, length]}}, and the arrays. offsets are relative to the coordinate list."""
+  coords = []
+  indices = []
+  coordCount = indexCount = 0
+
+  def addIndices(a):
+    nonlocal indexCount
+    a = a.ravel()
+    indices.append(a)
+    indexCount += len(a)
+    return [indexCount - len(a), len(a)]
+
+  def packObject(obj):
+    nonlocal coordCount
+    d = {}
+    for key, v in obj.items():
+      if isinstance(v, dict):
+        d[key] = packObject(v)
+
+      elif isinstance(v, CoordinateList):
+        c = v.coords.ravel()
+        coords.append(c)
+        coordCount += len(c)
+        d[key] = {"packed": {"coords": [coordCount - len(c), len(c)],
+                             "dim": v.dim,
+                             "offsets": [addIndices(offsets) for offsets in v.offsets]}}
+
+      elif isinstance(v, numpy.ndarray):
+        d[key] = {"packed": {"indices": addIndices(v)}}
+
+      else:
+        d[key] = v
+    return d
+
+  packed = []
+  for f in features:
+    f = dict(f)
+    f["geom"] = packObject(f["geom"])
+    packed.append(f)
+
+  coords = numpy.concatenate(coords).astype("<f4") if coords else numpy.empty(0, "<f4")
+  indices = numpy.concatenate(indices).astype("<u4") if indices else numpy.empty(0, "<u4")
+  return packed, coords, indices
+
+
+def listFeatures(features):
+  """returns a list of features in which coordinate lists and arrays in feature geometries are
+     replaced with lists, for data which is passed to the viewer without serialization"""
+  def listObject(obj):
+    d = {}
+    for key, v in obj.items():
+      if isinstance(v, dict):
+        d[key] = listObject(v)
+      elif isinstance(v, (CoordinateList, numpy.ndarray)):
+        d[key] = json_default(v)
+      else:
+        d[key] = v
+    return d
+
+  listed = []
+  for f in features:
+    f = dict(f)
+    f["geom"] = listObject(f["geom"])
+    listed.append(f)
+  return listed
+
+
 class VectorLayerBuilder(LayerBuilder):
 
   gt2str = {QgsWkbTypes.PointGeometry: "point",
@@ -82,7 +181,7 @@ class VectorLayerBuilder(LayerBuilder):
     self._layer = layer
 
     self.hasLabel = layer.hasLabel()
-    self.clipGeom = None
+    self.clipExtent = None
 
     # feature request
     request = QgsFeatureRequest()
@@ -92,30 +191,42 @@ class VectorLayerBuilder(LayerBuilder):
       # geometry for clipping
       if properties.get("checkBox_Clip") and self.prop.objType.name != "Triangular Mesh":
         extent = baseExtent.clone().scale(0.999999)   # clip with slightly smaller extent than map canvas extent
-        self.clipGeom = extent.geometry()
-
-    # initialize symbol rendering, and then get features (geometry, attributes, color, etc.)
-    mapLayer.renderer().startRender(renderContext, mapLayer.fields())
-    self.features = layer.features(request)
-    mapLayer.renderer().stopRender(renderContext)
-
-    # materials/models
+        self.clipExtent = PreparedExtent(extent)
+
+    # fetch only attributes which are used by expressions, renderer and attribute export
+    names = self.prop.referencedFields()
+    if names is not None:
+      fields = mapLayer.fields()
+      if layer.writeAttrs:
+        names |= set(fields[i].name() for i in layer.fieldIndices)
+      request.setSubsetOfAttributes(list(names), fields)
+
+    # simplify line/polygon geometries (on provider side if supported)
+    if SIMPLIFY_TOLERANCE and self.geomType in [QgsWkbTypes.LineGeometry, QgsWkbTypes.PolygonGeometry]:
+      rect = layer.transform.transformBoundingBox(baseExtent.boundingBox(), QgsCoordinateTransform.ReverseTransform)
+      method = QgsSimplifyMethod()
+      method.setMethodType(QgsSimplifyMethod.OptimizeForRendering)
+      method.setTolerance(SIMPLIFY_TOLERANCE * rect.width() / mapSettings.outputSize().width())
+      method.setForceLocalOptimization(False)
+      request.setSimplifyMethod(method)
+
+    self.renderContext = renderContext
+    self.request = request
+
+    # features are read, converted and written block by block in blocks(). materials and models are
+    # assigned to features on the fly. if blocks are built later, new materials/models are sent with blocks.
     data = {}
-    if self.prop.objType.name != "Model File":
-      for feat in self.features:
-        feat.material = self.prop.objType.material(self.settings, layer, feat)
-        feat.model = None
-      data["materials"] = self.materialManager.buildAll(self.imageManager, self.pathRoot, self.urlRoot, base64=self.settings.base64)
+    self.blocksHaveMaterials = not build_blocks
+    if build_blocks:
+      data["blocks"] = [block.build() for block in self.blocks()]
 
+    if self.prop.objType.name != "Model File":
+      data["materials"] = self.materialManager.buildAll(self.imageManager, self.pathRoot, self.urlRoot, base64=self.settings.base64,
+                                                        imageFormat=self.properties.get("comboBox_ImageFormat", "PNG"),
+                                                        imageQuality=self.properties.get("spinBox_ImageQuality", -1))
     else:
-      for feat in self.features:
-        feat.material = None
-        feat.model = self.prop.objType.model(self.settings, layer, feat)
       data["models"] = self.modelManager.build(self.pathRoot is not None)
 
-    if build_blocks:
-      data["blocks"] = [block.build() for block in self.blocks()]
-
     d = {
       "type": "layer",
       "id": self.layer.jsLayerId,
@@ -145,18 +256,46 @@ class VectorLayerBuilder(LayerBuilder):
 
   def blocks(self):
     index = 0
+    mtlCount = modelCount = 0
+    isModelFile = (self.prop.objType.name == "Model File")
+
+    # attributes are written to shard files, which the viewer loads on query. labels need attributes on load
+    attrsOnQuery = self._layer.writeAttrs and self.properties.get("checkBox_AttrsOnQuery", False) and not self.hasLabel
 
-    def createBlockBuilder(blockIndex, features):
-      return FeatureBlockBuilder(blockIndex, {
+    # feature coordinates are written in binary format (JSON header and float32 coordinates).
+    # layers saved without this option keep JSON format
+    binary = self.properties.get("checkBox_BinaryBlocks", False)
+    vertexBytes = BINARY_VERTEX_BYTES if binary else VERTEX_BYTES
+
+    def createBlockBuilder(blockIndex, features, bbox=None):
+      nonlocal mtlCount, modelCount
+      data = {
         "type": "block",
         "layer": self.layer.jsLayerId,
         "block": blockIndex,
         "features": features
-        }, self.pathRoot, self.urlRoot)
+        }
+
+      if bbox:
+        data["bbox"] = bbox
 
-    demProvider = None
-    if self.prop.isHeightRelativeToDEM():
-      demProvider = self.settings.demProviderByLayerId(self.layer.properties.get("comboBox_altitudeMode"))
+      # attributes are exported in columns, and rows are in the same order as features
+      if self._layer.writeAttrs:
+        data["attrs"] = attributeColumns([f.pop("prop") for f in features], self._layer.numericFields)
+
+      # materials/models which have been added since previous block
+      if self.blocksHaveMaterials:
+        if isModelFile:
+          data["models"] = self.modelManager.build(self.pathRoot is not None, modelCount)
+          modelCount = self.modelManager.count()
+        else:
+          data["materials"] = self.materialManager.buildAll(self.imageManager, self.pathRoot, self.urlRoot,
+                                                            base64=self.settings.base64, start=mtlCount,
+                                                            imageFormat=self.properties.get("comboBox_ImageFormat", "PNG"),
+                                                            imageQuality=self.properties.get("spinBox_ImageQuality", -1))
+          mtlCount = self.materialManager.count()
+
+      return FeatureBlockBuilder(blockIndex, data, self.pathRoot, self.urlRoot, attrsOnQuery, binary)
 
     if self.layer.properties.get("radioButton_zValue"):
       useZM = Geometry.UseZ
@@ -165,80 +304,242 @@ class VectorLayerBuilder(LayerBuilder):
     else:
       useZM = Geometry.NotUseZM
 
+    # number of worker threads which convert feature geometries. 0 or 1 to convert them on this thread
+    threads = max(self.properties.get("spinBox_GeometryThreads", 0), 1)
+
+    # DEM providers and clip extent geometries are not thread-safe, so each worker takes a set of them
+    # from the queue while converting a chunk
+    resources = queue.Queue()
+    for i in range(threads):
+      demProvider = None
+      if self.prop.isHeightRelativeToDEM():
+        demProvider = self.settings.demProviderByLayerId(self.layer.properties.get("comboBox_altitudeMode"))
+
+      # the first worker uses the original clip extent and the others use copies
+      clipExtent = self.clipExtent.clone() if self.clipExtent and i else self.clipExtent
+      resources.put((demProvider, clipExtent))
+
+    def convert(chunk):
+      """converts geometries of features in a chunk. called on worker threads"""
+      res = resources.get()
+      demProvider, clipExtent = res
+      try:
+        feats = []
+        for feat in chunk:
+          geom = feat.geometry(self.mapTo3d, useZM, demProvider, clipExtent, self.settings.baseExtent, self.demSize)
+          if geom is None:
+            continue
+
+          f = {}
+          f["geom"] = self.prop.objType.geometry(self.settings, self._layer, feat, geom)
+
+          if feat.material is not None:
+            f["mtl"] = feat.material
+          elif feat.model is not None:
+            f["model"] = feat.model
+          else:   # no material nor model
+            continue
+
+          # estimated size of serialized feature data
+          size = geom.vertexCount() * vertexBytes
+
+          if feat.attributes is not None:
+            f["prop"] = feat.attributes
+            size += sum(len(str(a)) + 3 for a in feat.attributes)
+
+            if feat.labelHeight is not None:
+              f["lh"] = feat.labelHeight
+
+          feats.append((f, geom.vertexCount(), size, geom.bounds()))
+        return feats
+
+      finally:
+        resources.put(res)
+
+    # features are read and their expressions are evaluated on this thread, and then geometries are
+    # converted on worker threads chunk by chunk. converted chunks are collected in submission order,
+    # so features are put in the same blocks as in serial conversion.
+    executor = ThreadPoolExecutor(threads) if threads > 1 else None
+    pending = deque()
     feats = []
-    for feat in self.features or []:
-      geom = feat.geometry(self.mapTo3d, useZM, demProvider, self.clipGeom, self.settings.baseExtent, self.demSize)
-      if geom is None:
-        continue
+    vertices = size = 0
+    bbox = None
+
+    # a block is closed before its vertex count or estimated data size exceeds the limit set to the layer
+    maxVertices = self.layer.properties.get("comboBox_BlockVertices", 0)
+    maxSize = self.layer.properties.get("comboBox_BlockSize", 0)
+    maxFeatures = MAX_BLOCK_FEATURES if maxVertices or maxSize else BLOCK_FEATURES
+
+    def collect(wait_all=False):
+      nonlocal index, feats, vertices, size, bbox
+      while pending and (wait_all or len(pending) > 2 * threads or pending[0].done()):
+        for f, v, s, b in pending.popleft().result():
+          if feats and (len(feats) == maxFeatures or
+                        (maxVertices and vertices + v > maxVertices) or
+                        (maxSize and size + s > maxSize)):
+            yield createBlockBuilder(index, feats, bbox)
+            index += 1
+            feats = []
+            vertices = size = 0
+            bbox = None
+
+          feats.append(f)
+          vertices += v
+          size += s
+          if b:
+            bbox = b if bbox is None else [min(bbox[i], b[i]) for i in range(3)] + [max(bbox[i], b[i]) for i in range(3, 6)]
+
+    def submit(chunk):
+      if executor:
+        pending.append(executor.submit(convert, chunk))
+      else:
+        future = Future()
+        future.set_result(convert(chunk))
+        pending.append(future)
 
-      f = {}
-      f["geom"] = self.prop.objType.geometry(self.settings, self._layer, feat, geom)
+    # initialize symbol rendering, and then get features (geometry, attributes, color, etc.) one by one
+    mapLayer = self.layer.mapLayer
+    renderer = mapLayer.renderer()
+    renderer.startRender(self.renderContext, mapLayer.fields())
+    try:
+      chunk = []
+      # reading features in spatial order needs an extra pass over the layer, so it is optional
+      fids = self._layer.fidsInSpatialOrder(self.request) if self.properties.get("checkBox_SpatialOrder", False) else None
 
-      if feat.material is not None:
-        f["mtl"] = feat.material
-      elif feat.model is not None:
-        f["model"] = feat.model
-      else:   # no material nor model
-        continue
+      for feat in self._layer.features(self.request, fids):
+        # material/model
+        if isModelFile:
+          feat.model = self.prop.objType.model(self.settings, self._layer, feat)
+        else:
+          feat.material = self.prop.objType.material(self.settings, self._layer, feat)
 
-      if feat.attributes is not None:
-        f["prop"] = feat.attributes
+        chunk.append(feat)
+        if len(chunk) == GEOMETRY_CHUNK_SIZE:
+          submit(chunk)
+          chunk = []
+          yield from collect()
 
-        if feat.labelHeight is not None:
-          f["lh"] = feat.labelHeight
+      if chunk:
+        submit(chunk)
+      yield from collect(wait_all=True)
 
-      feats.append(f)
+      if len(feats) or index == 0:
+        yield createBlockBuilder(index, feats, bbox)
 
-      if len(feats) == BLOCK_FEATURES:
-        yield createBlockBuilder(index, feats)
-        index += 1
-        feats = []
+    finally:
+      renderer.stopRender(self.renderContext)
 
-    if len(feats) or index == 0:
-      yield createBlockBuilder(index, feats)
+      if DEBUG_MODE:
+        self.prop.logStats()
+
+      if executor:
+        for future in pending:
+          future.cancel()
+        executor.shutdown()
 
 
 class FeatureBlockBuilder:
   
-  def __init__(self, blockIndex, data, pathRoot=None, urlRoot=None):
+  def __init__(self, blockIndex, data, pathRoot=None, urlRoot=None, attrsOnQuery=False, binary=False):
     self.blockIndex = blockIndex
     self.data = data
     self.pathRoot = pathRoot
     self.urlRoot = urlRoot
+    self.attrsOnQuery = attrsOnQuery
+    self.binary = binary
 
   def build(self):
+    if self.attrsOnQuery and self.pathRoot is not None and "attrs" in self.data:
+      self.writeAttributeShard()
+
+    if self.binary:
+      return self.buildBinary()
+
     if self.pathRoot is not None:
-      with open(self.pathRoot + "{0}.json".format(self.blockIndex), "w", encoding="utf-8") as f:
-        json.dump(self.data, f, ensure_ascii=False, indent=2 if DEBUG_MODE else None, default=json_default)
+      s = json.dumps(self.data, ensure_ascii=False, indent=2 if DEBUG_MODE else None, default=json_default)
+      writeFile(self.pathRoot + "{0}.json".format(self.blockIndex), s.encode("utf-8"))
 
-      url = self.urlRoot + "{0}.json".format(self.blockIndex)
-      return {"url": url}
+      return self.fileReference(self.urlRoot + "{0}.json".format(self.blockIndex))
 
     else:
-      return self.data
+      data = dict(self.data)
+      data["features"] = listFeatures(data["features"])
+      return data
+
+  def buildBinary(self):
+    """binary block consists of header length (uint32), JSON header padded to a multiple of 4 bytes,
+       float32 coordinates and uint32 offsets/indices"""
+    features, coords, indices = packFeatures(self.data["features"])
+
+    header = dict(self.data)
+    header["features"] = features
+    header["coords"] = len(coords)
+    header["indices"] = len(indices)
+    body = coords.tobytes() + indices.tobytes()
+
+    if self.pathRoot is not None:
+      h = json.dumps(header, ensure_ascii=False, default=json_default).encode("utf-8")
+      h += b" " * (-len(h) % 4)
+
+      writeFile(self.pathRoot + "{0}.bin".format(self.blockIndex), struct.pack("<I", len(h)) + h + body)
+
+      ref = self.fileReference(self.urlRoot + "{0}.bin".format(self.blockIndex))
+      ref["format"] = "bin"
+      return ref
+
+    else:
+      header["binary"] = QByteArray(body)
+      return header
+
+  def writeAttributeShard(self):
+    """write attribute columns to a separate file, and replace them with a reference to the file"""
+    s = json.dumps({"attrs": self.data["attrs"]}, ensure_ascii=False, default=json_default)
+    writeFile(self.pathRoot + "{0}a.json".format(self.blockIndex), s.encode("utf-8"))
+
+    self.data = dict(self.data)
+    self.data["attrs"] = {"url": self.urlRoot + "{0}a.json".format(self.blockIndex)}
+
+  def fileReference(self, url):
+    ref = {"url": url}
+    if "bbox" in self.data:
+      ref["bbox"] = self.data["bbox"]
+
+    # attribute shard file is referred also in layer data, so that the file is recorded in export manifest
+    attrs = self.data.get("attrs")
+    if isinstance(attrs, dict):
+      ref["attrs"] = attrs
+    return ref
 
 
 class Feature:
 
-  def __init__(self, layer, qGeom, altitude, propValues, attrs=None, labelHeight=None):
-    self.layerProp = layer.prop
+  __slots__ = ("layer", "geom", "arrays", "altitude", "values", "attributes", "labelHeight", "material", "model")
+
+  def __init__(self, layer, qGeom, altitude, propValues, attrs=None, labelHeight=None, arrays=None):
+    """arrays: coordinate arrays of the geometry given by transformGeometries"""
+    self.layer = layer
     self.geom = qGeom
-    self.geomType = layer.geomType
-    self.geomClass = layer.geomType2Class.get(layer.geomType)
+    self.arrays = arrays
     self.altitude = altitude
     self.values = propValues
     self.attributes = attrs
     self.labelHeight = labelHeight
 
-    self.material = -1
+    self.material = None
+    self.model = None
 
-  def geometry(self, mapTo3d, useZM=Geometry.NotUseZM, demProvider=None, clipGeom=None, baseExtent=None, demSize=None):
-    """demSize: grid size of the DEM layer which polygons overlay"""
+  def geometry(self, mapTo3d, useZM=Geometry.NotUseZM, demProvider=None, clipExtent=None, baseExtent=None, demSize=None):
+    """clipExtent: PreparedExtent to clip line/polygon geometry with
+       demSize: grid size of the DEM layer which polygons overlay"""
     geom = self.geom
+    arrays = self.arrays
     rotation = baseExtent.rotation()
+    layerProp = self.layer.prop
+    geomType = self.layer.geomType
+    geomClass = self.layer.geomClass
 
     if demProvider:
-      if self.layerProp.objType.name == "Overlay":
+      if layerProp.objType.name == "Overlay":
         center = baseExtent.center()
         half_width, half_height = baseExtent.width() / 2, baseExtent.height() / 2
         xmin, ymin = center.x() - half_width, center.y() - half_height
@@ -252,21 +553,24 @@ class Feature:
       z_func = lambda x, y: self.altitude
 
     # clip geometry
-    if clipGeom and self.geomType in [QgsWkbTypes.LineGeometry, QgsWkbTypes.PolygonGeometry]:
-      geom = geom.intersection(clipGeom)
-      if geom is None:
+    if clipExtent and geomType in [QgsWkbTypes.LineGeometry, QgsWkbTypes.PolygonGeometry]:
+      clipped = clipExtent.clip(geom)
+      if clipped is None:
         return None
 
+      if clipped is not geom:
+        geom, arrays = clipped, None
+
     # skip if geometry is empty or null
     if geom.isEmpty() or geom.isNull():
       logMessage("empty/null geometry skipped")
       return None
 
-    if self.geomType == QgsWkbTypes.PolygonGeometry:
-      if self.layerProp.objType.name == "Triangular Mesh":
-        return self.geomClass.fromQgsGeometry(geom, z_func, mapTo3d.transform, useZM=useZM)
+    if geomType == QgsWkbTypes.PolygonGeometry:
+      if layerProp.objType.name == "Triangular Mesh":
+        return geomClass.fromQgsGeometry(geom, z_func, mapTo3d, useZM=useZM, arrays=arrays)
 
-      if self.layerProp.objType.name == "Overlay" and self.layerProp.isHeightRelativeToDEM():
+      if layerProp.objType.name == "Overlay" and layerProp.isHeightRelativeToDEM():
 
         if rotation:
           geom.rotate(rotation, baseExtent.center())
@@ -274,15 +578,16 @@ class Feature:
         if rotation:
           geom.rotate(-rotation, baseExtent.center())
 
+        arrays = None
         useCentroidHeight = False
         centroidPerPolygon = False
       else:
         useCentroidHeight = True
         centroidPerPolygon = True
 
-      return self.geomClass.fromQgsGeometry(geom, z_func, mapTo3d.transform, useCentroidHeight, centroidPerPolygon)
+      return geomClass.fromQgsGeometry(geom, z_func, mapTo3d, useCentroidHeight, centroidPerPolygon, arrays=arrays)
 
-    return self.geomClass.fromQgsGeometry(geom, z_func, mapTo3d.transform, useZM=useZM)
+    return geomClass.fromQgsGeometry(geom, z_func, mapTo3d, useZM=useZM, arrays=arrays)
 
 
 class VectorLayer:
@@ -307,56 +612,126 @@ class VectorLayer:
     self.fieldIndices = []
     self.fieldNames = []
 
+    self.numericFields = []
+
     if self.writeAttrs:
       for index, field in enumerate(layer.fields()):
         if field.editorWidgetSetup().type() != "Hidden":
           self.fieldIndices.append(index)
           self.fieldNames.append(field.displayName())
+          self.numericFields.append(field.isNumeric())
 
   def hasLabel(self):
     return bool(self.labelAttrIndex is not None)
 
-  def features(self, request=None):
-    mapTo3d = self.settings.mapTo3d()
+  def fidsInSpatialOrder(self, request=None):
+    """returns ids of features sorted along a Hilbert curve over the base extent,
+       so that features in a block are spatially close to each other"""
     baseExtent = self.settings.baseExtent
-    baseExtentGeom = baseExtent.geometry()
-    rotation = baseExtent.rotation()
-    prop = self.prop
-    fields = self.layer.fields()
 
-    feats = []
-    for f in self.layer.getFeatures(request or QgsFeatureRequest()):
+    req = QgsFeatureRequest(request or QgsFeatureRequest())
+    req.setNoAttributes()
+
+    keys = []
+    for f in self.layer.getFeatures(req):
       geometry = f.geometry()
-      if geometry is None:
-        logMessage("null geometry skipped")
+      if geometry is None or geometry.isNull():
         continue
 
-      # coordinate transformation - layer crs to project crs
-      geom = QgsGeometry(geometry)
-      if geom.transform(self.transform) != 0:
-        logMessage("Failed to transform geometry")
+      try:
+        pt = self.transform.transform(geometry.boundingBox().center())
+      except QgsCsException:
         continue
 
-      # check if geometry intersects with the base extent (rotated rect)
-      if rotation and not baseExtentGeom.intersects(geom):
-        continue
+      pt = baseExtent.normalizePoint(pt.x(), pt.y())
+      keys.append((GeometryUtils.hilbertIndex(pt.x(), pt.y()), f.id()))
+
+    keys.sort()
+    return [fid for key, fid in keys]
+
+  def getFeatures(self, request=None, fids=None):
+    """generator which yields QgsFeature objects. if fids is specified, features are fetched in the order"""
+    request = request or QgsFeatureRequest()
+    if fids is None:
+      yield from self.layer.getFeatures(request)
+      return
 
-      # set feature to expression context
-      prop.setContextFeature(f)
+    for i in range(0, len(fids), SPATIAL_ORDER_BATCH):
+      batch = fids[i:i + SPATIAL_ORDER_BATCH]
 
-      # evaluate expression
-      altitude = prop.altitude()
-      propVals = prop.values(f)
+      req = QgsFeatureRequest(request)
+      req.setFilterFids(batch)
+      feats = {f.id(): f for f in self.layer.getFeatures(req)}
 
-      attrs = labelHeight = None
-      if self.writeAttrs:
-        attrs = [fields[i].displayString(f.attribute(i)) for i in self.fieldIndices]
+      for fid in batch:
+        f = feats.get(fid)
+        if f is not None:
+          yield f
 
-        if self.hasLabel():
-          labelHeight = prop.labelHeight() * mapTo3d.multiplierZ
+  def features(self, request=None, fids=None):
+    """generator which yields Feature objects"""
+    mapTo3d = self.settings.mapTo3d()
+    baseExtent = self.settings.baseExtent
+    preparedExtent = PreparedExtent(baseExtent)
+    rotation = baseExtent.rotation()
+    prop = self.prop
+    fields = self.layer.fields()
+
+    def evaluate(chunk):
+      # expressions which can be evaluated in columnar way are evaluated for the chunk at once
+      prop.prepareChunk([item[0] for item in chunk])
+
+      for f, geom, arrays in chunk:
+        # set feature to expression context
+        prop.setContextFeature(f)
+
+        # evaluate expression
+        altitude = prop.altitude()
+        propVals = prop.values(f)
+
+        attrs = labelHeight = None
+        if self.writeAttrs:
+          # values of numeric fields are exported as they are
+          attrs = []
+          for i, isNumeric in zip(self.fieldIndices, self.numericFields):
+            v = f.attribute(i)
+            if isNumeric:
+              attrs.append(v if isinstance(v, (int, float)) else None)    # NULL to None
+            else:
+              attrs.append(fields[i].displayString(v))
+
+          if self.hasLabel():
+            labelHeight = prop.labelHeight() * mapTo3d.multiplierZ
+
+        # create a feature object
+        yield Feature(self, geom, altitude, propVals, attrs, labelHeight, arrays)
+
+    def transform(chunk):
+      # coordinate transformation - layer crs to project crs, and then to 3D x and y.
+      # geometries in the chunk are transformed at once
+      feats = []
+      for f, (geom, arrays) in zip(chunk, transformGeometries([f.geometry() for f in chunk], self.transform, mapTo3d)):
+        if geom is None:
+          logMessage("Failed to transform geometry")
+          continue
+
+        # check if geometry intersects with the base extent (rotated rect)
+        if rotation and not preparedExtent.intersects(geom):
+          continue
+
+        feats.append((f, geom, arrays))
+      return feats
+
+    chunk = []
+    for f in self.getFeatures(request, fids):
+      if f.geometry() is None:
+        logMessage("null geometry skipped")
+        continue
 
-      # create a feature object
-      feat = Feature(self, geom, altitude, propVals, attrs, labelHeight)
-      feats.append(feat)
+      chunk.append(f)
+      if len(chunk) == EXPRESSION_CHUNK_SIZE:
+        yield from evaluate(transform(chunk))
+        chunk = []
 
-    return feats
+    if chunk:
+      yield from evaluate(transform(chunk))
@@ -25,8 +25,28 @@ DEBUG_MODE = 1
   # 1. JS console, qDebug
   # 2. JS console, qDebug, log file, "debug" element
 
+# texture rendering
+MAX_RENDER_JOBS = 4                # max number of map renderer jobs running concurrently
+MAX_RENDER_PIXELS = 4096 * 4096   # max number of pixels of an image rendered at once for multiple DEM blocks
+TEXTURE_CACHE_SIZE = 512 * 1024 * 1024   # max total size of rendered texture cache files in bytes. 0 to disable the cache
+IMAGE_MEMORY_SIZE = 256 * 1024 * 1024    # max total size of images kept in memory by image manager in bytes
+ENCODER_THREADS = 4                # number of worker threads to encode and write image files
+
+# DEM layer
+MIN_TEXTURE_SIZE = 64   # minimum width/height of a texture image of surrounding DEM block
+
 # vector layer
 BLOCK_FEATURES = 50   # max number of features in a block of vector layer features
+MAX_BLOCK_FEATURES = 10000   # max number of features in a block when vertex count or data size limit is set to the layer
+VERTEX_BYTES = 60          # estimated size of a vertex in JSON block data in bytes
+BINARY_VERTEX_BYTES = 12   # estimated size of a vertex in binary block data in bytes (3 float32 coordinates)
+SIMPLIFY_TOLERANCE = 0   # tolerance of line/polygon simplification in map canvas pixels. 0 to disable simplification
+SPATIAL_ORDER_BATCH = 1000   # number of features fetched at once when features are read in spatial order
+GEOMETRY_CHUNK_SIZE = 200   # number of features passed to a worker thread at once
+EXPRESSION_MEMO_FIELDS = 3      # max number of fields referred by an expression whose values are memoized on the field values
+EXPRESSION_MEMO_SIZE = 10000    # max number of memoized values per expression
+EXPRESSION_CHUNK_SIZE = 4096    # number of features whose simple numeric expressions are evaluated at once with numpy
+COLUMNAR_EVALUATION = True      # evaluate simple numeric expressions with numpy. False to always use QgsExpression
 
 # default export settings
 class DEF_SETS:
@@ -19,14 +19,21 @@
  *                                                                         *
  ***************************************************************************/
 """
+import math
 import os
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from PyQt5.QtCore import Qt, QSize, QUrl
-from PyQt5.QtGui import QColor, QImage, QPainter
-from qgis.core import QgsMapLayer
+from PyQt5.QtCore import Qt, QRect, QSettings, QSize, QUrl
+from PyQt5.QtGui import QColor, QImage, QImageWriter, QPainter
+from qgis.core import QgsMapLayer, QgsMapRendererCustomPainterJob, QgsMapRendererParallelJob, QgsMapSettings, QgsRectangle
 
 from . import qgis2threejstools as tools
+from .conf import DEBUG_MODE, ENCODER_THREADS, IMAGE_MEMORY_SIZE, MAX_RENDER_JOBS, MAX_RENDER_PIXELS, TEXTURE_CACHE_SIZE
 from .qgis2threejstools import logMessage
+from .rotatedrect import RotatedRect
+from .texturecache import TextureCache
 
 
 class DataManager:
@@ -54,10 +61,33 @@ class ImageManager(DataManager):
   MAP_IMAGE = 3
   LAYER_IMAGE = 4
 
+  # image file formats: extension and MIME type
+  FORMATS = {"PNG": (".png", "image/png"),
+             "JPEG": (".jpg", "image/jpeg"),
+             "WEBP": (".webp", "image/webp")}
+
+  # image files with these extensions are copied as they are
+  WEB_IMAGE_TYPES = {".png": "image/png",
+                     ".jpg": "image/jpeg",
+                     ".jpeg": "image/jpeg",
+                     ".gif": "image/gif"}
+
   def __init__(self, exportSettings):
     DataManager.__init__(self)
     self.exportSettings = exportSettings
-    self._renderer = None
+    self._images = OrderedDict()    # produced images in least recently used order. key is image index.
+    self._imageBytes = 0
+    self._cache = TextureCache() if TEXTURE_CACHE_SIZE and QSettings().value("/Qgis2threejs/textureCache", True, type=bool) else None
+
+    # counters
+    self.requestCount = 0     # number of image() calls
+    self.memoryHitCount = 0   # number of images returned from memory
+    self.renderCount = 0      # number of images rendered with map renderer jobs
+    self.cacheHitCount = 0    # number of images loaded from disk cache
+
+    # image encoding on worker threads
+    self._executor = None
+    self._futures = []
 
   def imageIndex(self, path):
     img = (self.IMAGE_FILE, path)
@@ -90,23 +120,13 @@ class ImageManager(DataManager):
     painter.end()
     return image
 
-  def renderedImage(self, width, height, extent, transp_background=False, layerids=None):
-    # render layers with QgsMapRendererCustomPainterJob
-    from qgis.core import QgsMapRendererCustomPainterJob
-    antialias = True
-    settings = self.exportSettings.mapSettings
-
-    # store old map settings
-    old_outputSize = settings.outputSize()
-    old_extent = settings.extent()
-    old_rotation = settings.rotation()
-    old_layerids = settings.layerIds()
-    old_backgroundColor = settings.backgroundColor()
-
-    # map settings
+  def mapSettings(self, width, height, extent, transp_background=False, layerids=None):
+    """returns a copy of map settings for rendering an image. map settings of export settings are not modified."""
+    settings = QgsMapSettings(self.exportSettings.mapSettings)
     settings.setOutputSize(QSize(width, height))
     settings.setExtent(extent.unrotatedRect())
     settings.setRotation(extent.rotation())
+    settings.setFlag(QgsMapSettings.Antialiasing, True)
 
     if layerids:
       settings.setLayers(tools.getLayersByLayerIds(layerids))
@@ -114,38 +134,236 @@ class ImageManager(DataManager):
     if transp_background:
       settings.setBackgroundColor(QColor(Qt.transparent))
 
-    has_pluginlayer = False
-    for layer in settings.layers():
-      if layer and layer.type() == QgsMapLayer.PluginLayer:
-        has_pluginlayer = True
-        break
+    return settings
+
+  def renderedImage(self, width, height, extent, transp_background=False, layerids=None):
+    return self.renderImages([(width, height, extent, transp_background, layerids)])[0]
+
+  def renderImages(self, requests):
+    """render images with parallel map renderer jobs.
+       requests: list of (width, height, extent, transp_background, layerids) tuples
+       returns a list of QImage objects"""
+    images = [None] * len(requests)
+    keys = [None] * len(requests)
+    running = []
+
+    if self._cache:
+      self._cache.clearFingerprints()   # layer styles might have been changed since last rendering
+
+    for i, request in enumerate(requests):
+      settings = self.mapSettings(*request)
+
+      if self._cache:
+        keys[i] = self._cache.key(settings)
+        if keys[i]:
+          images[i] = self._cache.get(keys[i])
+          if images[i] is not None:
+            self.cacheHitCount += 1
+            keys[i] = None
+            continue
+
+      has_pluginlayer = False
+      for layer in settings.layers():
+        if layer and layer.type() == QgsMapLayer.PluginLayer:
+          has_pluginlayer = True
+          break
+
+      if has_pluginlayer:
+        images[i] = self._renderSynchronously(settings)   # so that TileLayerPlugin layer is rendered correctly
+        self.renderCount += 1
+        continue
+
+      if len(running) >= MAX_RENDER_JOBS:
+        j, job = running.pop(0)
+        job.waitForFinished()
+        images[j] = job.renderedImage()
+
+      job = QgsMapRendererParallelJob(settings)
+      job.start()
+      self.renderCount += 1
+      running.append((i, job))
+
+    for j, job in running:
+      job.waitForFinished()
+      images[j] = job.renderedImage()
+
+    # store newly rendered images in the cache
+    if self._cache and any(keys):
+      for key, image in zip(keys, images):
+        if key:
+          self._cache.put(key, image)
+      self._cache.evict()
+
+    return images
+
+  def _renderSynchronously(self, settings):
+    # render layers with QgsMapRendererCustomPainterJob
+    size = settings.outputSize()
+    image = QImage(size.width(), size.height(), QImage.Format_ARGB32_Premultiplied)
+    image.fill(settings.backgroundColor())
 
-    # create an image
-    image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
     painter = QPainter()
     painter.begin(image)
-    if antialias:
-      painter.setRenderHint(QPainter.Antialiasing)
-
-    # rendering
+    painter.setRenderHint(QPainter.Antialiasing)
     job = QgsMapRendererCustomPainterJob(settings, painter)
-    if has_pluginlayer:
-      job.renderSynchronously()   # use this method so that TileLayerPlugin layer is rendered correctly
-    else:
-      job.start()
-      job.waitForFinished()
+    job.renderSynchronously()
     painter.end()
+    return image
 
-    # restore map settings
-    settings.setOutputSize(old_outputSize)
-    settings.setExtent(old_extent)
-    settings.setRotation(old_rotation)
-    settings.setLayers(tools.getLayersByLayerIds(old_layerids))
-    settings.setBackgroundColor(old_backgroundColor)
+  def render(self, indices):
+    """render map, layer and canvas images at once. image() returns the rendered images afterwards.
+       indices: list of image indices. images of other types are ignored."""
+    indices = [i for i in dict.fromkeys(indices) if i not in self._images]
+    requests = []
+    for index in indices:
+      imageType, args = self._list[index]
+      if imageType == self.MAP_IMAGE:
+        width, height, extent, transp_background = args
+        requests.append((width, height, extent, transp_background, None))
+
+      elif imageType == self.LAYER_IMAGE:
+        layerids, width, height, extent, transp_background = args
+        requests.append((width, height, extent, transp_background, layerids))
+
+      elif imageType == self.CANVAS_IMAGE:
+        size = self.exportSettings.mapSettings.outputSize()
+        requests.append((size.width(), size.height(), self.exportSettings.baseExtent, args, None))
 
-    return image
+      else:
+        requests.append(None)
+
+    images = self.renderImages([r for r in requests if r])
+    for index, request in zip(indices, requests):
+      if request:
+        self._store(index, images.pop(0))
+
+  def prerender(self, requests, transp_background=False, layerids=None):
+    """render map images of adjacent non-rotated extents (e.g. DEM blocks) in as few rendering passes as possible,
+       and slice the rendered images into requested images. images of rotated extents are rendered separately.
+       image() returns the sliced images afterwards. all the rendering passes are performed in parallel.
+       requests: list of (width, height, extent) tuples
+       layerids: layer images are rendered if specified. otherwise, map images are rendered."""
+    tiles = []
+    rotated = []
+    for width, height, extent in requests:
+      if layerids is None:
+        index = self.mapImageIndex(width, height, extent, transp_background)
+      else:
+        index = self.layerImageIndex(layerids, width, height, extent, transp_background)
+
+      if index in self._images:
+        continue
+
+      if extent.rotation():
+        rotated.append(index)
+      else:
+        tiles.append((extent.width() / width, extent.height() / height, index, width, height, extent.unrotatedRect()))
+
+    # group tiles by resolution. tiles in a group are rendered at the finest resolution in the group
+    # (sizes of sub-block textures differ slightly due to rounding)
+    groups = []
+    for tile in sorted(tiles, key=lambda t: t[:3]):
+      for group in groups:
+        if tile[0] < group[0][0] * 1.01 and tile[1] < group[0][1] * 1.01:
+          group.append(tile)
+          break
+      else:
+        groups.append([tile])
+
+    passes = []
+    for group in groups:
+      mupp_x = min(t[0] for t in group)
+      mupp_y = min(t[1] for t in group)
+      self._renderPasses([t[2:] for t in group], mupp_x, mupp_y, passes)
+
+    images = self.renderImages([(width, height, extent, transp_background, layerids) for width, height, extent, _ in passes])
+    for image, (width, height, extent, tiles) in zip(images, passes):
+      rect = extent.unrotatedRect()
+      x0, y1 = rect.xMinimum(), rect.yMaximum()
+      mupp_x, mupp_y = rect.width() / width, rect.height() / height
+      for index, w, h, r in tiles:
+        left = round((r.xMinimum() - x0) / mupp_x)
+        top = round((y1 - r.yMaximum()) / mupp_y)
+        right = round((r.xMaximum() - x0) / mupp_x)
+        bottom = round((y1 - r.yMinimum()) / mupp_y)
+        img = image.copy(QRect(left, top, right - left, bottom - top))
+        if img.width() != w or img.height() != h:
+          img = img.scaled(w, h, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        self._store(index, img)
+
+      if DEBUG_MODE:
+        logMessage("Rendered an image of {0} x {1} px and sliced it into {2} images.".format(width, height, len(tiles)))
+
+    self.render(rotated)
+
+  def _renderPasses(self, tiles, mupp_x, mupp_y, passes):
+    """tiles: list of (image index, width, height, QgsRectangle) tuples
+       appends (width, height, extent, tiles) tuples of rendering passes to passes"""
+    bbox = QgsRectangle(tiles[0][3])
+    area = 0
+    for tile in tiles:
+      bbox.combineExtentWith(tile[3])
+      area += tile[3].width() * tile[3].height()
+
+    width = max(1, math.ceil(bbox.width() / mupp_x - 0.01))
+    height = max(1, math.ceil(bbox.height() / mupp_y - 0.01))
+
+    # split tiles into two groups if the image is too large or the tiles do not fill the bounding box
+    if len(tiles) > 1 and (width * height > MAX_RENDER_PIXELS or area < bbox.width() * bbox.height() * 0.999):
+      for t in self._splitTiles(tiles, bbox, mupp_x, mupp_y):
+        self._renderPasses(t, mupp_x, mupp_y, passes)
+      return
+
+    # extend the extent to the right and bottom so that its aspect ratio matches the image size
+    x0, y1 = bbox.xMinimum(), bbox.yMaximum()
+    rect = QgsRectangle(x0, y1 - height * mupp_y, x0 + width * mupp_x, y1)
+    passes.append((width, height, RotatedRect(rect.center(), rect.width(), rect.height()), tiles))
+
+  @staticmethod
+  def _splitTiles(tiles, bbox, mupp_x, mupp_y):
+    # split tiles at a tile boundary near the middle of the longer side of the bounding box
+    keys = [lambda t: round(t[3].xMinimum() / mupp_x), lambda t: round(-t[3].yMaximum() / mupp_y)]
+    if bbox.width() / mupp_x < bbox.height() / mupp_y:
+      keys.reverse()
+
+    for key in keys:
+      values = sorted(set(key(t) for t in tiles))
+      if len(values) > 1:
+        mid = values[len(values) // 2]
+        return [[t for t in tiles if key(t) < mid], [t for t in tiles if key(t) >= mid]]
+
+    return [[t] for t in tiles]
+
+  def clearMemory(self):
+    """discard images kept in memory, e.g. when map canvas or image files might have been changed"""
+    self._images.clear()
+    self._imageBytes = 0
+
+  def _store(self, index, image):
+    """memorize an image. least recently used images are discarded when total size exceeds IMAGE_MEMORY_SIZE."""
+    if index in self._images:
+      self._imageBytes -= self._images.pop(index).byteCount()
+
+    self._images[index] = image
+    self._imageBytes += image.byteCount()
+
+    while self._imageBytes > IMAGE_MEMORY_SIZE and len(self._images) > 1:
+      _, img = self._images.popitem(last=False)
+      self._imageBytes -= img.byteCount()
 
   def image(self, index):
+    self.requestCount += 1
+    image = self._images.get(index)
+    if image is not None:
+      self.memoryHitCount += 1
+      self._images.move_to_end(index)
+      return image
+
+    image = self._image(index)
+    self._store(index, image)
+    return image
+
+  def _image(self, index):
     image = self._list[index]
     imageType = image[0]
     if imageType == self.IMAGE_FILE:
@@ -170,18 +388,103 @@ class ImageManager(DataManager):
     transp_background = image[1]
     return self.mapCanvasImage(transp_background)
 
-  def base64image(self, index):
+  @staticmethod
+  def isFormatSupported(fmt):
+    fmt = fmt.lower().encode("ascii")
+    return fmt in [f.data().lower() for f in QImageWriter.supportedImageFormats()]
+
+  def passthroughFile(self, index):
+    """returns path of an image file which can be used in web browser without re-encoding, or None"""
+    imageType, path = self._list[index]
+    if imageType == self.IMAGE_FILE and os.path.splitext(path)[1].lower() in self.WEB_IMAGE_TYPES and os.path.isfile(path):
+      return path
+    return None
+
+  def imageFormat(self, index, fmt="PNG"):
+    """returns format to encode image of given index in.
+       fmt: AUTO, PNG, JPEG or WEBP. AUTO means JPEG for opaque images and PNG for images with transparency."""
+    if fmt == "AUTO":
+      imageType, args = self._list[index]
+      if imageType in (self.MAP_IMAGE, self.LAYER_IMAGE):
+        transparent = args[-1]
+      elif imageType == self.CANVAS_IMAGE:
+        transparent = args
+      else:
+        transparent = self.image(index).hasAlphaChannel()
+      fmt = "PNG" if transparent else "JPEG"
+
+    if fmt not in self.FORMATS or not self.isFormatSupported(fmt):
+      if fmt != "PNG":
+        logMessage("Image format {0} is not supported. PNG is used instead.".format(fmt))
+      fmt = "PNG"
+    return fmt
+
+  @staticmethod
+  def encoderQuality(fmt, quality):
+    """quality option is for JPEG and WebP. Qt takes it as compression level for PNG, so the default is used for PNG"""
+    return -1 if fmt == "PNG" else quality
+
+  def extension(self, index, fmt="PNG"):
+    path = self.passthroughFile(index)
+    if path:
+      return os.path.splitext(path)[1].lower()
+    return self.FORMATS[self.imageFormat(index, fmt)][0]
+
+  def base64image(self, index, fmt="PNG", quality=-1):
+    path = self.passthroughFile(index)
+    if path:
+      with open(path, "rb") as f:
+        data = f.read()
+      return tools.base64data(data, self.WEB_IMAGE_TYPES[os.path.splitext(path)[1].lower()])
+
     image = self.image(index)
     if image:
-      return tools.base64image(image)
+      fmt = self.imageFormat(index, fmt)
+      return tools.base64image(image, fmt, self.encoderQuality(fmt, quality), self.FORMATS[fmt][1])
     return None
 
-  def write(self, index, path):
-    self.image(index).save(path)
+  def write(self, index, path, fmt="PNG", quality=-1):
+    """write image to a file on a worker thread. call flush() to wait for completion.
+       an image file which is usable in web browser is copied without re-encoding."""
+    if self._executor is None:
+      self._executor = ThreadPoolExecutor(ENCODER_THREADS)
+
+    src = self.passthroughFile(index)
+    if src:
+      self._futures.append(self._executor.submit(self._copyFile, src, path))
+    else:
+      fmt = self.imageFormat(index, fmt)
+      self._futures.append(self._executor.submit(self._saveImage, self.image(index), path, fmt, self.encoderQuality(fmt, quality)))
+
+  @staticmethod
+  def _copyFile(src, path):
+    shutil.copyfile(src, path)
+    return path, True
+
+  @staticmethod
+  def _saveImage(image, path, fmt, quality):
+    return path, image.save(path, fmt, quality)
 
-  def writeAll(self, pathRoot):
+  def writeAll(self, pathRoot, fmt="PNG", quality=-1):
     for i in range(self.count()):
-      self.image(i).save("{0}{1}.png".format(pathRoot, i))
+      self.write(i, "{0}{1}{2}".format(pathRoot, i, self.extension(i, fmt)), fmt, quality)
+    self.flush()
+
+  def flush(self):
+    """wait for image files being written on worker threads"""
+    for future in self._futures:
+      try:
+        path, ok = future.result()
+        if not ok:
+          logMessage("Failed to write an image file: {0}".format(path))
+      except Exception as e:
+        logMessage("Failed to write an image file: {0}".format(str(e)))
+    self._futures = []
+
+  def logStats(self):
+    logMessage("Images: {0} requested, {1} from memory, {2} rendered, {3} from disk cache ({4} in memory, {5:.1f} MB)".format(
+               self.requestCount, self.memoryHitCount, self.renderCount, self.cacheHitCount,
+               len(self._images), self._imageBytes / 1024 / 1024))
 
 
 class MaterialManager(DataManager):
@@ -255,7 +558,23 @@ class MaterialManager(DataManager):
     mtl = (self.SPRITE_IMAGE, (path_url, transp_background), opacity, False)
     return self._index(mtl)
 
-  def build(self, index, imageManager, filepath=None, url=None, base64=False):
+  def renderImages(self, imageManager, start=0):
+    """render canvas, map and layer images of materials at once"""
+    indices = []
+    for mtl in self._list[start:]:
+      if mtl[0] == self.CANVAS_IMAGE:
+        indices.append(imageManager.canvasImageIndex(mtl[1]))
+      elif mtl[0] == self.MAP_IMAGE:
+        indices.append(imageManager.mapImageIndex(*mtl[1]))
+      elif mtl[0] == self.LAYER_IMAGE:
+        indices.append(imageManager.layerImageIndex(*mtl[1]))
+
+    if indices:
+      imageManager.render(indices)
+
+  def build(self, index, imageManager, filepath=None, url=None, base64=False, imageFormat="PNG", imageQuality=-1):
+    """imageFormat: AUTO, PNG, JPEG or WEBP. file extensions of filepath and url are replaced according to image format.
+       imageQuality: quality of JPEG/WebP (0-100). -1 means default. not used for PNG."""
     mtl = self._list[index]
     m = {
       "type": mtl[0] if mtl[0] in [self.LINE_BASIC, self.LINE_DASHED, self.SPRITE_IMAGE] else self.basicMaterialType
@@ -279,20 +598,24 @@ class MaterialManager(DataManager):
         if path_url.startswith("http:") or path_url.startswith("https:"):
           url = path_url
           filepath = None
+          imgIndex = None
         else:
           imgIndex = imageManager.imageIndex(path_url)
 
       if url is None:
         if base64:
-          m["image"] = {"base64": imageManager.base64image(imgIndex)}
+          m["image"] = {"base64": imageManager.base64image(imgIndex, imageFormat, imageQuality)}
         else:
           m["image"] = {"object": imageManager.image(imgIndex)}
       else:
-        m["image"] = {"url": url}
-
         if filepath:
           # write image to a file
-          imageManager.write(imgIndex, filepath)
+          ext = imageManager.extension(imgIndex, imageFormat)
+          filepath = os.path.splitext(filepath)[0] + ext
+          url = os.path.splitext(url)[0] + ext
+          imageManager.write(imgIndex, filepath, imageFormat, imageQuality)
+
+        m["image"] = {"url": url}
     else:
       m["c"] = int(mtl[1], 16)    # color
 
@@ -315,15 +638,29 @@ class MaterialManager(DataManager):
 
     return m
 
-  def buildAll(self, imageManager, pathRoot=None, urlRoot=None, base64=False):
+  def filePaths(self):
+    """returns paths of local image files used by the materials"""
+    paths = []
+    for mtl in self._list:
+      if mtl[0] in [self.IMAGE_FILE, self.SPRITE_IMAGE]:
+        path = mtl[1][0]
+        if path not in paths and os.path.isfile(path):
+          paths.append(path)
+    return paths
+
+  def buildAll(self, imageManager, pathRoot=None, urlRoot=None, base64=False, start=0, imageFormat="PNG", imageQuality=-1):
+    """start: index of first material to build
+       imageFormat, imageQuality: see build()"""
+    self.renderImages(imageManager, start)
+
     mList = []
-    for i in range(len(self._list)):
+    for i in range(start, len(self._list)):
       if pathRoot is None:
         filepath = url = None
       else:
         filepath = "{0}{1}.png".format(pathRoot, i)
         url = "{0}{1}.png".format(urlRoot, i)
-      mList.append(self.build(i, imageManager, filepath, url, base64))
+      mList.append(self.build(i, imageManager, filepath, url, base64, imageFormat, imageQuality))
     return mList
 
 
@@ -336,9 +673,9 @@ class ModelManager(DataManager):
   def modelIndex(self, path):
     return self._index(path)
 
-  def build(self, export=True):
+  def build(self, export=True, start=0):
     l = []
-    for path_url in self._list:
+    for path_url in self._list[start:]:
       if path_url.startswith("http:") or path_url.startswith("https:"):
         url = path_url
       elif export:
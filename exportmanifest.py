@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ExportManifest
+                              -------------------
+        begin                : 2026-10-19
+        copyright            : (C) 2026 Qgis2threejs contributors
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+import hashlib
+import json
+import os
+
+from .conf import DEBUG_MODE
+from .qgis2threejstools import abchex, logMessage
+
+
+class ExportManifest:
+  """manifest of exported data, which records input fingerprint of each layer, layer data and
+     hashes of files written for the layer. it is used to skip building layers which have not been
+     changed since previous export, and to remove files which are no longer used.
+     parts of a layer (e.g. grid and texture of a DEM block) can be recorded with their own fingerprints,
+     so that unchanged parts of a changed layer are not built again. see BlockCache."""
+
+  FILENAME = "manifest.json"
+  VERSION = 3
+
+  def __init__(self, dataDir, urlRoot):
+    self.dataDir = dataDir
+    self.urlRoot = urlRoot
+    self.path = os.path.join(dataDir, self.FILENAME)
+
+    self._old = self.load()
+    self._layers = {}
+    self._prefixes = set(e["prefix"] for e in self._old.values())
+
+  def load(self):
+    try:
+      with open(self.path, "r", encoding="utf-8") as f:
+        obj = json.load(f)
+      if obj.get("version") == self.VERSION:
+        return obj.get("layers", {})
+    except (OSError, ValueError) as e:
+      if os.path.exists(self.path):
+        logMessage("Failed to read export manifest: " + str(e))
+    return {}
+
+  def prefix(self, layerId):
+    """returns file name prefix for the layer. the prefix used in previous export is kept"""
+    e = self._old.get(layerId)
+    if e:
+      return e["prefix"]
+
+    index = 0
+    while abchex(index) in self._prefixes:
+      index += 1
+
+    prefix = abchex(index)
+    self._prefixes.add(prefix)
+    return prefix
+
+  def layerData(self, layerId, fingerprint=None):
+    """returns layer data exported previously if the layer has not been changed and its files have not
+       been modified or removed, otherwise None. if fingerprint is None, fingerprint check is skipped."""
+    e = self._old.get(layerId)
+    if e is None or (fingerprint is not None and e["fingerprint"] != fingerprint):
+      return None
+
+    # local files read while building the layer, e.g. icon images
+    for path, info in e.get("inputs", {}).items():
+      if self.inputInfo(path) != info:
+        if DEBUG_MODE:
+          logMessage("Input file modified or removed: " + path)
+        return None
+
+    for filename, info in e["files"].items():
+      if not self.verifyFile(filename, info):
+        if DEBUG_MODE:
+          logMessage("File modified or removed: " + filename)
+        return None
+
+    self._layers[layerId] = e
+    return e["data"]
+
+  def addLayer(self, layerId, prefix, fingerprint, data, inputs=(), blockCache=None):
+    """inputs: paths of local files read while building the layer. the layer is rebuilt if any of them is modified.
+       blockCache: BlockCache used to build the layer"""
+    files = dict.fromkeys(self.files(data))
+    e = {"prefix": prefix,
+         "fingerprint": fingerprint,
+         "data": data,
+         "files": files,
+         "inputs": {path: self.inputInfo(path) for path in inputs}}
+
+    if blockCache:
+      e["blocks"] = blockCache.blocks
+
+      # files of reused parts have been verified
+      for filename, info in blockCache.verified.items():
+        if filename in files:
+          files[filename] = info
+
+    self._layers[layerId] = e
+
+  def blockCache(self, layerId, inputs):
+    """returns a BlockCache of the layer. inputs: dictionary of part name and fingerprint of its inputs"""
+    return BlockCache(self, self._old.get(layerId, {}), inputs)
+
+  def files(self, data):
+    """returns names of files in data directory referred by urls in layer data"""
+    files = []
+
+    def walk(obj):
+      if isinstance(obj, dict):
+        url = obj.get("url")
+        if isinstance(url, str) and url.startswith(self.urlRoot):
+          files.append(url[len(self.urlRoot):])
+
+        for v in obj.values():
+          walk(v)
+
+      elif isinstance(obj, list):
+        for v in obj:
+          walk(v)
+
+    walk(data)
+    return files
+
+  def save(self):
+    """calculate hashes of files written in this export, remove files which are no longer used, and write manifest.
+       call this after all files have been written."""
+    for e in self._layers.values():
+      files = e["files"]
+      for filename, info in files.items():
+        if info is None:
+          files[filename] = self.fileInfo(filename)
+
+    # remove orphaned files
+    used = set()
+    for e in self._layers.values():
+      used.update(e["files"])
+
+    for e in self._old.values():
+      for filename in e["files"]:
+        if filename not in used:
+          try:
+            os.remove(os.path.join(self.dataDir, filename))
+            if DEBUG_MODE:
+              logMessage("Removed unused file: " + filename)
+          except OSError:
+            pass
+
+    with open(self.path, "w", encoding="utf-8") as f:
+      json.dump({"version": self.VERSION, "layers": self._layers}, f, indent=2 if DEBUG_MODE else None)
+
+  def fileInfo(self, filename):
+    """returns hash, size and modification time of a file in data directory, or None if the file does not exist"""
+    path = os.path.join(self.dataDir, filename)
+    try:
+      stat = os.stat(path)
+    except OSError:
+      return None
+
+    digest = self.fileHash(path)
+    if digest is None:
+      return None
+    return {"sha1": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+  def verifyFile(self, filename, info):
+    """returns True if the file has the same content as recorded in the manifest. the file is hashed
+       only when its size or modification time has been changed, and then the record is updated"""
+    if not info:
+      return False
+
+    try:
+      stat = os.stat(os.path.join(self.dataDir, filename))
+    except OSError:
+      return False
+
+    if stat.st_size == info["size"] and stat.st_mtime_ns == info["mtime"]:
+      return True
+
+    if stat.st_size != info["size"] or self.fileHash(os.path.join(self.dataDir, filename)) != info["sha1"]:
+      return False
+
+    info["mtime"] = stat.st_mtime_ns
+    return True
+
+  @staticmethod
+  def inputInfo(path):
+    """returns size and modification time of a local file, or None if it does not exist"""
+    try:
+      stat = os.stat(path)
+    except OSError:
+      return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+  @staticmethod
+  def fileHash(path):
+    h = hashlib.sha1()
+    try:
+      with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+          h.update(chunk)
+    except OSError:
+      return None
+    return h.hexdigest()
+
+
+class BlockCache:
+  """data of block parts exported previously for a layer. a part, e.g. grid or texture of a DEM block,
+     is reused if the fingerprint of its inputs has not been changed and its files have not been modified.
+     parts are checked before they are built, so that unchanged parts are neither built nor written."""
+
+  def __init__(self, manifest, entry, inputs):
+    """entry: previous manifest entry of the layer
+       inputs: dictionary of part name and fingerprint of inputs common to the blocks, or None if unknown"""
+    self.manifest = manifest
+    self.inputs = inputs
+    self._old = entry.get("blocks", {})
+    self._files = entry.get("files", {})
+
+    self.blocks = {}      # part records of this export
+    self.verified = {}    # file name and info of files of reused parts
+
+  def fingerprint(self, name, params):
+    """returns fingerprint of a part from the common inputs and parameters of the block, or None if the part
+       cannot be cached"""
+    inputs = self.inputs.get(name)
+    if inputs is None:
+      return None
+    return hashlib.sha1(json.dumps([name, inputs, params], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+  def get(self, key, fingerprint):
+    """returns part data exported previously, or None if it needs to be built"""
+    r = self._old.get(key)
+    if fingerprint is None or r is None or r["fingerprint"] != fingerprint:
+      return None
+
+    verified = {}
+    for filename in self.manifest.files(r["data"]):
+      info = self._files.get(filename)
+      if not self.manifest.verifyFile(filename, info):
+        return None
+      verified[filename] = info
+
+    if DEBUG_MODE:
+      logMessage("Block part not changed: " + key)
+
+    self.verified.update(verified)
+    self.blocks[key] = r
+    return r["data"]
+
+  def put(self, key, fingerprint, data):
+    if fingerprint is not None:
+      self.blocks[key] = {"fingerprint": fingerprint, "data": data}
@@ -18,9 +18,12 @@
  *                                                                         *
  ***************************************************************************/
 """
+import struct
+
+import numpy
 from qgis.core import (
-  QgsGeometry, QgsPointXY, QgsRectangle, QgsFeature, QgsSpatialIndex, QgsCoordinateTransform, QgsFeatureRequest,
-  QgsPoint, QgsMultiPoint, QgsLineString, QgsMultiLineString, QgsPolygon, QgsMultiPolygon, QgsProject)
+  QgsGeometry, QgsPointXY, QgsRectangle, QgsFeature, QgsSpatialIndex, QgsCoordinateTransform, QgsCsException,
+  QgsFeatureRequest, QgsLineString, QgsProject, QgsWkbTypes)
 
 from .qgis2threejstools import logMessage
 
@@ -40,276 +43,350 @@ class Point:
 
 
 def pointToQgsPoint(point):
-  return QgsPointXY(point.x, point.y)
+  return QgsPointXY(point[0], point[1])
 
 
 def lineToQgsPolyline(line):
-  return [pointToQgsPoint(pt) for pt in line]
+  return [QgsPointXY(x, y) for x, y in line[:, :2].tolist()]
 
 
 def polygonToQgsPolygon(polygon):
   return [lineToQgsPolyline(line) for line in polygon]
 
 
+def offsetsFromCounts(counts):
+  """returns offsets array (length: len(counts) + 1) of consecutive items whose counts are given"""
+  offsets = numpy.zeros(len(counts) + 1, dtype=int)
+  numpy.cumsum(counts, out=offsets[1:])
+  return offsets
+
+
+def concatArrays(arrays, dim=3):
+  """concatenates coordinate arrays into an array, and returns it with offsets of the arrays"""
+  if not arrays:
+    return numpy.empty((0, dim)), numpy.zeros(1, dtype=int)
+  return numpy.concatenate(arrays), offsetsFromCounts([len(a) for a in arrays])
+
+
+def splitAt(seq, offsets):
+  """splits an array or a list at offsets"""
+  offsets = offsets.tolist()
+  return [seq[i:j] for i, j in zip(offsets[:-1], offsets[1:])]
+
+
+class CoordinateList:
+  """nested lists of vertices which are stored in a coordinate array (shape (n, dim)) and offset arrays.
+     offset arrays are ordered from the innermost level, e.g. offsets of rings in vertices and offsets
+     of polygons in rings. vertex lists are serialized as lists of coordinate lists, or flat lists of
+     coordinates if flat is True."""
+
+  def __init__(self, coords, offsets=(), flat=False):
+    self.coords = coords
+    self.offsets = list(offsets)
+    self.flat = flat
+
+  @property
+  def dim(self):
+    return self.coords.shape[1]
+
+  def toList(self):
+    if not self.offsets:
+      return self.coords.ravel().tolist() if self.flat else self.coords.tolist()
+
+    lst = [c.ravel().tolist() if self.flat else c.tolist() for c in splitAt(self.coords, self.offsets[0])]
+    for offsets in self.offsets[1:]:
+      lst = splitAt(lst, offsets)
+    return lst
+
+  @classmethod
+  def fromArrays(cls, arrays, dim=3):
+    """creates a CoordinateList from a list of lists of coordinate arrays (e.g. polygons of rings)"""
+    coords, offsets = concatArrays([a for lst in arrays for a in lst], dim)
+    return cls(coords, [offsets, offsetsFromCounts([len(lst) for lst in arrays])])
+
+
 class Geometry:
+  """base class of geometries. 3D coordinates are stored in numpy arrays of shape (n, 3),
+     and parts (lines, rings and polygons) are specified with offset arrays."""
 
   NotUseZM = 0
   UseZ = 1
   UseM = 2
 
+  def vertices(self):
+    return numpy.empty((0, 3))
+
+  def vertexCount(self):
+    return len(self.vertices())
+
+  def bounds(self):
+    """returns [xmin, ymin, zmin, xmax, ymax, zmax] of vertices, or None if geometry has no vertex"""
+    v = self.vertices()
+    if not len(v):
+      return None
+    return v.min(axis=0).tolist() + v.max(axis=0).tolist()
+
+  @staticmethod
+  def coordinateArrays(geometry, nested=False):
+    """returns coordinate arrays (shape (n, dim)) of a QgsGeometry. see wkbCoordinateArrays.
+       curved geometry is segmentized. returns None if the geometry cannot be read."""
+    wkb = bytearray(geometry.asWkb().data())
+    if not wkb:
+      return []
+
+    arrays = wkbCoordinateArrays(wkb, nested)
+    if arrays is None:
+      arrays = wkbCoordinateArrays(bytearray(geometry.constGet().segmentize().asWkb().data()), nested)
+    return arrays
+
+  @staticmethod
+  def zmColumn(geometry, useZM):
+    """returns index of z or m column in coordinate arrays of the geometry, or None if the geometry does not have the value"""
+    wkbType = geometry.wkbType()
+    hasZ = QgsWkbTypes.hasZ(wkbType)
+    if useZM == Geometry.UseZ:
+      return 2 if hasZ else None
+
+    if useZM == Geometry.UseM and QgsWkbTypes.hasM(wkbType):
+      return 3 if hasZ else 2
+    return None
+
+  @staticmethod
+  def transformCoords(mapTo3d, coords, z_func, zmColumn=None, mapped=False):
+    """transforms a coordinate array in map coordinates to 3D coordinates at once with mapTo3d.transformArray.
+       z_func gives height at each point, and value in zmColumn of the array is added to it.
+       mapped: whether the array has x and y in 3D coordinates in the last two columns (see transformGeometries)"""
+    xs, ys = coords[:, 0], coords[:, 1]
+    zs = numpy.fromiter((z_func(x, y) for x, y in zip(xs.tolist(), ys.tolist())), float, len(coords))
+    if zmColumn is not None:
+      zs += coords[:, zmColumn]
+    return Geometry.mapCoords(mapTo3d, coords, zs, mapped)
+
+  @staticmethod
+  def mapCoords(mapTo3d, coords, zs, mapped=False):
+    """maps x and y of a coordinate array and heights to 3D coordinates. if mapped is True, x and y in 3D
+       coordinates are taken from the last two columns of the array"""
+    if not mapped:
+      return mapTo3d.transformArray(coords[:, 0], coords[:, 1], zs)
+
+    v = numpy.empty((len(coords), 3))
+    v[:, :2] = coords[:, -2:]
+    v[:, 2] = mapTo3d.transformZ(zs)
+    return v
+
 
 class PointGeometry(Geometry):
 
   def __init__(self):
-    self.pts = []
+    self.pts = numpy.empty((0, 3))
 
   def asList(self):
-    return [[pt.x, pt.y, pt.z] for pt in self.pts]
+    return self.pts.tolist()
+
+  def asCoordinateList(self):
+    return CoordinateList(self.pts)
+
+  def vertices(self):
+    return self.pts
 
   def toQgsGeometry(self):
-    count = len(self.pts)
-    if count > 1:
-      pts = [pointToQgsPoint(pt) for pt in self.pts]
+    pts = [pointToQgsPoint(pt) for pt in self.pts.tolist()]
+    if len(pts) > 1:
       return QgsGeometry.fromMultiPointXY(pts)
 
-    if count == 1:
-      return QgsGeometry.fromPointXY(pointToQgsPoint(self.pts[0]))
+    if pts:
+      return QgsGeometry.fromPointXY(pts[0])
 
     return QgsGeometry()
 
   @classmethod
-  def fromQgsGeometry(cls, geometry, z_func, transform_func, useZM=Geometry.NotUseZM):
+  def fromQgsGeometry(cls, geometry, z_func, mapTo3d, useZM=Geometry.NotUseZM, arrays=None):
+    """arrays: coordinate arrays of the geometry given by transformGeometries"""
     geom = cls()
-    if useZM == Geometry.NotUseZM:
-      pts = geometry.asMultiPoint() if geometry.isMultipart() else [geometry.asPoint()]
-      geom.pts = [transform_func(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in pts]
-
-    else:
-      g = geometry.constGet()
-      if isinstance(g, QgsPoint):
-        pts = [g]
-      elif isinstance(g, QgsMultiPoint):
-        pts = [g.geometryN(i) for i in range(g.numGeometries())]
-      else:
-        logMessage("Unknown point geometry type: " + type(g))
-        pts = []
-
-      if useZM == Geometry.UseZ:
-        geom.pts = [transform_func(pt.x(), pt.y(), pt.z() + z_func(pt.x(), pt.y())) for pt in pts]
-
-      else:   # UseM
-        geom.pts = [transform_func(pt.x(), pt.y(), pt.m() + z_func(pt.x(), pt.y())) for pt in pts]
+    mapped = arrays is not None
+    arrays = flattenArrays(arrays) if mapped else cls.coordinateArrays(geometry)
+    if arrays is None:
+      logMessage("Unknown point geometry type: " + QgsWkbTypes.displayString(geometry.wkbType()))
+      return geom
 
+    if arrays:
+      coords = numpy.concatenate(arrays)
+      geom.pts = cls.transformCoords(mapTo3d, coords, z_func, cls.zmColumn(geometry, useZM), mapped)
     return geom
 
 
 class LineGeometry(Geometry):
 
   def __init__(self):
-    self.lines = []
+    self.coords = numpy.empty((0, 3))
+    self.offsets = numpy.zeros(1, dtype=int)
+
+  @property
+  def lines(self):
+    """list of coordinate arrays of lines"""
+    return splitAt(self.coords, self.offsets)
 
   def asList(self):
-    return [[[pt.x, pt.y, pt.z] for pt in line] for line in self.lines]
+    return splitAt(self.coords.tolist(), self.offsets)
+
+  def asCoordinateList(self):
+    return CoordinateList(self.coords, [self.offsets])
+
+  def vertices(self):
+    return self.coords
 
   def asList2(self):
-    return [[[pt.x, pt.y] for pt in line] for line in self.lines]
+    return splitAt(self.coords[:, :2].tolist(), self.offsets)
 
   def toQgsGeometry(self):
-    count = len(self.lines)
-    if count > 1:
-      lines = [lineToQgsPolyline(line) for line in self.lines]
+    lines = [lineToQgsPolyline(line) for line in self.lines]
+    if len(lines) > 1:
       return QgsGeometry.fromMultiPolylineXY(lines)
 
-    if count == 1:
-      return QgsGeometry.fromPolylineXY(lineToQgsPolyline(self.lines[0]))
+    if lines:
+      return QgsGeometry.fromPolylineXY(lines[0])
 
     return QgsGeometry()
 
   @classmethod
-  def fromQgsGeometry(cls, geometry, z_func, transform_func, useZM=Geometry.NotUseZM):
+  def fromQgsGeometry(cls, geometry, z_func, mapTo3d, useZM=Geometry.NotUseZM, arrays=None):
+    """arrays: coordinate arrays of the geometry given by transformGeometries"""
     geom = cls()
-    if useZM == Geometry.NotUseZM:
-      lines = geometry.asMultiPolyline() if geometry.isMultipart() else [geometry.asPolyline()]
-      geom.lines = [[transform_func(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in line] for line in lines]
-
-    else:
-      g = geometry.constGet()
-      if isinstance(g, QgsLineString):
-        lines = [g.points()]
-      elif isinstance(g, QgsMultiLineString):
-        lines = [g.geometryN(i).points() for i in range(g.numGeometries())]
-      else:
-        logMessage("Unknown line geometry type: " + type(g))
-        lines = []
-
-      if useZM == Geometry.UseZ:
-        geom.lines = [[transform_func(pt.x(), pt.y(), pt.z() + z_func(pt.x(), pt.y())) for pt in line] for line in lines]
-
-      else:   # UseM
-        geom.lines = [[transform_func(pt.x(), pt.y(), pt.m() + z_func(pt.x(), pt.y())) for pt in line] for line in lines]
+    mapped = arrays is not None
+    arrays = flattenArrays(arrays) if mapped else cls.coordinateArrays(geometry)
+    if arrays is None:
+      logMessage("Unknown line geometry type: " + QgsWkbTypes.displayString(geometry.wkbType()))
+      return geom
 
+    if arrays:
+      coords, geom.offsets = concatArrays(arrays)
+      geom.coords = cls.transformCoords(mapTo3d, coords, z_func, cls.zmColumn(geometry, useZM), mapped)
     return geom
 
 
 class PolygonGeometry(Geometry):
 
   def __init__(self):
-    self.polygons = []
-    self.centroids = []
+    self.coords = numpy.empty((0, 3))
+    self.ringOffsets = numpy.zeros(1, dtype=int)       # offsets of rings in coords
+    self.polygonOffsets = numpy.zeros(1, dtype=int)    # offsets of polygons in rings
+    self.centroids = numpy.empty((0, 3))
     self.split_polygons = []
 
+  @property
+  def polygons(self):
+    """list of polygons, each of which is a list of coordinate arrays of rings"""
+    return splitAt(splitAt(self.coords, self.ringOffsets), self.polygonOffsets)
+
+  def outerRings(self):
+    """returns a boolean array which indicates whether each ring is an outer ring"""
+    isOuter = numpy.zeros(len(self.ringOffsets) - 1, dtype=bool)
+    isOuter[self.polygonOffsets[:-1]] = True
+    return isOuter
+
   def splitPolygon(self, triMesh, z_func):
     """split polygon by TriangleMesh"""
     self.split_polygons = []
     for polygon in triMesh.splitPolygonA(self.toQgsGeometry()):
-      boundaries = []
-      # outer boundary
-      points = [Point(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in polygon[0]]
-      if not GeometryUtils.isClockwise(points):
-        points.reverse()    # to clockwise
-      boundaries.append(points)
-
-      # inner boundaries
-      for boundary in polygon[1:]:
-        points = [Point(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in boundary]
-        if GeometryUtils.isClockwise(points):
-          points.reverse()    # to counter-clockwise
-        boundaries.append(points)
-
-      self.split_polygons.append(boundaries)
+      rings = [numpy.array([(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in ring], dtype=float).reshape(-1, 3) for ring in polygon]
+      coords, offsets = concatArrays(rings)
+
+      # outer boundary to clockwise and inner boundaries to counter-clockwise
+      isOuter = numpy.zeros(len(rings), dtype=bool)
+      isOuter[0] = True
+      self.split_polygons.append(splitAt(GeometryUtils.orientRings(coords, offsets, isOuter), offsets))
+
+  def vertices(self):
+    return numpy.concatenate([self.coords] + [ring for rings in self.split_polygons for ring in rings] + [self.centroids])
+
+  def vertexCount(self):
+    return len(self.coords) + sum(len(ring) for rings in self.split_polygons for ring in rings) + len(self.centroids)
 
   def asList(self):
-    p = []
-    for boundaries in self.polygons:
-      # outer boundary
-      pts = [[pt.x, pt.y, pt.z] for pt in boundaries[0]]
-      if not GeometryUtils.isClockwise(boundaries[0]):
-        pts.reverse()   # to clockwise
-      b = [pts]
-
-      # inner boundaries
-      for boundary in boundaries[1:]:
-        pts = [[pt.x, pt.y, pt.z] for pt in boundary]
-        if GeometryUtils.isClockwise(boundary):
-          pts.reverse()   # to counter-clockwise
-        b.append(pts)
-      p.append(b)
-    return p
+    # outer boundaries are clockwise and inner boundaries are counter-clockwise
+    coords = GeometryUtils.orientRings(self.coords, self.ringOffsets, self.outerRings())
+    return splitAt(splitAt(coords.tolist(), self.ringOffsets), self.polygonOffsets)
 
   def asList2(self):
-    p = []
-    for boundaries in self.polygons:
-      b = []
-      for boundary in boundaries:
-        b.append([[pt.x, pt.y] for pt in boundary])
-      p.append(b)
-    return p
+    return splitAt(splitAt(self.coords[:, :2].tolist(), self.ringOffsets), self.polygonOffsets)
+
+  def asCoordinateList2(self):
+    return CoordinateList(self.coords[:, :2], [self.ringOffsets, self.polygonOffsets])
 
   def toQgsGeometry(self):
-    count = len(self.polygons)
-    if count > 1:
-      polys = [polygonToQgsPolygon(poly) for poly in self.polygons]
+    polys = [polygonToQgsPolygon(poly) for poly in self.polygons]
+    if len(polys) > 1:
       return QgsGeometry.fromMultiPolygonXY(polys)
 
-    if count == 1:
-      return QgsGeometry.fromPolygonXY(polygonToQgsPolygon(self.polygons[0]))
+    if polys:
+      return QgsGeometry.fromPolygonXY(polys[0])
 
     return QgsGeometry()
 
   @classmethod
-  def fromQgsGeometry(cls, geometry, z_func, transform_func, useCentroidHeight=True, centroidPerPolygon=False, useZM=Geometry.NotUseZM):
-
+  def fromQgsGeometry(cls, geometry, z_func, mapTo3d, useCentroidHeight=True, centroidPerPolygon=False, useZM=Geometry.NotUseZM, arrays=None):
+    """arrays: coordinate arrays of the geometry given by transformGeometries"""
     geom = cls()
 
-    if useZM != Geometry.NotUseZM:
-      g = geometry.constGet()
-      if isinstance(g, QgsPolygon):
-        polygons = [g]
-      elif isinstance(g, QgsMultiPolygon):
-        polygons = [g.geometryN(i) for i in range(g.numGeometries())]
-      else:
-        polygons = []
-
-      if useZM == Geometry.UseZ:
-        for polygon in polygons:
-          boundaries = []
-          # outer boundary
-          bnd = polygon.exteriorRing().points()
-          points = [transform_func(pt.x(), pt.y(), pt.z() + z_func(pt.x(), pt.y())) for pt in bnd]
-          #if not GeometryUtils.isClockwise(points):
-          #  points.reverse()    # to clockwise
-          boundaries.append(points)
-
-          # inner boundaries
-          for i in range(polygon.numInteriorRings()):
-            bnd = polygon.interiorRing(i).points()
-            points = [transform_func(pt.x(), pt.y(), pt.z() + z_func(pt.x(), pt.y())) for pt in bnd]
-            #if GeometryUtils.isClockwise(points):
-            #  points.reverse()    # to counter-clockwise
-            boundaries.append(points)
-
-          geom.polygons.append(boundaries)
-      else:   # UseM
-        for polygon in polygons:
-          boundaries = []
-          # outer boundary
-          bnd = polygon.exteriorRing().points()
-          points = [transform_func(pt.x(), pt.y(), pt.m() + z_func(pt.x(), pt.y())) for pt in bnd]
-          #if not GeometryUtils.isClockwise(points):
-          #  points.reverse()    # to clockwise
-          boundaries.append(points)
-
-          # inner boundaries
-          for i in range(polygon.numInteriorRings()):
-            bnd = polygon.interiorRing(i).points()
-            points = [transform_func(pt.x(), pt.y(), pt.m() + z_func(pt.x(), pt.y())) for pt in bnd]
-            #if GeometryUtils.isClockwise(points):
-            #  points.reverse()    # to counter-clockwise
-            boundaries.append(points)
-
-          geom.polygons.append(boundaries)
+    mapped = arrays is not None
+    if not mapped:
+      arrays = cls.coordinateArrays(geometry, nested=True)
+    if arrays is None:
+      logMessage("Unknown polygon geometry type: " + QgsWkbTypes.displayString(geometry.wkbType()))
       return geom
 
-    polygons = geometry.asMultiPolygon() if geometry.isMultipart() else [geometry.asPolygon()]
+    # list of polygons, each of which is a list of rings. empty polygons are removed
+    polygons = arrays if geometry.isMultipart() else [arrays]
+    polygons = [polygon for polygon in polygons if polygon and len(polygon[0])]
+    if not polygons:
+      return geom
 
-    if not centroidPerPolygon:
-      pt = geometry.centroid().asPoint()
-      centroidHeight = z_func(pt.x(), pt.y())
-      geom.centroids.append(transform_func(pt.x(), pt.y(), centroidHeight))
+    coords, geom.ringOffsets = concatArrays([ring for polygon in polygons for ring in polygon])
+    geom.polygonOffsets = offsetsFromCounts([len(polygon) for polygon in polygons])
 
-    for polygon in polygons:
-      centroid = QgsGeometry.fromPolygonXY(polygon).centroid()
-      if centroid is None:
-        centroidHeight = 0
-        if centroidPerPolygon:
-          geom.centroids.append(transform_func(0, 0, 0))
-      else:
-        pt = centroid.asPoint()
-        centroidHeight = z_func(pt.x(), pt.y())
-        if centroidPerPolygon:
-          geom.centroids.append(transform_func(pt.x(), pt.y(), centroidHeight))
+    if useZM != Geometry.NotUseZM:
+      geom.coords = cls.transformCoords(mapTo3d, coords, z_func, cls.zmColumn(geometry, useZM), mapped)
+      return geom
 
-      z_func2 = (lambda x, y: centroidHeight) if useCentroidHeight else z_func
+    # centroids of polygons. areas and moments are calculated relative to the first vertex to keep precision
+    x0, y0 = coords[0, 0], coords[0, 1]
+    areas, mxs, mys = GeometryUtils.ringMoments(coords[:, 0] - x0, coords[:, 1] - y0, geom.ringOffsets)
 
-      boundaries = []
-      # outer boundary
-      points = []
-      for pt in polygon[0]:
-        points.append(transform_func(pt.x(), pt.y(), z_func2(pt.x(), pt.y())))
+    # areas of outer rings are positive and those of inner rings are negative
+    isOuter = geom.outerRings()
+    sign = numpy.where(isOuter, 1.0, -1.0) * numpy.sign(areas)
+    areas, mxs, mys = (GeometryUtils.segmentSums(v * sign, geom.polygonOffsets) for v in (areas, mxs, mys))
 
-      if not GeometryUtils.isClockwise(points):
-        points.reverse()    # to clockwise
-      boundaries.append(points)
+    with numpy.errstate(all="ignore"):
+      cxs, cys = x0 + mxs / areas, y0 + mys / areas
 
-      # inner boundaries
-      for boundary in polygon[1:]:
-        points = [transform_func(pt.x(), pt.y(), z_func2(pt.x(), pt.y())) for pt in boundary]
-        if GeometryUtils.isClockwise(points):
-          points.reverse()    # to counter-clockwise
-        boundaries.append(points)
+    for i in numpy.flatnonzero(areas == 0).tolist():
+      pt = QgsGeometry.fromPolygonXY(polygonToQgsPolygon(polygons[i])).centroid().asPoint()
+      cxs[i], cys[i] = pt.x(), pt.y()
 
-      geom.polygons.append(boundaries)
+    if useCentroidHeight or centroidPerPolygon:
+      heights = numpy.fromiter((z_func(x, y) for x, y in zip(cxs.tolist(), cys.tolist())), float, len(cxs))
 
+    if centroidPerPolygon:
+      geom.centroids = mapTo3d.transformArray(cxs, cys, heights)
+    else:
+      area = areas.sum()
+      if area:
+        cx, cy = x0 + mxs.sum() / area, y0 + mys.sum() / area
+      else:
+        pt = geometry.centroid().asPoint()
+        cx, cy = pt.x(), pt.y()
+      geom.centroids = mapTo3d.transformArray([cx], [cy], [z_func(cx, cy)])
+
+    if useCentroidHeight:
+      # vertices of each polygon have the height at the centroid of the polygon
+      zs = numpy.repeat(heights, numpy.diff(geom.ringOffsets[geom.polygonOffsets]))
+      coords = cls.mapCoords(mapTo3d, coords, zs, mapped)
+    else:
+      coords = cls.transformCoords(mapTo3d, coords, z_func, mapped=mapped)
+
+    # outer boundaries to clockwise and inner boundaries to counter-clockwise
+    geom.coords = GeometryUtils.orientRings(coords, geom.ringOffsets, isOuter)
     return geom
 
 
@@ -317,17 +394,147 @@ class GeometryUtils:
 
   @staticmethod
   def _signedArea(p):
-    """Calculates signed area of polygon."""
-    area = 0
-    for i in range(len(p) - 1):
-      area += (p[i].x - p[i + 1].x) * (p[i].y + p[i + 1].y)
-    return area / 2
+    """Calculates signed area of polygon (coordinate array of a closed ring)."""
+    x, y = p[:, 0], p[:, 1]
+    return float(((x[:-1] - x[1:]) * (y[:-1] + y[1:])).sum()) / 2
 
   @staticmethod
   def isClockwise(linearRing):
     """Returns whether given linear ring is clockwise."""
     return GeometryUtils._signedArea(linearRing) < 0
 
+  @staticmethod
+  def segmentSums(values, offsets):
+    """returns sums of values in segments specified with offsets"""
+    c = numpy.zeros(len(values) + 1)
+    numpy.cumsum(values, out=c[1:])
+    return c[offsets[1:]] - c[offsets[:-1]]
+
+  @staticmethod
+  def ringMoments(xs, ys, ringOffsets):
+    """calculates signed areas and first moments of closed rings at once.
+       returns arrays of area (positive if counter-clockwise), area * centroid x and area * centroid y."""
+    n = len(xs)
+    cross = numpy.zeros(n)
+    sx = numpy.zeros(n)
+    sy = numpy.zeros(n)
+    if n > 1:
+      cross[:-1] = xs[:-1] * ys[1:] - xs[1:] * ys[:-1]
+      sx[:-1] = xs[:-1] + xs[1:]
+      sy[:-1] = ys[:-1] + ys[1:]
+
+    # exclude segments from the last vertex of a ring to the first vertex of the next ring
+    ends = ringOffsets[1:]
+    cross[ends[ends > 0] - 1] = 0
+
+    return (GeometryUtils.segmentSums(cross, ringOffsets) / 2,
+            GeometryUtils.segmentSums(sx * cross, ringOffsets) / 6,
+            GeometryUtils.segmentSums(sy * cross, ringOffsets) / 6)
+
+  @staticmethod
+  def orientRings(coords, ringOffsets, isOuter):
+    """returns a coordinate array in which outer rings are clockwise and inner rings are counter-clockwise.
+       isOuter is a boolean array which indicates whether each ring is an outer ring."""
+    areas = GeometryUtils.ringMoments(coords[:, 0], coords[:, 1], ringOffsets)[0]
+    reverse = numpy.where(isOuter, areas >= 0, areas < 0)
+    if not reverse.any():
+      return coords
+
+    # reverse vertex order in the rings with an index array
+    ringIds = numpy.repeat(numpy.arange(len(areas)), numpy.diff(ringOffsets))
+    starts, ends = ringOffsets[:-1][ringIds], ringOffsets[1:][ringIds]
+    idx = numpy.arange(len(coords))
+    return coords[numpy.where(reverse[ringIds], starts + ends - 1 - idx, idx)]
+
+  @staticmethod
+  def hilbertIndex(x, y, order=16):
+    """Returns distance along a Hilbert curve of given order to a point in the unit square."""
+    n = 1 << order
+    x = min(max(int(x * n), 0), n - 1)
+    y = min(max(int(y * n), 0), n - 1)
+
+    d = 0
+    s = n >> 1
+    while s:
+      rx = 1 if x & s else 0
+      ry = 1 if y & s else 0
+      d += s * s * ((3 * rx) ^ ry)
+
+      # rotate quadrant
+      if ry == 0:
+        if rx == 1:
+          x = n - 1 - x
+          y = n - 1 - y
+        x, y = y, x
+      s >>= 1
+    return d
+
+
+class PreparedExtent:
+  """extent (RotatedRect) prepared to test and clip a large number of geometries.
+     bounding box of a geometry is tested first, so that geometries which lie fully inside
+     or outside the extent are processed without GEOS operations."""
+
+  def __init__(self, extent):
+    self.extent = extent
+    self.rotated = bool(extent.rotation())
+    self.geom = extent.geometry()
+    self.bbox = extent.boundingBox()
+    self._engine = None
+
+  def clone(self):
+    """returns a copy which has its own extent geometry. QgsGeometry is not thread-safe,
+       so each thread should use its own copy"""
+    return PreparedExtent(self.extent)
+
+  def engine(self):
+    """geometry engine with the prepared extent geometry. created on first use"""
+    if self._engine is None:
+      self._engine = QgsGeometry.createGeometryEngine(self.geom.constGet())
+      self._engine.prepareGeometry()
+    return self._engine
+
+  def containsRect(self, rect):
+    """returns True if the rectangle (QgsRectangle) lies fully inside the extent"""
+    if not self.bbox.contains(rect):
+      return False
+
+    if not self.rotated:
+      return True
+
+    # extent is convex, so the rectangle is inside the extent if all its corners are inside
+    for x, y in [(rect.xMinimum(), rect.yMinimum()), (rect.xMaximum(), rect.yMinimum()),
+                 (rect.xMaximum(), rect.yMaximum()), (rect.xMinimum(), rect.yMaximum())]:
+      pt = self.extent.normalizePoint(x, y)
+      if not (0 <= pt.x() <= 1 and 0 <= pt.y() <= 1):
+        return False
+    return True
+
+  def intersects(self, geom):
+    """returns True if the geometry intersects with the extent.
+       not thread-safe because the prepared geometry engine is used."""
+    bbox = geom.boundingBox()
+    if not self.bbox.intersects(bbox):
+      return False
+
+    if self.containsRect(bbox):
+      return True
+
+    return self.engine().intersects(geom.constGet())
+
+  def clip(self, geom):
+    """returns the geometry clipped with the extent, or None if the geometry lies outside the extent.
+       geometry which lies fully inside the extent is returned as it is.
+       not thread-safe because the extent geometry is used."""
+    bbox = geom.boundingBox()
+    if self.containsRect(bbox):
+      return geom
+
+    if not self.bbox.intersects(bbox):
+      return None
+
+    return geom.intersection(self.geom)
+
 
 class TriangleMesh:
 
@@ -432,6 +639,7 @@ class TriangleMesh:
 
 
 class IndexedTriangles2D:
+  """indexed triangles. vertices are sequences of x, y and z coordinates (e.g. lists)"""
 
   EMPDICT = {}
 
@@ -447,15 +655,16 @@ class IndexedTriangles2D:
     self.faces.append([vi1, vi2, vi3])
 
   def _vertexIndex(self, v):
-    vi = self.vidx.get(v.y, self.EMPDICT).get(v.x)
+    x, y = v[0], v[1]
+    vi = self.vidx.get(y, self.EMPDICT).get(x)
     if vi is not None:
       return vi
 
     vi = len(self.vertices)
     self.vertices.append(v)
 
-    self.vidx[v.y] = self.vidx.get(v.y, {})
-    self.vidx[v.y][v.x] = vi
+    self.vidx[y] = self.vidx.get(y, {})
+    self.vidx[y][x] = vi
     return vi
 
 
@@ -475,23 +684,181 @@ class IndexedTriangles3D:
     self.faces.append([vi1, vi2, vi3])
 
   def _vertexIndex(self, v):
-    vi = self.vidx.get(v.z, self.EMPDICT).get(v.y, self.EMPDICT).get(v.x)
+    x, y, z = v[0], v[1], v[2]
+    vi = self.vidx.get(z, self.EMPDICT).get(y, self.EMPDICT).get(x)
     if vi is not None:
       return vi
 
     vi = len(self.vertices)
     self.vertices.append(v)
 
-    self.vidx[v.z] = self.vidx.get(v.z, {})
-    self.vidx[v.z][v.y] = self.vidx[v.z].get(v.y, {})
-    self.vidx[v.z][v.y][v.x] = vi
+    self.vidx[z] = self.vidx.get(z, {})
+    self.vidx[z][y] = self.vidx[z].get(y, {})
+    self.vidx[z][y][x] = vi
     return vi
 
 
+def wkbCoordinateArrays(wkb, nested=False):
+  """returns coordinate arrays (views of wkb buffer, shape (n, dim)) of a little-endian ISO WKB geometry,
+     which can also have legacy 2.5D or EWKB type flags, or None if the geometry type is not supported (e.g. curves). arrays are returned in a flat list,
+     or if nested is True, in the same structure as the geometry: an array for a point or a line string,
+     a list of rings for a polygon and a list of parts for a multi-geometry."""
+  arrays = []
+
+  def parse(pos):
+    if wkb[pos] != 1:
+      raise ValueError("big-endian WKB")
+
+    wkbType = struct.unpack_from("<I", wkb, pos + 1)[0]
+    pos += 5
+
+    # Z/M flags of legacy 2.5D and EWKB types are converted to the ISO ones, and EWKB SRID is skipped
+    baseType, flag = (wkbType & 0x0FFFFFFF) % 1000, (wkbType & 0x0FFFFFFF) // 1000
+    if wkbType & 0x80000000:
+      flag |= 1
+    if wkbType & 0x40000000:
+      flag |= 2
+    if wkbType & 0x20000000:
+      pos += 4
+
+    if flag > 3:
+      raise ValueError("unsupported WKB type")
+    dim = (2, 3, 3, 4)[flag]
+
+    def coords(pos, count):
+      a = numpy.frombuffer(wkb, "<f8", count * dim, pos).reshape(count, dim)
+      arrays.append(a)
+      return pos + 8 * dim * count, a
+
+    if baseType == 1:     # Point
+      return coords(pos, 1)
+
+    count = struct.unpack_from("<I", wkb, pos)[0]
+    pos += 4
+    if baseType == 2:     # LineString
+      return coords(pos, count)
+
+    if baseType == 3:     # Polygon
+      rings = []
+      for _ in range(count):
+        n = struct.unpack_from("<I", wkb, pos)[0]
+        pos, a = coords(pos + 4, n)
+        rings.append(a)
+      return pos, rings
+
+    if baseType in (4, 5, 6, 7):    # Multi* and GeometryCollection
+      parts = []
+      for _ in range(count):
+        pos, obj = parse(pos)
+        parts.append(obj)
+      return pos, parts
+
+    raise ValueError("unsupported WKB type")
+
+  try:
+    obj = parse(0)[1]
+  except (ValueError, IndexError, struct.error):
+    return None
+  return obj if nested else arrays
+
+
+def flattenArrays(obj):
+  """returns a flat list of coordinate arrays in nested lists given by wkbCoordinateArrays(wkb, nested=True)"""
+  if isinstance(obj, list):
+    return [a for o in obj for a in flattenArrays(o)]
+  return [obj]
+
+
+def replaceArrays(obj, arrays):
+  """returns nested lists in the same structure as obj, whose coordinate arrays are replaced with those from an iterator"""
+  if isinstance(obj, list):
+    return [replaceArrays(o, arrays) for o in obj]
+  return next(arrays)
+
+
+def transformGeometries(geometries, transform, mapTo3d=None):
+  """transforms geometries (QgsGeometry) with a QgsCoordinateTransform, and returns a list of (geometry, arrays) tuples.
+     coordinates of all the geometries, including z values, are concatenated and transformed at once, and if mapTo3d
+     is given, x and y of them are mapped to 3D coordinates in the same pass.
+     geometry is a transformed copy, or None if it could not be transformed.
+     arrays are coordinate arrays of the transformed geometry in the nested structure (see wkbCoordinateArrays), which
+     have x and y in 3D coordinates in the last two columns. arrays is None if mapTo3d is None or the geometry was
+     transformed one by one because it could not be read."""
+  def transformOne(geometry):
+    geom = QgsGeometry(geometry)
+    try:
+      if transform.isShortCircuited() or geom.transform(transform) == 0:
+        return geom, None
+    except QgsCsException:
+      pass
+    return None, None
+
+  results = [None] * len(geometries)
+  batch = []
+  for i, geometry in enumerate(geometries):
+    wkb = bytearray(geometry.asWkb().data())
+    obj = wkbCoordinateArrays(wkb, nested=True) if wkb else None
+    arrays = flattenArrays(obj) if obj is not None else None
+    if arrays:
+      batch.append((i, wkb, obj, arrays, QgsWkbTypes.hasZ(geometry.wkbType())))
+    else:
+      results[i] = transformOne(geometry)
+
+  if not batch:
+    return results
+
+  # x, y and z (0 for geometries without z) of all the geometries
+  hasZ = any(item[4] for item in batch)
+
+  def xyz(a, z):
+    if not hasZ:
+      return a[:, :2]
+    return a[:, :3] if z else numpy.column_stack([a[:, :2], numpy.zeros(len(a))])
+
+  coords = numpy.concatenate([xyz(a, z) for _, _, _, arrays, z in batch for a in arrays])
+
+  if not transform.isShortCircuited():
+    try:
+      line = QgsLineString(coords[:, 0].tolist(), coords[:, 1].tolist(), coords[:, 2].tolist() if hasZ else [])
+      line.transform(transform, QgsCoordinateTransform.ForwardTransform, hasZ)
+    except QgsCsException:
+      # some of coordinates could not be transformed. fall back to per-geometry transformation
+      for i, _, _, _, _ in batch:
+        results[i] = transformOne(geometries[i])
+      return results
+
+    # WKB of line string has 9 bytes header: byte order, type and number of points
+    coords = numpy.frombuffer(line.asWkb().data(), "<f8", offset=9).reshape(len(coords), -1)
+
+  if mapTo3d:
+    xy = mapTo3d.transformArray(coords[:, 0], coords[:, 1], numpy.zeros(len(coords)))[:, :2]
+
+  pos = 0
+  for i, wkb, obj, arrays, z in batch:
+    start = pos
+    cols = 3 if z else 2
+    for a in arrays:
+      a[:, :cols] = coords[pos:pos + len(a), :cols]
+      pos += len(a)
+
+    geom = QgsGeometry()
+    geom.fromWkb(bytes(wkb))
+
+    if mapTo3d:
+      # coordinate arrays in map coordinates, followed by x and y in 3D coordinates
+      c = numpy.hstack([numpy.concatenate(arrays), xy[start:pos]])
+      obj = replaceArrays(obj, iter(splitAt(c, offsetsFromCounts([len(a) for a in arrays]))))
+      results[i] = (geom, obj)
+    else:
+      results[i] = (geom, None)
+
+  return results
+
+
 def dissolvePolygonsOnCanvas(settings, layer):
   """dissolve polygons of the layer and clip the dissolution with base extent"""
   baseExtent = settings.baseExtent
-  baseExtentGeom = baseExtent.geometry()
+  preparedExtent = PreparedExtent(baseExtent)
   rotation = baseExtent.rotation()
   transform = QgsCoordinateTransform(layer.crs(), settings.crs, QgsProject.instance())
 
@@ -511,7 +878,7 @@ def dissolvePolygonsOnCanvas(settings, layer):
       continue
 
     # check if geometry intersects with the base extent (rotated rect)
-    if rotation and not baseExtentGeom.intersects(geom):
+    if rotation and not preparedExtent.intersects(geom):
       continue
 
     if combi:
@@ -524,7 +891,7 @@ def dissolvePolygonsOnCanvas(settings, layer):
 
   # clip geom with slightly smaller extent than base extent
   # to make sure that the clipped polygon stays within the base extent
-  geom = combi.intersection(baseExtent.clone().scale(0.999999).geometry())
+  geom = PreparedExtent(baseExtent.clone().scale(0.999999)).clip(combi)
   if geom is None:
     return None
 
@@ -1067,14 +1067,21 @@ limitations:
       }
 
       if (layer && layer.properties.propertyNames !== undefined) {
-        var row;
-        for (var i = 0, l = layer.properties.propertyNames.length; i < l; i++) {
-          row = document.createElement("tr");
-          row.innerHTML = "<td>" + layer.properties.propertyNames[i] + "</td>" +
-                          "<td>" + obj.userData.properties[i] + "</td>";
-          e.appendChild(row);
-        }
-        e.classList.remove("hidden");
+        var props = obj.userData.properties;
+        var showAttrs = function () {
+          var row;
+          for (var i = 0, l = layer.properties.propertyNames.length; i < l; i++) {
+            row = document.createElement("tr");
+            row.innerHTML = "<td>" + layer.properties.propertyNames[i] + "</td>" +
+                            "<td>" + Q3D.VectorLayer.attributeValue(props, i) + "</td>";
+            e.appendChild(row);
+          }
+          e.classList.remove("hidden");
+        };
+
+        // attributes in a shard file are loaded on first query
+        if (props instanceof Q3D.AttributeRow && !props.loaded()) props.load(showAttrs);
+        else showAttrs();
       }
       else {
         e.classList.add("hidden");
@@ -1682,7 +1689,10 @@ Q3D.DEMBlock.prototype = {
       }
     }
     geom = geom || new THREE.PlaneBufferGeometry(obj.width, obj.height, grid.width - 1, grid.height - 1);
-    layer.geometryCache = geom;
+
+    // sub-block which has a part of image. geometry is not cached because its uv is modified.
+    if (obj.uv !== undefined) this.setUVRange(geom, grid.width, grid.height, obj.uv);
+    else layer.geometryCache = geom;
 
     // create a mesh
     var mesh = new THREE.Mesh(geom, this.material.mtl);
@@ -1697,8 +1707,22 @@ Q3D.DEMBlock.prototype = {
       geom.attributes.position.needsUpdate = true;
 
       // Calculate normals
+      var normalsLoading = false;
       if (layer.properties.shading) {
-        geom.computeVertexNormals();
+        if (grid.normals === undefined) {
+          geom.computeVertexNormals();
+        }
+        else if (grid.normals.url !== undefined) {
+          // callback is called once the normals have been loaded
+          normalsLoading = true;
+          Q3D.application.loadFile(grid.normals.url, "arraybuffer", function (buf) {
+            _this.setNormals(geom, new Int8Array(buf), obj.zScale);
+            if (callback) callback(_this);
+          });
+        }
+        else {    // WebKit Bridge
+          _this.setNormals(geom, new Int8Array(grid.normals.binary.buffer, 0, grid.width * grid.height * 3), obj.zScale);
+        }
       }
 
       // build sides, bottom and frame
@@ -1711,7 +1735,7 @@ Q3D.DEMBlock.prototype = {
         layer.sideVisible = true;
       }
 
-      if (callback) callback(_this);    // call callback to request rendering
+      if (callback && !normalsLoading) callback(_this);    // call callback to request rendering
     };
 
     if (grid.url !== undefined) {
@@ -1729,6 +1753,34 @@ Q3D.DEMBlock.prototype = {
     return mesh;
   },
 
+  // uv: [u0, v0, u1, v1]
+  setUVRange: function (geom, w, h, uv) {
+    var du = (uv[2] - uv[0]) / (w - 1),
+        dv = (uv[3] - uv[1]) / (h - 1),
+        array = geom.attributes.uv.array;
+    for (var y = 0, i = 0; y < h; y++) {
+      for (var x = 0; x < w; x++, i += 2) {
+        array[i] = uv[0] + du * x;
+        array[i + 1] = uv[3] - dv * y;
+      }
+    }
+    geom.attributes.uv.needsUpdate = true;
+  },
+
+  // normals: precomputed normals in world coordinates (int8 triplets)
+  setNormals: function (geom, normals, zScale) {
+    // mesh is scaled by zScale in z direction, so normals are converted to local coordinates
+    // by multiplying z components by zScale (normal matrix is inverse transpose of model matrix).
+    // they are normalized in shader.
+    var array = geom.attributes.normal.array;
+    for (var i = 0, l = array.length; i < l; i += 3) {
+      array[i] = normals[i];
+      array[i + 1] = normals[i + 1];
+      array[i + 2] = normals[i + 2] * zScale;
+    }
+    geom.attributes.normal.needsUpdate = true;
+  },
+
   buildSides: function (layer, grid, planeWidth, planeHeight, parent, z0) {
     var opacity = (this.material.origProp.o !== undefined) ? this.material.origProp.o : 1;
     var material = new THREE.MeshLambertMaterial({color: Q3D.Config.dem.side.color,
@@ -1741,6 +1793,9 @@ Q3D.DEMBlock.prototype = {
         h = grid.height,
         k = w * (h - 1);
 
+    // edges on the DEM boundary: [top, right, bottom, left]
+    var edges = this.data.edges || [1, 1, 1, 1];
+
     var e0 =  z0 / this.data.zScale - this.data.zShift,
         band_width = -2 * e0;
 
@@ -1756,18 +1811,22 @@ Q3D.DEMBlock.prototype = {
       vertices_fr[i * 3 + 1] = grid_values[k + i];
       vertices_ba[i * 3 + 1] = grid_values[w - 1 - i];
     }
-    mesh = new THREE.Mesh(geom_fr, material);
-    mesh.rotation.x = Math.PI / 2;
-    mesh.position.y = -planeHeight / 2;
-    mesh.name = "side";
-    parent.add(mesh);
+    if (edges[2]) {
+      mesh = new THREE.Mesh(geom_fr, material);
+      mesh.rotation.x = Math.PI / 2;
+      mesh.position.y = -planeHeight / 2;
+      mesh.name = "side";
+      parent.add(mesh);
+    }
 
-    mesh = new THREE.Mesh(geom_ba, material);
-    mesh.rotation.x = Math.PI / 2;
-    mesh.rotation.y = Math.PI;
-    mesh.position.y = planeHeight / 2;
-    mesh.name = "side";
-    parent.add(mesh);
+    if (edges[0]) {
+      mesh = new THREE.Mesh(geom_ba, material);
+      mesh.rotation.x = Math.PI / 2;
+      mesh.rotation.y = Math.PI;
+      mesh.position.y = planeHeight / 2;
+      mesh.name = "side";
+      parent.add(mesh);
+    }
 
     // left and right
     var geom_le = new THREE.PlaneBufferGeometry(band_width, planeHeight, 1, h - 1),
@@ -1780,17 +1839,21 @@ Q3D.DEMBlock.prototype = {
       vertices_le[(i * 2 + 1) * 3] = grid_values[w * i];
       vertices_ri[i * 2 * 3] = -grid_values[w * (i + 1) - 1];
     }
-    mesh = new THREE.Mesh(geom_le, material);
-    mesh.rotation.y = -Math.PI / 2;
-    mesh.position.x = -planeWidth / 2;
-    mesh.name = "side";
-    parent.add(mesh);
+    if (edges[3]) {
+      mesh = new THREE.Mesh(geom_le, material);
+      mesh.rotation.y = -Math.PI / 2;
+      mesh.position.x = -planeWidth / 2;
+      mesh.name = "side";
+      parent.add(mesh);
+    }
 
-    mesh = new THREE.Mesh(geom_ri, material);
-    mesh.rotation.y = Math.PI / 2;
-    mesh.position.x = planeWidth / 2;
-    mesh.name = "side";
-    parent.add(mesh);
+    if (edges[1]) {
+      mesh = new THREE.Mesh(geom_ri, material);
+      mesh.rotation.y = Math.PI / 2;
+      mesh.position.x = planeWidth / 2;
+      mesh.name = "side";
+      parent.add(mesh);
+    }
 
     // bottom
     var geom;
@@ -1816,27 +1879,43 @@ Q3D.DEMBlock.prototype = {
                                                 transparent: (opacity < 1)});
     layer.materials.add(material);
 
+    // edges on the DEM boundary: [top, right, bottom, left]
+    var edges = this.data.edges || [1, 1, 1, 1];
+
     // horizontal rectangle at bottom
     var hw = planeWidth / 2,
         hh = planeHeight / 2,
         e0 =  z0 / this.data.zScale - this.data.zShift;
-    var geom = new THREE.Geometry();
-    geom.vertices.push(new THREE.Vector3(-hw, -hh, e0),
-                       new THREE.Vector3(hw, -hh, e0),
-                       new THREE.Vector3(hw, hh, e0),
-                       new THREE.Vector3(-hw, hh, e0),
-                       new THREE.Vector3(-hw, -hh, e0));
 
-    var obj = new THREE.Line(geom, material);
-    obj.name = "frame";
-    parent.add(obj);
+    var corners = [new THREE.Vector3(-hw, -hh, e0),
+                   new THREE.Vector3(hw, -hh, e0),
+                   new THREE.Vector3(hw, hh, e0),
+                   new THREE.Vector3(-hw, hh, e0)];
+
+    // bottom, right, top and left segments
+    var segs = [edges[2], edges[1], edges[0], edges[3]];
+
+    var geom, obj, i;
+    for (i = 0; i < 4; i++) {
+      if (!segs[i]) continue;
+
+      geom = new THREE.Geometry();
+      geom.vertices.push(corners[i], corners[(i + 1) % 4]);
+
+      obj = new THREE.Line(geom, material);
+      obj.name = "frame";
+      parent.add(obj);
+    }
 
     // vertical lines at corners
     var pts = [[-hw, -hh, grid.array[grid.array.length - grid.width]],
                [hw, -hh, grid.array[grid.array.length - 1]],
                [hw, hh, grid.array[grid.width - 1]],
                [-hw, hh, grid.array[0]]];
-    pts.forEach(function (pt) {
+    pts.forEach(function (pt, i) {
+      // corner of the DEM is where two boundary edges meet
+      if (!segs[i] || !segs[(i + 3) % 4]) return;
+
       var geom = new THREE.Geometry();
       geom.vertices.push(new THREE.Vector3(pt[0], pt[1], pt[2]),
                          new THREE.Vector3(pt[0], pt[1], e0));
@@ -1904,7 +1983,7 @@ Q3D.ClippedDEMBlock.prototype = {
         layer.sideVisible = true;
       }
 
-      if (callback) callback(_this);    // call callback to request rendering
+      if (callback && !normalsLoading) callback(_this);    // call callback to request rendering
     };
 
     if (grid.url !== undefined) {
@@ -2098,7 +2177,10 @@ Q3D.DEMLayer.prototype.constructor = Q3D.DEMLayer;
 Q3D.DEMLayer.prototype.loadJSONObject = function (jsonObject, scene) {
   if (jsonObject.type == "layer") {
     Q3D.MapLayer.prototype.loadJSONObject.call(this, jsonObject, scene);
-    if (jsonObject.data !== undefined) this.build(jsonObject.data);
+    if (jsonObject.data !== undefined) {
+      this.blocks = [];
+      this.build(jsonObject.data);
+    }
   }
   else if (jsonObject.type == "block") {
     var index = jsonObject.block;
@@ -2271,18 +2353,18 @@ Q3D.VectorLayer.prototype.buildLabels = function (features, getPointsFunc) {
 
   for (var i = 0, l = features.length; i < l; i++) {
     f = features[i];
-    text = f.prop[pIndex];
+    text = Q3D.VectorLayer.attributeValue(f.prop, pIndex);
     if (text === null || text === "") continue;
 
-    getPointsFunc(f).forEach(function (pt) {
+    Q3D.Utils.arrayToVec3Array(getPointsFunc(f)).forEach(function (pt) {
       // create div element for label
       e = document.createElement("div");
       e.appendChild(document.createTextNode(text));
       e.className = "label";
       this.labelParentElement.appendChild(e);
 
-      pt0 = new THREE.Vector3(pt[0], pt[1], pt[2]);                                      // bottom
-      pt1 = new THREE.Vector3(pt[0], pt[1], (isRelative) ? pt[2] + f.lh : z0 + f.lh);    // top
+      pt0 = new THREE.Vector3(pt.x, pt.y, pt.z);                                      // bottom
+      pt1 = new THREE.Vector3(pt.x, pt.y, (isRelative) ? pt.z + f.lh : z0 + f.lh);    // top
 
       if (Q3D.Config.label.queryable) {
         var obj = this.objectGroup.children[f.objIndices[0]];
@@ -2290,7 +2372,7 @@ Q3D.VectorLayer.prototype.buildLabels = function (features, getPointsFunc) {
           app.queryMarker.visible = false;
           app.highlightFeature(obj);
           app.render();
-          app.showQueryResult({x: pt[0], y: pt[1], z: pt[2]}, obj, true);
+          app.showQueryResult({x: pt.x, y: pt.y, z: pt.z}, obj, true);
         };
         e.classList.add("queryable");
       }
@@ -2337,9 +2419,18 @@ Q3D.VectorLayer.prototype.loadJSONObject = function (jsonObject, scene) {
         }
       }
 
-      (jsonObject.data.blocks || []).forEach(function (block) {
-        if (block.url !== undefined) Q3D.application.loadJSONFile(block.url);
+      (this.sortBlocksByDistance(jsonObject.data.blocks || [], scene)).forEach(function (block) {
+        if (block.url !== undefined) {
+          if (block.format == "bin") {
+            Q3D.application.loadFile(block.url, "arraybuffer", function (buf) {
+              Q3D.application.loadJSONObject(Q3D.VectorLayer.decodeBlock(buf));
+            });
+          }
+          else Q3D.application.loadJSONFile(block.url);
+        }
         else {
+          if (block.binary !== undefined) Q3D.VectorLayer.unpackBinary(block);
+          if (block.attrs !== undefined) Q3D.VectorLayer.setAttributeRows(block);
           this.build(block.features);
           if (this.properties.label !== undefined) this.buildLabels(block.features);
         }
@@ -2347,11 +2438,174 @@ Q3D.VectorLayer.prototype.loadJSONObject = function (jsonObject, scene) {
     }
   }
   else if (jsonObject.type == "block") {
+    // materials which have been added since previous block
+    if (jsonObject.materials !== undefined) this.materials.loadJSONObject(jsonObject.materials);
+
+    // packed coordinates sent from Python side
+    if (jsonObject.binary !== undefined) Q3D.VectorLayer.unpackBinary(jsonObject);
+
+    // attribute columns of features in the block
+    if (jsonObject.attrs !== undefined) Q3D.VectorLayer.setAttributeRows(jsonObject);
+
     this.build(jsonObject.features);
     if (this.properties.label !== undefined) this.buildLabels(jsonObject.features);
   }
 };
 
+// decodes a binary block file, which consists of header length (uint32), JSON header,
+// float32 coordinates and uint32 offsets/indices
+Q3D.VectorLayer.decodeBlock = function (buf) {
+  var headerLength = new DataView(buf).getUint32(0, true),
+      header = JSON.parse(new TextDecoder("utf-8").decode(new Uint8Array(buf, 4, headerLength))),
+      offset = 4 + headerLength;
+
+  var coords = new Float32Array(buf, offset, header.coords),
+      indices = new Uint32Array(buf, offset + header.coords * 4, header.indices);
+
+  Q3D.VectorLayer.unpackFeatures(header.features, coords, indices);
+  return header;
+};
+
+// unpacks coordinates in a block object which has packed coordinates in binary property
+Q3D.VectorLayer.unpackBinary = function (block) {
+  var b = block.binary,
+      offset = b.byteOffset || 0,
+      coords = new Float32Array(b.buffer, offset, block.coords),
+      indices = new Uint32Array(b.buffer, offset + block.coords * 4, block.indices);
+
+  Q3D.VectorLayer.unpackFeatures(block.features, coords, indices);
+  delete block.binary;
+};
+
+// replaces {packed: {...}} objects in feature geometries with views of the typed arrays.
+// a vertex list becomes a Float32Array of flat coordinates, which is split into nested lists
+// with the offset arrays, and an index array becomes an Uint32Array. coordinates are not copied.
+Q3D.VectorLayer.unpackFeatures = function (features, coords, indices) {
+
+  var subarray = function (array, range) {
+    return array.subarray(range[0], range[0] + range[1]);
+  };
+
+  var unpack = function (p) {
+    if (p.indices !== undefined) return subarray(indices, p.indices);
+
+    var c = subarray(coords, p.coords),
+        dim = p.dim;
+
+    if (p.offsets.length == 0) return c;
+
+    // innermost lists are vertex lists
+    var offsets = subarray(indices, p.offsets[0]),
+        list = [];
+    for (var i = 0, l = offsets.length - 1; i < l; i++) {
+      list.push(c.subarray(offsets[i] * dim, offsets[i + 1] * dim));
+    }
+
+    // outer lists of lists
+    for (var k = 1; k < p.offsets.length; k++) {
+      var items = list;
+      offsets = subarray(indices, p.offsets[k]);
+      list = [];
+      for (i = 0, l = offsets.length - 1; i < l; i++) {
+        list.push(items.slice(offsets[i], offsets[i + 1]));
+      }
+    }
+    return list;
+  };
+
+  var unpackObject = function (obj) {
+    for (var key in obj) {
+      var v = obj[key];
+      if (v === null || typeof v != "object" || Array.isArray(v)) continue;
+
+      if (v.packed !== undefined) obj[key] = unpack(v.packed);
+      else unpackObject(v);
+    }
+  };
+
+  features.forEach(function (f) {
+    unpackObject(f.geom);
+  });
+};
+
+// row of attribute columns, whose values are resolved on demand.
+// shard has attribute columns, or url of a shard file which is loaded on first query
+Q3D.AttributeRow = function (shard, row) {
+  this.shard = shard;
+  this.row = row;
+};
+
+Q3D.AttributeRow.prototype.value = function (index) {
+  var c = this.shard.columns[index],
+      v = (c.dict !== undefined) ? c.dict[c.idx[this.row]] : c.values[this.row];
+  return (v === null) ? "NULL" : v;
+};
+
+Q3D.AttributeRow.prototype.loaded = function () {
+  return (this.shard.columns !== undefined);
+};
+
+Q3D.AttributeRow.prototype.load = function (callback) {
+  var shard = this.shard;
+  if (shard.columns !== undefined) {
+    callback();
+    return;
+  }
+
+  if (shard.callbacks !== undefined) {
+    shard.callbacks.push(callback);   // loading
+    return;
+  }
+
+  shard.callbacks = [callback];
+  Q3D.application.loadFile(shard.url, "json", function (obj) {
+    shard.columns = obj.attrs;
+    shard.callbacks.forEach(function (cb) {
+      cb();
+    });
+    delete shard.callbacks;
+  });
+};
+
+// sets attribute rows to features in a block which has attribute columns or a reference to attribute shard file.
+// string columns are dictionary-encoded (dict and idx) and numeric columns have values
+Q3D.VectorLayer.setAttributeRows = function (block) {
+  var shard = (block.attrs.url !== undefined) ? {url: block.attrs.url} : {columns: block.attrs};
+  block.features.forEach(function (f, i) {
+    f.prop = new Q3D.AttributeRow(shard, i);
+  });
+};
+
+// returns index-th attribute value of a feature
+Q3D.VectorLayer.attributeValue = function (prop, index) {
+  return (prop instanceof Q3D.AttributeRow) ? prop.value(index) : prop[index];
+};
+
+// returns blocks sorted in order of distance from camera target to center of block bounding box
+Q3D.VectorLayer.prototype.sortBlocksByDistance = function (blocks, scene) {
+  var controls = Q3D.application.controls;
+  if (controls === undefined || blocks.length < 2 || blocks[0].bbox === undefined) return blocks;
+
+  scene.updateMatrixWorld();
+  var target = scene.worldToLocal(controls.target.clone());
+  var distance = function (block) {
+    var b = block.bbox;
+    if (b === undefined) return Infinity;
+
+    var dx = (b[0] + b[3]) / 2 - target.x,
+        dy = (b[1] + b[4]) / 2 - target.y;
+    return dx * dx + dy * dy;
+  };
+
+  return blocks.map(function (block) {
+    return {block: block, d: distance(block)};
+  }).sort(function (a, b) {
+    return a.d - b.d;
+  }).map(function (item) {
+    return item.block;
+  });
+};
+
 Object.defineProperty(Q3D.VectorLayer.prototype, "visible", {
   get: function () {
     return Object.getOwnPropertyDescriptor(Q3D.MapLayer.prototype, "visible").get.call(this);
@@ -2376,6 +2630,11 @@ Q3D.PointLayer.prototype = Object.create(Q3D.VectorLayer.prototype);
 Q3D.PointLayer.prototype.constructor = Q3D.PointLayer;
 
 Q3D.PointLayer.prototype.loadJSONObject = function (jsonObject, scene) {
+  // models which have been added since previous block
+  if (jsonObject.type == "block" && jsonObject.models !== undefined && this.models !== undefined) {
+    this.models.loadJSONObject(jsonObject.models);
+  }
+
   Q3D.VectorLayer.prototype.loadJSONObject.call(this, jsonObject, scene);
   if (jsonObject.type == "layer" && jsonObject.properties.objType == "Model File" && jsonObject.data !== undefined) {
     if (this.models === undefined) {
@@ -2447,19 +2706,19 @@ Q3D.PointLayer.prototype.build = function (features) {
 
   // iteration for features
   var materials = this.materials;
-  var f, geom, z_addend, i, l, mesh, pt;
+  var f, geom, z_addend, i, l, mesh, pts;
   for (var fidx = 0, flen = features.length; fidx < flen; fidx++) {
     f = features[fidx];
     f.objIndices = []
 
     geom = f.geom;
     z_addend = (geom.h) ? geom.h / 2 : 0;
-    for (i = 0, l = geom.pts.length; i < l; i++) {
+    pts = Q3D.Utils.flatArray(geom.pts);
+    for (i = 0, l = pts.length; i < l; i += 3) {
       mesh = new THREE.Mesh(unitGeom, materials.mtl(f.mtl));
       setSR(mesh, geom);
 
-      pt = geom.pts[i];
-      mesh.position.set(pt[0], pt[1], pt[2] + z_addend);
+      mesh.position.set(pts[i], pts[i + 1], pts[i + 2] + z_addend);
       mesh.userData.properties = f.prop;
 
       f.objIndices.push(this.addObject(mesh));
@@ -2477,10 +2736,12 @@ Q3D.PointLayer.prototype.buildIcons = function (features) {
         objs = [],
         material = this.materials.get(f.mtl);
 
+    var pts = Q3D.Utils.flatArray(f.geom.pts);
+
     f.objIndices = [];
-    for (var i = 0, l = f.geom.pts.length; i < l; i++) {
+    for (var i = 0, l = pts.length; i < l; i += 3) {
       sprite = new THREE.Sprite(material.mtl);
-      sprite.position.fromArray(f.geom.pts[i]);
+      sprite.position.fromArray(pts, i);
       sprite.userData.properties = f.prop;
 
       objs.push(sprite);
@@ -2511,7 +2772,7 @@ Q3D.PointLayer.prototype.buildModels = function (features) {
     var model = _this.models.get(f.model);
 
     f.objIndices = [];
-    f.geom.pts.forEach(function (pt) {
+    Q3D.Utils.arrayToVec3Array(f.geom.pts).forEach(function (pt) {
       model.callbackOnLoad(function (m) {
         var obj = m.scene.clone();
         obj.scale.set(f.geom.scale, f.geom.scale, f.geom.scale);
@@ -2533,7 +2794,7 @@ Q3D.PointLayer.prototype.buildModels = function (features) {
 
         var parent = new THREE.Group();
         parent.scale.set(1, 1, _this.sceneData.zExaggeration);
-        parent.position.fromArray(pt);
+        parent.position.copy(pt);
         parent.userData.properties = f.prop;
         parent.add(obj);
 
@@ -2574,13 +2835,8 @@ Q3D.LineLayer.prototype.build = function (features) {
   }
   else if (objType == "Line") {
     createObject = function (f, line) {
-      var pt, positions = [];
-      for (var i = 0, l = line.length; i < l; i++) {
-        pt = line[i];
-        positions.push(pt[0], pt[1], pt[2]);
-      }
       var geom = new THREE.BufferGeometry();
-      geom.addAttribute("position", new THREE.Float32BufferAttribute(positions, 3));
+      geom.addAttribute("position", new THREE.BufferAttribute(Q3D.Utils.toFloat32Array(Q3D.Utils.flatArray(line)), 3));
 
       var obj = new THREE.Line(geom, materials.mtl(f.mtl));
       if (obj.material instanceof THREE.LineDashedMaterial) obj.computeLineDistances();
@@ -2602,9 +2858,10 @@ Q3D.LineLayer.prototype.build = function (features) {
     createObject = function (f, line) {
       var group = new Q3D.Group();
 
-      pt0.set(line[0][0], line[0][1], line[0][2]);
-      for (var i = 1, l = line.length; i < l; i++) {
-        pt1.set(line[i][0], line[i][1], line[i][2]);
+      line = Q3D.Utils.flatArray(line);
+      pt0.fromArray(line, 0);
+      for (var i = 3, l = line.length; i < l; i += 3) {
+        pt1.fromArray(line, i);
 
         mesh = new THREE.Mesh(cylinGeom, materials.mtl(f.mtl));
         mesh.scale.set(f.geom.r, pt0.distanceTo(pt1), f.geom.r);
@@ -2612,7 +2869,7 @@ Q3D.LineLayer.prototype.build = function (features) {
         mesh.quaternion.setFromUnitVectors(axis, sub.subVectors(pt1, pt0).normalize());
         group.add(mesh);
 
-        if (jointGeom && i < l - 1) {
+        if (jointGeom && i < l - 3) {
           mesh = new THREE.Mesh(jointGeom, materials.mtl(f.mtl));
           mesh.scale.set(f.geom.r, f.geom.r, f.geom.r);
           mesh.position.copy(pt1);
@@ -2649,9 +2906,10 @@ Q3D.LineLayer.prototype.build = function (features) {
           pt = new THREE.Vector3(), ptM = new THREE.Vector3(), scale1 = new THREE.Vector3(1, 1, 1),
           matrix = new THREE.Matrix4(), quat = new THREE.Quaternion();
 
-      pt0.set(line[0][0], line[0][1], line[0][2]);
-      for (var i = 1, l = line.length; i < l; i++) {
-        pt1.set(line[i][0], line[i][1], line[i][2]);
+      line = Q3D.Utils.flatArray(line);
+      pt0.fromArray(line, 0);
+      for (var i = 3, l = line.length; i < l; i += 3) {
+        pt1.fromArray(line, i);
         dist = pt0.distanceTo(pt1);
         sub.subVectors(pt1, pt0);
         rx = Math.atan2(sub.z, Math.sqrt(sub.x * sub.x + sub.y * sub.y));
@@ -2721,12 +2979,7 @@ Q3D.LineLayer.prototype.build = function (features) {
     var z0 = sceneData.zShift * sceneData.zScale;
 
     createObject = function (f, line) {
-      var pt;
-      var vertices = [];
-      for (var i = 0, l = line.length; i < l; i++) {
-        pt = line[i];
-        vertices.push(new THREE.Vector3(pt[0], pt[1], pt[2]));
-      }
+      var vertices = Q3D.Utils.arrayToVec3Array(line);
       var bzFunc = function (x, y) { return z0 + f.geom.bh; };
       return new THREE.Mesh(Q3D.Utils.createWallGeometry(vertices, bzFunc),
                             materials.mtl(f.mtl));
@@ -2788,9 +3041,9 @@ Q3D.PolygonLayer.prototype.build = function (features) {
     var createSubObject = function (f, polygon, z) {
       var i, l, j, m;
 
-      var shape = new THREE.Shape(Q3D.Utils.arrayToVec2Array(polygon[0]));
+      var shape = new THREE.Shape(Q3D.Utils.arrayToVec2Array(polygon[0], 2));
       for (i = 1, l = polygon.length; i < l; i++) {
-        shape.holes.push(new THREE.Path(Q3D.Utils.arrayToVec2Array(polygon[i])));
+        shape.holes.push(new THREE.Path(Q3D.Utils.arrayToVec2Array(polygon[i], 2)));
       }
 
       // extruded geometry
@@ -2803,7 +3056,7 @@ Q3D.PolygonLayer.prototype.build = function (features) {
         var border, pt, pts, zFunc = function (x, y) { return 0; };
 
         for (i = 0, l = polygon.length; i < l; i++) {
-          pts = Q3D.Utils.arrayToVec3Array(polygon[i], zFunc);
+          pts = Q3D.Utils.arrayToVec3Array(polygon[i], zFunc, 2);
 
           geom = new THREE.Geometry();
           geom.vertices = pts;
@@ -2830,11 +3083,12 @@ Q3D.PolygonLayer.prototype.build = function (features) {
     };
 
     createObject = function (f) {
-      if (f.geom.polygons.length == 1) return createSubObject(f, f.geom.polygons[0], f.geom.centroids[0][2]);
+      var centroids = Q3D.Utils.flatArray(f.geom.centroids);
+      if (f.geom.polygons.length == 1) return createSubObject(f, f.geom.polygons[0], centroids[2]);
 
       var group = new THREE.Group();
       for (var i = 0, l = f.geom.polygons.length; i < l; i++) {
-        group.add(createSubObject(f, f.geom.polygons[i], f.geom.centroids[i][2]));
+        group.add(createSubObject(f, f.geom.polygons[i], centroids[i * 3 + 2]));
       }
       return group;
     };
@@ -2843,17 +3097,19 @@ Q3D.PolygonLayer.prototype.build = function (features) {
     var z0 = sceneData.zShift * sceneData.zScale;
 
     createObject = function (f) {
-      var polygons, zFunc;
+      var polygons, zFunc, dim;
 
       if (f.geom.polygons) {
         polygons = f.geom.polygons;
         zFunc = function (x, y) { return z0 + f.geom.h; };
+        dim = 2;
       }
       else {
         polygons = f.geom.split_polygons || [];   // with z values
+        dim = 3;
       }
 
-      var geom = Q3D.Utils.createOverlayGeometry(f.geom.triangles, polygons, zFunc);
+      var geom = Q3D.Utils.createOverlayGeometry(f.geom.triangles, polygons, zFunc, dim);
       return new THREE.Mesh(geom, materials.mtl(f.mtl));
 
       //TODO: [Polygon - Overlay] border
@@ -3070,8 +3326,38 @@ Q3D.Utils.createWallGeometry = function (vertices, bzFunc) {
   return geom;
 };
 
-Q3D.Utils.arrayToVec2Array = function (points) {
+Q3D.Utils.toFloat32Array = function (array) {
+  return (array instanceof Float32Array) ? array : new Float32Array(array);
+};
+
+// vertex lists unpacked from binary blocks are typed arrays of flat coordinates,
+// and ones in JSON blocks are arrays of coordinate arrays
+Q3D.Utils.isFlatArray = function (points) {
+  return ArrayBuffer.isView(points);
+};
+
+// returns a flat array of coordinates of the vertex list
+Q3D.Utils.flatArray = function (points) {
+  if (Q3D.Utils.isFlatArray(points)) return points;
+
+  var a = [];
+  for (var i = 0, l = points.length; i < l; i++) {
+    Array.prototype.push.apply(a, points[i]);
+  }
+  return a;
+};
+
+// dim is number of coordinates of a vertex in a flat array. default is 2
+Q3D.Utils.arrayToVec2Array = function (points, dim) {
   var pt, pts = [];
+  if (Q3D.Utils.isFlatArray(points)) {
+    dim = dim || 2;
+    for (var i = 0, l = points.length; i < l; i += dim) {
+      pts.push(new THREE.Vector2(points[i], points[i + 1]));
+    }
+    return pts;
+  }
+
   for (var i = 0, l = points.length; i < l; i++) {
     pt = points[i];
     pts.push(new THREE.Vector2(pt[0], pt[1]));
@@ -3079,8 +3365,17 @@ Q3D.Utils.arrayToVec2Array = function (points) {
   return pts;
 };
 
-Q3D.Utils.arrayToVec3Array = function (points, zFunc) {
+// dim is number of coordinates of a vertex in a flat array. default is 3
+Q3D.Utils.arrayToVec3Array = function (points, zFunc, dim) {
   var pt, pts = [];
+  if (Q3D.Utils.isFlatArray(points)) {
+    dim = dim || 3;
+    for (var i = 0, l = points.length; i < l; i += dim) {
+      pts.push(new THREE.Vector3(points[i], points[i + 1], (zFunc === undefined) ? points[i + 2] : zFunc(points[i], points[i + 1])));
+    }
+    return pts;
+  }
+
   if (zFunc === undefined) {
     for (var i = 0, l = points.length; i < l; i++) {
       pt = points[i];
@@ -3096,8 +3391,16 @@ Q3D.Utils.arrayToVec3Array = function (points, zFunc) {
   return pts;
 };
 
+// faces are an array of index arrays, or a flat typed array of indices
 Q3D.Utils.arrayToFace3Array = function (faces) {
   var f, fs = [];
+  if (Q3D.Utils.isFlatArray(faces)) {
+    for (var i = 0, l = faces.length; i < l; i += 3) {
+      fs.push(new THREE.Face3(faces[i], faces[i + 1], faces[i + 2]));
+    }
+    return fs;
+  }
+
   for (var i = 0, l = faces.length; i < l; i++) {
     f = faces[i];
     fs.push(new THREE.Face3(f[0], f[1], f[2]));
@@ -3105,12 +3408,13 @@ Q3D.Utils.arrayToFace3Array = function (faces) {
   return fs;
 };
 
-Q3D.Utils.createOverlayGeometry = function (triangles, polygons, zFunc) {
+// dim is number of coordinates of a vertex in flat vertex lists
+Q3D.Utils.createOverlayGeometry = function (triangles, polygons, zFunc, dim) {
   var geom = new THREE.Geometry();
 
   // vertices and faces
   if (triangles !== undefined) {
-    geom.vertices = Q3D.Utils.arrayToVec3Array(triangles.v, zFunc);
+    geom.vertices = Q3D.Utils.arrayToVec3Array(triangles.v, zFunc, dim);
     geom.faces = Q3D.Utils.arrayToFace3Array(triangles.f);
   }
 
@@ -3121,9 +3425,9 @@ Q3D.Utils.createOverlayGeometry = function (triangles, polygons, zFunc) {
         holes = [];
 
     // make Vector3 arrays
-    poly_geom.vertices = Q3D.Utils.arrayToVec3Array(polygon[0], zFunc);
+    poly_geom.vertices = Q3D.Utils.arrayToVec3Array(polygon[0], zFunc, dim);
     for (var j = 1, m = polygon.length; j < m; j++) {
-      holes.push(Q3D.Utils.arrayToVec3Array(polygon[j], zFunc));
+      holes.push(Q3D.Utils.arrayToVec3Array(polygon[j], zFunc, dim));
     }
 
     // triangulate polygon
@@ -23,6 +23,7 @@ from PyQt5.QtCore import Qt, QDir, QSettings
 from PyQt5.QtWidgets import QDialog, QFileDialog, QAbstractItemView, QHeaderView, QTableWidgetItem
 
 from .qgis2threejstools import logMessage, pluginDir
+from .texturecache import TextureCache
 from .ui.settingsdialog import Ui_SettingsDialog
 
 
@@ -36,10 +37,12 @@ class SettingsDialog(QDialog):
     ui.setupUi(self)
     ui.lineEdit_BrowserPath.setPlaceholderText("Leave this empty to use your default browser")
     ui.pushButton_Browse.clicked.connect(self.browseClicked)
+    ui.pushButton_ClearCache.clicked.connect(self.clearCacheClicked)
 
     # load settings
     settings = QSettings()
     ui.lineEdit_BrowserPath.setText(settings.value("/Qgis2threejs/browser", "", type=str))
+    ui.checkBox_TextureCache.setChecked(settings.value("/Qgis2threejs/textureCache", True, type=bool))
     enabled_plugins = QSettings().value("/Qgis2threejs/plugins", "", type=str).split(",")
 
     # initialize plugin table widget
@@ -85,6 +88,7 @@ class SettingsDialog(QDialog):
 
     # general settings
     settings.setValue("/Qgis2threejs/browser", self.ui.lineEdit_BrowserPath.text())
+    settings.setValue("/Qgis2threejs/textureCache", self.ui.checkBox_TextureCache.isChecked())
 
     # plugins
     enabled_plugins = []
@@ -97,6 +101,10 @@ class SettingsDialog(QDialog):
 
     QDialog.accept(self)
 
+  def clearCacheClicked(self):
+    TextureCache().clear()
+    self.ui.pushButton_ClearCache.setEnabled(False)
+
   def browseClicked(self):
     filename, _ = QFileDialog.getOpenFileName(self, self.tr("Select browser"))
     if filename != "":
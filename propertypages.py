@@ -33,7 +33,7 @@ from .ui.demproperties import Ui_DEMPropertiesWidget
 from .ui.vectorproperties import Ui_VectorPropertiesWidget
 
 from .conf import DEF_SETS
-from .datamanager import MaterialManager
+from .datamanager import ImageManager, MaterialManager
 from .pluginmanager import pluginManager
 from .qgis2threejscore import calculateDEMSize
 from .qgis2threejstools import getLayersInProject, logMessage
@@ -108,6 +108,14 @@ class PropertyPage(QWidget):
   def registerPropertyWidgets(self, widgets):
     self.propertyWidgets = widgets
 
+  def initImageFormatComboBox(self):
+    self.comboBox_ImageFormat.clear()
+    self.comboBox_ImageFormat.addItem("Auto (JPEG if opaque)", "AUTO")
+    self.comboBox_ImageFormat.addItem("PNG", "PNG")
+    self.comboBox_ImageFormat.addItem("JPEG", "JPEG")
+    if ImageManager.isFormatSupported("WEBP"):
+      self.comboBox_ImageFormat.addItem("WebP", "WEBP")
+
   def properties(self):
     p = {}
     for w in self.propertyWidgets:
@@ -235,16 +243,21 @@ class DEMPropertyPage(PropertyPage, Ui_DEMPropertiesWidget):
     self.layerImageIds = []
 
     dispTypeButtons = [self.radioButton_MapCanvas, self.radioButton_LayerImage, self.radioButton_ImageFile, self.radioButton_SolidColor]
-    widgets = [self.spinBox_Opacity, self.horizontalSlider_DEMSize]
-    widgets += [self.checkBox_Surroundings, self.spinBox_Size, self.spinBox_Roughening]
+    widgets = [self.spinBox_Opacity, self.horizontalSlider_DEMSize, self.comboBox_MaxBlockVertices]
+    widgets += [self.checkBox_Surroundings, self.spinBox_Size, self.spinBox_Roughening, self.comboBox_TextureFalloff]
     widgets += dispTypeButtons
-    widgets += [self.checkBox_TransparentBackground, self.lineEdit_ImageFile, self.colorButton_Color, self.comboBox_TextureSize, self.checkBox_Shading]
+    widgets += [self.checkBox_TransparentBackground, self.lineEdit_ImageFile, self.colorButton_Color, self.comboBox_TextureSize, self.checkBox_Shading, self.checkBox_PrecomputeNormals]
+    widgets += [self.comboBox_ImageFormat, self.spinBox_ImageQuality, self.comboBox_MaxTextureSize]
     widgets += [self.checkBox_Clip, self.comboBox_ClipLayer]
     widgets += [self.checkBox_Sides, self.checkBox_Frame, self.checkBox_Visible]
     self.registerPropertyWidgets(widgets)
 
     self.initLayerComboBox()
     self.initTextureSizeComboBox()
+    self.initImageFormatComboBox()
+    self.initMaxTextureSizeComboBox()
+    self.initMaxBlockVerticesComboBox()
+    self.initTextureFalloffComboBox()
 
     self.horizontalSlider_DEMSize.valueChanged.connect(self.resolutionSliderChanged)
     self.checkBox_Surroundings.toggled.connect(self.surroundingsToggled)
@@ -258,13 +271,18 @@ class DEMPropertyPage(PropertyPage, Ui_DEMPropertiesWidget):
     self.layer = layer
     properties = layer.properties
 
-    # show/hide resampling slider
+    # show/hide resampling slider and max vertices combo box
     self.setLayoutVisible(self.horizontalLayout_Resampling, layer.layerId != "FLAT")
+    self.setLayoutVisible(self.horizontalLayout_MaxBlockVertices, layer.layerId != "FLAT")
 
     # use default properties if properties is not set
     if not properties:
       properties = self.properties()
       properties["comboBox_TextureSize"] = 100
+      properties["comboBox_ImageFormat"] = "AUTO"
+      properties["comboBox_MaxTextureSize"] = 4096
+      properties["comboBox_MaxBlockVertices"] = 65536
+      properties["comboBox_TextureFalloff"] = 2
       properties["checkBox_Sides"] = True
 
     # restore properties of the layer
@@ -275,6 +293,7 @@ class DEMPropertyPage(PropertyPage, Ui_DEMPropertiesWidget):
     # set enablement and visibility of widgets
     self.surroundingsToggled(self.checkBox_Surroundings.isChecked())
     self.comboBox_ClipLayer.setVisible(self.checkBox_Clip.isChecked())
+    self.checkBox_PrecomputeNormals.setEnabled(self.checkBox_Shading.isChecked())
     self.dispTypeChanged()
 
   def initLayerComboBox(self):
@@ -294,6 +313,29 @@ class DEMPropertyPage(PropertyPage, Ui_DEMPropertiesWidget):
       text = "{0} %  ({1} x {2} px)".format(percent, outsize.width() * i, outsize.height() * i)
       self.comboBox_TextureSize.addItem(text, percent)
 
+  def initMaxTextureSizeComboBox(self):
+    self.comboBox_MaxTextureSize.clear()
+    self.comboBox_MaxTextureSize.addItem("No limit", 0)
+    for size in [2048, 4096, 8192]:
+      self.comboBox_MaxTextureSize.addItem("{0} px".format(size), size)
+
+  def initMaxBlockVerticesComboBox(self):
+    self.comboBox_MaxBlockVertices.clear()
+    self.comboBox_MaxBlockVertices.addItem("No limit", 0)
+    for count in [65536, 262144, 1048576]:
+      text = "{0:,}".format(count)
+      if count == 65536:
+        text += "  (16-bit index)"
+      self.comboBox_MaxBlockVertices.addItem(text, count)
+
+  def initTextureFalloffComboBox(self):
+    # item data: divisor of texture size per ring of surroundings. 0 means the roughening factor.
+    self.comboBox_TextureFalloff.clear()
+    self.comboBox_TextureFalloff.addItem("Same as center block", 1)
+    self.comboBox_TextureFalloff.addItem("1/2 per ring", 2)
+    self.comboBox_TextureFalloff.addItem("1/4 per ring", 4)
+    self.comboBox_TextureFalloff.addItem("Match roughening", 0)
+
   def resolutionSliderChanged(self, v):
     canvas = self.dialog.iface.mapCanvas()
     canvasSize = canvas.mapSettings().outputSize()
@@ -376,7 +418,8 @@ Grid Spacing: {3:.5f} x {4:.5f})""".format(resolutionLevel,
       else:   # self.radioButton_SolidColor.isChecked():
         t = 3
 
-      self.setWidgetsEnabled([self.label_TextureSize, self.comboBox_TextureSize], t in [0, 1])
+      self.setWidgetsEnabled([self.label_TextureSize, self.comboBox_TextureSize, self.label_MaxTextureSize, self.comboBox_MaxTextureSize], t in [0, 1])
+      self.setWidgetsEnabled([self.label_ImageFormat, self.comboBox_ImageFormat, self.spinBox_ImageQuality], t in [0, 1, 2])
 
       self.checkBox_TransparentBackground.setEnabled(t in [0, 1, 2])
       if t in [0, 1]:
@@ -420,10 +463,15 @@ class VectorPropertyPage(PropertyPage, Ui_VectorPropertiesWidget):
     widgets += self.buttonGroup_altitude.buttons() + [self.fieldExpressionWidget_altitude, self.comboBox_altitudeMode]
     widgets += self.styleWidgets
     widgets += [self.radioButton_AllFeatures, self.radioButton_IntersectingFeatures, self.checkBox_Clip]
-    widgets += [self.checkBox_ExportAttrs, self.comboBox_Label, self.labelHeightWidget]
-    widgets += [self.checkBox_Visible]
+    widgets += [self.checkBox_ExportAttrs, self.checkBox_AttrsOnQuery, self.comboBox_Label, self.labelHeightWidget]
+    widgets += [self.checkBox_Visible, self.checkBox_BinaryBlocks, self.checkBox_SpatialOrder, self.comboBox_BlockVertices,
+                self.comboBox_BlockSize, self.spinBox_GeometryThreads, self.comboBox_ImageFormat, self.spinBox_ImageQuality]
     self.registerPropertyWidgets(widgets)
 
+    self.initBlockVerticesComboBox()
+    self.initBlockSizeComboBox()
+    self.initImageFormatComboBox()
+
     self.comboBox_ObjectType.currentIndexChanged.connect(self.setupStyleWidgets)
     self.comboBox_altitudeMode.currentIndexChanged.connect(self.altitudeModeChanged)
     for btn in self.buttonGroup_altitude.buttons():
@@ -516,7 +564,26 @@ class VectorPropertyPage(PropertyPage, Ui_VectorPropertiesWidget):
         self.comboBox_Label.addItem(fields[i].name(), i)
 
     # restore other properties for the layer
-    self.setProperties(properties or {})
+    if not properties:
+      properties = {"checkBox_BinaryBlocks": True,
+                    "comboBox_BlockVertices": 50000,
+                    "comboBox_BlockSize": 1024 * 1024,
+                    "comboBox_ImageFormat": "AUTO"}
+    self.setProperties(properties)
+
+  def initBlockVerticesComboBox(self):
+    # item data: max number of vertices in a block. 0 means no limit.
+    self.comboBox_BlockVertices.clear()
+    self.comboBox_BlockVertices.addItem("No limit", 0)
+    for count in [10000, 50000, 200000]:
+      self.comboBox_BlockVertices.addItem("{0:,}".format(count), count)
+
+  def initBlockSizeComboBox(self):
+    # item data: max estimated size of a block in bytes. 0 means no limit.
+    self.comboBox_BlockSize.clear()
+    self.comboBox_BlockSize.addItem("No limit", 0)
+    for size, text in [(256 * 1024, "256 KB"), (1024 * 1024, "1 MB"), (4 * 1024 * 1024, "4 MB")]:
+      self.comboBox_BlockSize.addItem(text, size)
 
   def setupStyleWidgets(self, index=None):
     # setup widgets
@@ -563,6 +630,7 @@ class VectorPropertyPage(PropertyPage, Ui_VectorPropertiesWidget):
 
   def exportAttrsToggled(self, checked):
     self.setLayoutEnabled(self.formLayout_Label, checked)
+    self.checkBox_AttrsOnQuery.setEnabled(checked)
     self.labelHeightWidget.setEnabled(checked)
 
   def properties(self):
@@ -19,11 +19,16 @@
  *                                                                         *
  ***************************************************************************/
 """
+import math
 import random
-from PyQt5.QtCore import QSize
+import numpy
+from PyQt5.QtCore import QSize, QVariant
 from PyQt5.QtGui import QColor
-from qgis.core import QgsExpression, QgsExpressionContext, QgsExpressionContextUtils
+from qgis.core import (QgsExpression, QgsExpressionContext, QgsExpressionContextUtils, QgsExpressionNodeBinaryOperator,
+                       QgsExpressionNodeColumnRef, QgsExpressionNodeFunction, QgsExpressionNodeLiteral,
+                       QgsExpressionNodeUnaryOperator, QgsFeatureRequest)
 
+from .conf import COLUMNAR_EVALUATION, EXPRESSION_MEMO_FIELDS, EXPRESSION_MEMO_SIZE
 from .qgis2threejscore import calculateDEMSize
 from .qgis2threejstools import logMessage
 from .stylewidget import StyleWidget, ColorWidgetFunc, OpacityWidgetFunc, OptionalColorWidgetFunc, ColorTextureWidgetFunc
@@ -49,6 +54,298 @@ class DEMPropertyReader:
     return calculateDEMSize(canvasSize, sizeLevel, roughening)
 
 
+class ColumnarExpression:
+  """evaluates an expression over a chunk of features with numpy. supported are numeric literals, numeric fields,
+     arithmetic operators (+, -, *, /, //, ^) and some functions (coalesce, abs, sqrt, min, max).
+     NULL is represented by NaN while evaluating, and NULL is returned where QgsExpression returns NULL.
+     results are integers if all the fields and literals are integers and no operator or function gives a fraction."""
+
+  INTEGER_TYPES = [QVariant.Int, QVariant.UInt, QVariant.LongLong, QVariant.ULongLong]
+
+  BINARY_OPERATORS = {QgsExpressionNodeBinaryOperator.boPlus: numpy.add,
+                      QgsExpressionNodeBinaryOperator.boMinus: numpy.subtract,
+                      QgsExpressionNodeBinaryOperator.boMul: numpy.multiply,
+                      QgsExpressionNodeBinaryOperator.boDiv: numpy.true_divide,
+                      QgsExpressionNodeBinaryOperator.boIntDiv: numpy.floor_divide,
+                      QgsExpressionNodeBinaryOperator.boPow: numpy.power}
+
+  def __init__(self, expr, fields):
+    """raises NotImplementedError if the expression is not supported"""
+    self.fields = fields
+    self.fieldIndices = []
+    self.isInteger = True
+    self.func = self._compile(expr.rootNode())
+
+  @classmethod
+  def create(cls, expr, fields):
+    """returns None if the expression cannot be evaluated in columnar way"""
+    if expr.hasParserError() or expr.rootNode() is None:
+      return None
+    try:
+      return cls(expr, fields)
+    except NotImplementedError:
+      return None
+
+  def _compile(self, node):
+    if isinstance(node, QgsExpressionNodeLiteral):
+      v = node.value()
+      if isinstance(v, bool) or not isinstance(v, (int, float)):
+        raise NotImplementedError
+      if not isinstance(v, int):
+        self.isInteger = False
+      v = float(v)
+      return lambda cols: v
+
+    if isinstance(node, QgsExpressionNodeColumnRef):
+      idx = self.fields.lookupField(node.name())
+      if idx == -1 or not self.fields[idx].isNumeric():
+        raise NotImplementedError
+
+      if self.fields[idx].type() not in self.INTEGER_TYPES:
+        self.isInteger = False
+
+      if idx not in self.fieldIndices:
+        self.fieldIndices.append(idx)
+      return lambda cols: cols[idx]
+
+    if isinstance(node, QgsExpressionNodeUnaryOperator):
+      if node.op() != QgsExpressionNodeUnaryOperator.uoMinus:
+        raise NotImplementedError
+
+      operand = self._compile(node.operand())
+      return lambda cols: numpy.negative(operand(cols))
+
+    if isinstance(node, QgsExpressionNodeBinaryOperator):
+      op = self.BINARY_OPERATORS.get(node.op())
+      if op is None:
+        raise NotImplementedError
+
+      if op in (numpy.true_divide, numpy.power):
+        self.isInteger = False
+
+      left, right = self._compile(node.opLeft()), self._compile(node.opRight())
+      return lambda cols: op(left(cols), right(cols))
+
+    if isinstance(node, QgsExpressionNodeFunction):
+      name = QgsExpression.Functions()[node.fnIndex()].name().lower()
+      args = [self._compile(arg) for arg in node.args().list()] if node.args() else []
+      if not args:
+        raise NotImplementedError
+
+      if name == "coalesce":
+        def coalesce(cols):
+          v = args[0](cols)
+          for arg in args[1:]:
+            v = numpy.where(numpy.isnan(v), arg(cols), v)
+          return v
+        return coalesce
+
+      if name in ["abs", "sqrt"] and len(args) == 1:
+        func = numpy.abs if name == "abs" else numpy.sqrt
+        if name == "sqrt":
+          self.isInteger = False
+        return lambda cols: func(args[0](cols))
+
+      if name in ["min", "max"]:
+        func = numpy.fmin if name == "min" else numpy.fmax     # NULLs are ignored
+        def minmax(cols):
+          v = args[0](cols)
+          for arg in args[1:]:
+            v = func(v, arg(cols))
+          return v
+        return minmax
+
+    raise NotImplementedError
+
+  def evaluate(self, feats):
+    """returns a list of values for given features. value is None where result is NULL"""
+    nan = float("nan")
+    cols = {}
+    for idx in self.fieldIndices:
+      values = (f.attribute(idx) for f in feats)
+      cols[idx] = numpy.fromiter((v if isinstance(v, (int, float)) else nan for v in values), float, len(feats))
+
+    with numpy.errstate(all="ignore"):
+      v = numpy.broadcast_to(self.func(cols), (len(feats),))
+
+    if self.isInteger:
+      return [int(x) if math.isfinite(x) else None for x in v.tolist()]
+    return [x if math.isfinite(x) else None for x in v.tolist()]
+
+
+class PreparedExpression:
+  """expression prepared for a layer. a constant expression is evaluated only once, and values of
+     an expression which refers to a few fields are memoized on the field values."""
+
+  # functions whose results vary even if field values are the same
+  VOLATILE_FUNCTIONS = ["rand", "randf", "uuid", "$uuid", "now", "$now", "$id", "$currentfeature", "eval"]
+
+  def __init__(self, expr_str, context, fields):
+    self.expr = QgsExpression(expr_str)
+    self.expr.prepare(context)
+
+    self.isConstant = False
+    self.fieldIndices = None
+    self.memo = {}
+    self.evalCount = self.hitCount = self.columnarCount = 0
+
+    self.columnar = None
+    self.batch = None
+    self._chunk = None
+    self._chunkPos = 0
+    if COLUMNAR_EVALUATION and self.expr.referencedColumns():
+      self.columnar = ColumnarExpression.create(self.expr, fields)
+
+    if self.expr.hasParserError() or self.expr.needsGeometry() or self.expr.referencedVariables():
+      return
+
+    funcs = self.expr.referencedFunctions() if hasattr(self.expr, "referencedFunctions") else self.VOLATILE_FUNCTIONS
+    if any(func in self.VOLATILE_FUNCTIONS for func in funcs):
+      return
+
+    columns = self.expr.referencedColumns()
+    if not columns:
+      self.isConstant = True
+
+    elif len(columns) <= EXPRESSION_MEMO_FIELDS and QgsFeatureRequest.ALL_ATTRIBUTES not in columns:
+      indices = [fields.lookupField(name) for name in columns]
+      if -1 not in indices:
+        self.fieldIndices = indices
+
+  def prepareChunk(self, feats):
+    """evaluate the expression for a chunk of features in columnar way"""
+    self._chunk = list(feats)
+    self._chunkPos = 0
+    self.batch = self.columnar.evaluate(self._chunk)
+    self.columnarCount += len(feats)
+
+  def chunkPosition(self, f):
+    """returns position of the feature in the chunk, or None if it is not in the chunk.
+       features are expected to be evaluated in the chunk order. they are identified by position,
+       not by feature id, since ids are not always unique"""
+    for i in (self._chunkPos, self._chunkPos + 1):
+      if i < len(self._chunk) and self._chunk[i] is f:
+        self._chunkPos = i
+        return i
+    return None
+
+  def evaluate(self, context, f=None):
+    if self.batch is not None and f is not None:
+      i = self.chunkPosition(f)
+      if i is not None:
+        return self.batch[i]
+
+    if self.isConstant:
+      if not self.memo:
+        self.memo[None] = self.expr.evaluate(context)
+      self.hitCount += 1
+      return self.memo[None]
+
+    if self.fieldIndices is not None and f is not None:
+      key = tuple(None if isinstance(v, QVariant) else v for v in (f.attribute(i) for i in self.fieldIndices))
+      try:
+        val = self.memo[key]
+        self.hitCount += 1
+        return val
+      except KeyError:
+        if len(self.memo) >= EXPRESSION_MEMO_SIZE:
+          self.memo.clear()
+
+        val = self.memo[key] = self.expr.evaluate(context)
+        self.evalCount += 1
+        return val
+      except TypeError:   # unhashable field value
+        pass
+
+    self.evalCount += 1
+    return self.expr.evaluate(context)
+
+
+class SymbolCache:
+  """caches symbols for features with their colors and opacity. symbols are looked up by classification
+     attribute value for categorized and graduated renderers, by values of fields referred by rule filters
+     for rule-based renderer, and only once for single symbol renderer."""
+
+  def __init__(self, layer, renderContext):
+    self.layer = layer
+    self.renderContext = renderContext
+    self.renderer = layer.renderer()
+    self.fieldIndices = self.keyFieldIndices()
+    self.cache = {}
+    self.lookupCount = self.hitCount = 0
+
+  def keyFieldIndices(self):
+    """returns indices of fields which determine symbol for a feature, or None if symbols cannot be cached"""
+    renderer = self.renderer
+    if renderer is None:
+      return None
+
+    fields = self.layer.fields()
+    rendererType = renderer.type()
+    if rendererType == "singleSymbol":
+      return []
+
+    if rendererType in ["categorizedSymbol", "graduatedSymbol"]:
+      idx = fields.lookupField(renderer.classAttribute())
+      if idx != -1:
+        return [idx]
+      exprs = [QgsExpression(renderer.classAttribute())]
+
+    elif rendererType == "RuleRenderer":
+      exprs = [QgsExpression(rule.filterExpression()) for rule in renderer.rootRule().descendants() if rule.filterExpression()]
+
+    else:
+      return None
+
+    columns = set()
+    for expr in exprs:
+      if expr.hasParserError() or expr.needsGeometry():
+        return None
+
+      if hasattr(expr, "referencedFunctions") and any(func in PreparedExpression.VOLATILE_FUNCTIONS for func in expr.referencedFunctions()):
+        return None
+
+      cols = expr.referencedColumns()
+      if QgsFeatureRequest.ALL_ATTRIBUTES in cols:
+        return None
+      columns |= cols
+
+    indices = [fields.lookupField(name) for name in columns]
+    if -1 in indices:
+      return None
+    return sorted(indices)
+
+  def lookup(self, f):
+    """returns a tuple of symbol, fill color, stroke color and opacity for a feature. symbol is None if not found"""
+    key = None
+    if self.fieldIndices is not None:
+      key = tuple(None if isinstance(v, QVariant) else v for v in (f.attribute(i) for i in self.fieldIndices))
+      self.lookupCount += 1
+      try:
+        info = self.cache[key]
+        self.hitCount += 1
+        return info
+      except (KeyError, TypeError):
+        pass
+
+    symbol = self.renderer.symbolForFeature(f, self.renderContext)
+    if symbol is None:
+      info = (None, None, None, None)
+    else:
+      sl = symbol.symbolLayer(0)
+      info = (symbol,
+              symbol.color().name().replace("#", "0x"),
+              sl.strokeColor().name().replace("#", "0x") if sl else None,
+              self.layer.opacity() * symbol.opacity())
+
+    if key is not None and len(self.cache) < EXPRESSION_MEMO_SIZE:
+      try:
+        self.cache[key] = info
+      except TypeError:   # unhashable field value
+        pass
+    return info
+
+
 class VectorPropertyReader:
 
   def __init__(self, objectTypeManager, renderContext, layer, properties):
@@ -67,15 +364,58 @@ class VectorPropertyReader:
       self.visible = False
 
     self._exprs = {}
-    self.exprAlt = QgsExpression(properties.get("fieldExpressionWidget_altitude") or "0")
-    self.exprLabel = QgsExpression(properties.get("labelHeightWidget", {}).get("editText") or "0")
+    self._feature = None
+    self._colors = {}
+    self.symbols = SymbolCache(layer, renderContext)
+    self.exprAlt = self.expression(properties.get("fieldExpressionWidget_altitude") or "0")
+    self.exprLabel = self.expression(properties.get("labelHeightWidget", {}).get("editText") or "0")
+
+    # evaluation plan of style widget values
+    self._plan = self.compileValuePlan() if properties else []
+
+  def expression(self, expr_str):
+    """returns a PreparedExpression object, which is created once per expression string"""
+    expr = self._exprs.get(expr_str)
+    if expr is None:
+      expr = self._exprs[expr_str] = PreparedExpression(expr_str, self.expressionContext, self.layer.fields())
+    return expr
 
   def evaluateExpression(self, expr_str, f):
-    if expr_str not in self._exprs:
-      self._exprs[expr_str] = QgsExpression(expr_str)
-
-    self.expressionContext.setFeature(f)
-    return self._exprs[expr_str].evaluate(self.expressionContext)
+    if f is not self._feature:
+      self.setContextFeature(f)
+    return self.expression(expr_str).evaluate(self.expressionContext, f)
+
+  def referencedFields(self):
+    """returns a set of names of fields referred by expressions and renderer, or None if all attributes are required"""
+    names = set()
+    for expr in self._exprs.values():
+      columns = expr.expr.referencedColumns()
+      if QgsFeatureRequest.ALL_ATTRIBUTES in columns:
+        return None
+      names |= columns
+
+    renderer = self.layer.renderer()
+    if renderer:
+      columns = set(renderer.usedAttributes(self.renderContext))
+      if QgsFeatureRequest.ALL_ATTRIBUTES in columns:
+        return None
+      names |= columns
+    return names
+
+  def prepareChunk(self, feats):
+    """evaluate expressions which can be evaluated in columnar way for a chunk of features"""
+    for expr in self._exprs.values():
+      if expr.columnar:
+        expr.prepareChunk(feats)
+
+  def logStats(self):
+    for expr_str, expr in self._exprs.items():
+      if expr.evalCount or expr.hitCount or expr.columnarCount:
+        logMessage("Expression {0}: {1} evaluations, {2} cache hits, {3} columnar evaluations".format(expr_str, expr.evalCount, expr.hitCount, expr.columnarCount))
+
+    if self.symbols.lookupCount:
+      logMessage("Symbol cache: {0} hits / {1} lookups ({2:.1f}%), {3} symbols".format(
+        self.symbols.hitCount, self.symbols.lookupCount, 100 * self.symbols.hitCount / self.symbols.lookupCount, len(self.symbols.cache)))
 
   def readFillColor(self, vals, f):
     return self._readColor(vals, f)
@@ -95,11 +435,7 @@ class VectorPropertyReader:
       val = self.evaluateExpression(widgetValues["editText"], f)
       try:
         if isinstance(val, str):
-          a = val.split(",")
-          if len(a) >= 3:
-            a = [max(0, min(int(c), 255)) for c in a[:3]]
-            return "0x{:02x}{:02x}{:02x}".format(a[0], a[1], a[2])
-          return val.replace("#", "0x")
+          return self.colorFromString(val)
 
         raise
       except:
@@ -114,7 +450,7 @@ class VectorPropertyReader:
       return QColor(colorName).name().replace("#", "0x")
 
     # feature color
-    symbol = self.layer.renderer().symbolForFeature(f, self.renderContext)
+    symbol, fillColor, strokeColor, _ = self.symbols.lookup(f)
     if symbol is None:
       logMessage('Symbol for feature not found. Please use a simple renderer for {0}.'.format(self.layer.name()))
       return "0"
@@ -123,7 +459,7 @@ class VectorPropertyReader:
       sl = symbol.symbolLayer(0)
       if sl:
         if isBorder:
-          return sl.strokeColor().name().replace("#", "0x")
+          return strokeColor
 
         if symbol.hasDataDefinedProperties():
           expr = sl.dataDefinedProperty("color")
@@ -132,10 +468,24 @@ class VectorPropertyReader:
             rgb = expr.evaluate(f, f.fields())
 
             # "rrr,ggg,bbb" (dec) to "0xRRGGBB" (hex)
-            r, g, b = [max(0, min(int(c), 255)) for c in rgb.split(",")[:3]]
-            return "0x{:02x}{:02x}{:02x}".format(r, g, b)
+            return self.colorFromString(rgb)
+
+    return fillColor
+
+  def colorFromString(self, val):
+    """converts "rrr,ggg,bbb" (dec) or "#RRGGBB" to "0xRRGGBB". converted values are cached"""
+    color = self._colors.get(val)
+    if color is None:
+      a = val.split(",")
+      if len(a) >= 3:
+        a = [max(0, min(int(c), 255)) for c in a[:3]]
+        color = "0x{:02x}{:02x}{:02x}".format(a[0], a[1], a[2])
+      else:
+        color = val.replace("#", "0x")
 
-    return symbol.color().name().replace("#", "0x")
+      if len(self._colors) < EXPRESSION_MEMO_SIZE:
+        self._colors[val] = color
+    return color
 
   def readOpacity(self, widgetValues, f):
     vals = widgetValues
@@ -148,12 +498,12 @@ class VectorPropertyReader:
         logMessage("Wrong opacity value: {}".format(val))
         return 1
 
-    symbol = self.layer.renderer().symbolForFeature(f, self.renderContext)
+    symbol, _, _, opacity = self.symbols.lookup(f)
     if symbol is None:
       logMessage('Symbol for feature not found. Please use a simple renderer for {0}.'.format(self.layer.name()))
       return 1
     #TODO [data defined property]
-    return self.layer.opacity() * symbol.opacity()
+    return opacity
 
   @classmethod
   def toFloat(cls, val):
@@ -174,18 +524,18 @@ class VectorPropertyReader:
     return self.properties.get("comboBox_altitudeMode") is not None
 
   def altitude(self):
-    return float(self.exprAlt.evaluate(self.expressionContext) or 0)
+    return float(self.exprAlt.evaluate(self.expressionContext, self._feature) or 0)
 
   def labelHeight(self):
-    return float(self.exprLabel.evaluate(self.expressionContext) or 0)
+    return float(self.exprLabel.evaluate(self.expressionContext, self._feature) or 0)
 
   def setContextFeature(self, f):
+    self._feature = f
     self.expressionContext.setFeature(f)
 
-  # read values from style widgets
-  def values(self, f):
-    assert(f is not None)
-    vals = []
+  def compileValuePlan(self):
+    """returns a list of functions, each of which reads a value of a style widget from a feature"""
+    plan = []
     for i in range(16):   # big number for style count
       p = "styleWidget" + str(i)
       if p not in self.properties:
@@ -195,36 +545,54 @@ class VectorPropertyReader:
       if len(widgetValues) == 0:
         break
 
-      widgetType = widgetValues["type"]
-      comboData = widgetValues.get("comboData")
-      if widgetType == StyleWidget.COLOR:
-        vals.append(self.readFillColor(widgetValues, f))
+      plan.append(self._valueFunc(widgetValues))
+    return plan
 
-      elif widgetType == StyleWidget.OPTIONAL_COLOR:
-        vals.append(self.readBorderColor(widgetValues, f))
+  def _valueFunc(self, widgetValues):
+    widgetType = widgetValues["type"]
+    comboData = widgetValues.get("comboData")
 
-      elif widgetType == StyleWidget.COLOR_TEXTURE:
-        if comboData == ColorTextureWidgetFunc.MAP_CANVAS:
-          vals.append(comboData)
-        elif comboData == ColorTextureWidgetFunc.LAYER:
-          vals.append(widgetValues.get("layerIds", []))
-        else:
-          vals.append(self.readFillColor(widgetValues, f))
+    # create color/opacity expressions in advance, so that fields referred by them are known before reading features
+    if (widgetType in [StyleWidget.COLOR, StyleWidget.OPTIONAL_COLOR, StyleWidget.COLOR_TEXTURE] and comboData == ColorWidgetFunc.EXPRESSION) or \
+       (widgetType == StyleWidget.OPACITY and comboData == OpacityWidgetFunc.EXPRESSION):
+      self.expression(widgetValues["editText"])
+    if widgetType == StyleWidget.COLOR:
+      return lambda f: self.readFillColor(widgetValues, f)
 
-      elif widgetType == StyleWidget.OPACITY:
-        vals.append(self.readOpacity(widgetValues, f))
+    if widgetType == StyleWidget.OPTIONAL_COLOR:
+      return lambda f: self.readBorderColor(widgetValues, f)
 
-      elif widgetType == StyleWidget.CHECKBOX:
-        vals.append(widgetValues["checkBox"])
+    if widgetType == StyleWidget.COLOR_TEXTURE:
+      if comboData == ColorTextureWidgetFunc.MAP_CANVAS:
+        return lambda f: comboData
+      if comboData == ColorTextureWidgetFunc.LAYER:
+        layerIds = widgetValues.get("layerIds", [])
+        return lambda f: layerIds
+      return lambda f: self.readFillColor(widgetValues, f)
 
-      else:
-        expr = widgetValues["editText"]
-        val = self.evaluateExpression(expr, f)
-        if val is None:
-          logMessage("Failed to evaluate expression: " + expr)
-          if widgetType == StyleWidget.FILEPATH:
-            val = ""
-          else:
-            val = 0
-        vals.append(val)
-    return vals
+    if widgetType == StyleWidget.OPACITY:
+      return lambda f: self.readOpacity(widgetValues, f)
+
+    if widgetType == StyleWidget.CHECKBOX:
+      checked = widgetValues["checkBox"]
+      return lambda f: checked
+
+    expr_str = widgetValues["editText"]
+    expr = self.expression(expr_str)
+    defaultValue = "" if widgetType == StyleWidget.FILEPATH else 0
+
+    def evaluate(f):
+      val = expr.evaluate(self.expressionContext, f)
+      if val is None:
+        logMessage("Failed to evaluate expression: " + expr_str)
+        return defaultValue
+      return val
+
+    return evaluate
+
+  # read values from style widgets
+  def values(self, f):
+    assert(f is not None)
+    if f is not self._feature:
+      self.setContextFeature(f)
+    return [func(f) for func in self._plan]
@@ -93,6 +93,7 @@ class Q3DViewerController:
 
     # export scene
     self.exporter.settings.setMapCanvas(self.qgis_iface.mapCanvas())
+    self.exporter.imageManager.clearMemory()
     self.iface.loadJSONObject(self.exporter.buildScene(False))
 
     if update_scene_settings:
@@ -125,6 +126,7 @@ class Q3DViewerController:
     self.iface.showMessage(self.message1)
     self.iface.progress(0, "Building {0}...".format(layer.name))
 
+    self.exporter.imageManager.clearMemory()
     self._updateLayer(layer)
 
     self.updating = self.aborted = False
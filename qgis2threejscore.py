@@ -22,6 +22,8 @@
 import struct
 
 from math import floor
+
+import numpy
 from osgeo import gdal
 from PyQt5.QtCore import QSize
 
@@ -48,15 +50,44 @@ class MapTo3D:
     self.multiplier = planeWidth / self.mapExtent.width()
     self.multiplierZ = self.multiplier * verticalExaggeration
 
+    # affine matrix from map coordinates to 3D x and y: normalization of the extent followed by scaling
+    a, b, c, d, e, f = self.mapExtent.matrix()
+    pw, ph = self.planeWidth, self.planeHeight
+    self._matrix = (a * pw, b * pw, (c - 0.5) * pw,
+                    d * ph, e * ph, (f - 0.5) * ph)
+
   def transform(self, x, y, z=0):
-    n = self.mapExtent.normalizePoint(x, y)
-    return Point((n.x() - 0.5) * self.planeWidth,
-                 (n.y() - 0.5) * self.planeHeight,
+    a, b, c, d, e, f = self._matrix
+    return Point(a * x + b * y + c,
+                 d * x + e * y + f,
                  (z + self.verticalShift) * self.multiplierZ)
 
   def transformPoint(self, pt):
     return self.transform(pt.x, pt.y, pt.z)
 
+  def transformArray(self, xs, ys, zs):
+    """transforms points given as coordinate arrays at once. returns an array of shape (n, 3)"""
+    xs, ys, zs = (numpy.asarray(v, dtype=float) for v in (xs, ys, zs))
+    a, b, c, d, e, f = self._matrix
+    v = numpy.empty((len(xs), 3))
+    v[:, 0] = a * xs + b * ys + c
+    v[:, 1] = d * xs + e * ys + f
+    v[:, 2] = self.transformZ(zs)
+    return v
+
+  def transformZ(self, zs):
+    """transforms an array of z values"""
+    return (numpy.asarray(zs, dtype=float) + self.verticalShift) * self.multiplierZ
+
+  def inverseArray(self, xs, ys, zs):
+    """inverse of transformArray. returns an array of shape (n, 3) of map coordinates"""
+    nx = numpy.asarray(xs, dtype=float) / self.planeWidth + 0.5
+    ny = numpy.asarray(ys, dtype=float) / self.planeHeight + 0.5
+    v = numpy.empty((len(nx), 3))
+    v[:, 0], v[:, 1] = self.mapExtent.inverseArray(nx, ny)
+    v[:, 2] = numpy.asarray(zs, dtype=float) / self.multiplierZ - self.verticalShift
+    return v
+
 
 class GDALDEMProvider(Raster):
 
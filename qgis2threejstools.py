@@ -130,12 +130,16 @@ def openHTMLFile(htmlfilename):
   return True
 
 
-def base64image(image):
+def base64image(image, fmt="PNG", quality=-1, mimeType="image/png"):
   ba = QByteArray()
   buffer = QBuffer(ba)
   buffer.open(QIODevice.WriteOnly)
-  image.save(buffer, "PNG")
-  return "data:image/png;base64," + ba.toBase64().data().decode("ascii")
+  image.save(buffer, fmt, quality)
+  return "data:{0};base64,".format(mimeType) + ba.toBase64().data().decode("ascii")
+
+
+def base64data(data, mimeType):
+  return "data:{0};base64,".format(mimeType) + QByteArray(data).toBase64().data().decode("ascii")
 
 
 def getTemplateConfig(template_path):
@@ -174,6 +178,21 @@ def copyFile(source, dest, overwrite=False):
   return ret
 
 
+def writeFile(path, data):
+  """writes bytes to a file. the file is left untouched if it already has the same content"""
+  try:
+    if os.path.getsize(path) == len(data):
+      with open(path, "rb") as f:
+        if f.read() == data:
+          return False
+  except OSError:
+    pass
+
+  with open(path, "wb") as f:
+    f.write(data)
+  return True
+
+
 def copyDir(source, dest, overwrite=False):
   if os.path.exists(dest):
     if overwrite:
@@ -266,6 +285,11 @@ def temporaryOutputDir():
   return QDir.tempPath() + "/Qgis2threejs"
 
 
+def cacheDir(*subdirs):
+  from qgis.core import QgsApplication
+  return os.path.join(QgsApplication.qgisSettingsDirPath(), "Qgis2threejs", "cache", *subdirs)
+
+
 def settingsFilePath():
   proj_path = QgsProject.instance().fileName()
   return proj_path + ".qto3settings" if proj_path else None
@@ -18,6 +18,8 @@
  ***************************************************************************/
 """
 import math
+
+import numpy
 from qgis.core import QgsPointXY, QgsRectangle, QgsGeometry
 
 
@@ -42,6 +44,20 @@ class RotatedRect:
   def _updateDerived(self):
     self._unrotated_rect = self._unrotatedRect()
 
+    # affine matrices (a, b, c, d, e, f) of normalization and its inverse:
+    #   x' = a * x + b * y + c, y' = d * x + e * y + f
+    theta = self._rotation * math.pi / 180
+    cos, sin = math.cos(theta), math.sin(theta)
+    cx, cy = self._center.x(), self._center.y()
+    w, h = self._width, self._height
+    a, b, d, e = cos / w, sin / w, -sin / h, cos / h
+    self._matrix = (a, b, 0.5 - a * cx - b * cy,
+                    d, e, 0.5 - d * cx - e * cy)
+
+    a, b, d, e = cos * w, -sin * h, sin * w, cos * h
+    self._inverse = (a, b, cx - 0.5 * (a + b),
+                     d, e, cy - 0.5 * (d + e))
+
   def _unrotatedRect(self):
     center = self._center
     half_width = self._width / 2
@@ -73,12 +89,20 @@ class RotatedRect:
 
   def normalizePoint(self, x, y):
     """Normalize given point. In result, lower-left is (0, 0) and upper-right is (1, 1)."""
-    pt = QgsPointXY(x, y)
-    if self._rotation:
-      pt = self.rotatePoint(pt, -self._rotation, self._center)
-    rect = self._unrotated_rect
-    return QgsPointXY((pt.x() - rect.xMinimum()) / rect.width(),
-                    (pt.y() - rect.yMinimum()) / rect.height())
+    a, b, c, d, e, f = self._matrix
+    return QgsPointXY(a * x + b * y + c, d * x + e * y + f)
+
+  def transformArray(self, xs, ys):
+    """Normalize points given as coordinate arrays. Returns a tuple of normalized x and y arrays (numpy.ndarray)."""
+    xs, ys = numpy.asarray(xs, dtype=float), numpy.asarray(ys, dtype=float)
+    a, b, c, d, e, f = self._matrix
+    return a * xs + b * ys + c, d * xs + e * ys + f
+
+  def inverseArray(self, xs, ys):
+    """Inverse of transformArray. Returns a tuple of x and y arrays of map coordinates."""
+    xs, ys = numpy.asarray(xs, dtype=float), numpy.asarray(ys, dtype=float)
+    a, b, c, d, e, f = self._inverse
+    return a * xs + b * ys + c, d * xs + e * ys + f
 
   def scale(self, s):
     self._width *= s
@@ -93,9 +117,8 @@ class RotatedRect:
       origin  -- QgsPointXY
     """
     self._rotation += degrees
-    if origin is None:
-      return self
-    self._center = self.rotatePoint(self._center, degrees, origin)
+    if origin is not None:
+      self._center = self.rotatePoint(self._center, degrees, origin)
     self._updateDerived()
     return self
 
@@ -106,13 +129,10 @@ class RotatedRect:
       y_inverted -- If True, lower-left is (0, 1) and upper-right is (1, 0).
                     Or else lower-left is (0, 0) and upper-right is (1, 1).
     """
-    ur_rect = self._unrotated_rect
-    x = ur_rect.xMinimum() + norm_point.x() * ur_rect.width()
-    if y_inverted:
-      y = ur_rect.yMaximum() - norm_point.y() * ur_rect.height()
-    else:
-      y = ur_rect.yMinimum() + norm_point.y() * ur_rect.height()
-    return self.rotatePoint(QgsPointXY(x, y), self._rotation, self._center)
+    x = norm_point.x()
+    y = 1 - norm_point.y() if y_inverted else norm_point.y()
+    a, b, c, d, e, f = self._inverse
+    return QgsPointXY(a * x + b * y + c, d * x + e * y + f)
 
   def subrectangle(self, norm_rect, y_inverted=False):
     """
@@ -212,6 +232,13 @@ class RotatedRect:
   def unrotatedRect(self):
     return self._unrotated_rect
 
+  def matrix(self):
+    """affine matrix (a, b, c, d, e, f) of normalization: x' = a * x + b * y + c, y' = d * x + e * y + f"""
+    return self._matrix
+
+  def inverseMatrix(self):
+    return self._inverse
+
   def geometry(self):
     geom = QgsGeometry.fromRect(self._unrotated_rect)
     if self._rotation:
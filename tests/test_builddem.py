@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+author : Qgis2threejs contributors
+begin  : 2026-10-19
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+from unittest import TestCase
+
+from Qgis2threejs.builddem import splitGrid, textureSize
+from Qgis2threejs.conf import MIN_TEXTURE_SIZE
+
+
+class TestBuildDEM(TestCase):
+
+  def assertTilesCoverGrid(self, tiles, segments_x, segments_y):
+    """tiles cover the grid without gaps and overlaps"""
+    area = 0
+    for x0, y0, x1, y1 in tiles:
+      assert 0 <= x0 < x1 <= segments_x and 0 <= y0 < y1 <= segments_y, (x0, y0, x1, y1)
+      area += (x1 - x0) * (y1 - y0)
+    self.assertEqual(area, segments_x * segments_y)
+
+    xs = sorted(set(t[0] for t in tiles) | set(t[2] for t in tiles))
+    ys = sorted(set(t[1] for t in tiles) | set(t[3] for t in tiles))
+    self.assertEqual(len(tiles), (len(xs) - 1) * (len(ys) - 1))
+
+  def test01_splitGrid_no_limit(self):
+    """grid is not split without limits"""
+    self.assertEqual(splitGrid(100, 60), [(0, 0, 100, 60)])
+    self.assertEqual(splitGrid(100, 60, 101 * 61), [(0, 0, 100, 60)])
+
+  def test02_splitGrid_max_vertices(self):
+    """each tile has max_vertices vertices at most"""
+    for max_vertices in [10, 1000, 5000]:
+      tiles = splitGrid(100, 100, max_vertices)
+      self.assertTilesCoverGrid(tiles, 100, 100)
+      for x0, y0, x1, y1 in tiles:
+        self.assertLessEqual((x1 - x0 + 1) * (y1 - y0 + 1), max_vertices)
+
+  def test03_splitGrid_unit(self):
+    """tile edges are aligned to multiples of unit"""
+    tiles = splitGrid(100, 60, 1000, unit=4)
+    self.assertTilesCoverGrid(tiles, 100, 60)
+    for x0, y0, x1, y1 in tiles:
+      self.assertEqual(x0 % 4, 0)
+      self.assertEqual(y0 % 4, 0)
+      self.assertTrue(x1 % 4 == 0 or x1 == 100)
+      self.assertTrue(y1 % 4 == 0 or y1 == 60)
+
+  def test04_splitGrid_max_tile_size(self):
+    """each tile has max_tile_x x max_tile_y segments at most"""
+    tiles = splitGrid(100, 100, 0, 1, 30, 0)
+    self.assertTilesCoverGrid(tiles, 100, 100)
+    for x0, y0, x1, y1 in tiles:
+      self.assertLessEqual(x1 - x0, 30)
+      self.assertEqual(y1 - y0, 100)
+
+    tiles = splitGrid(100, 100, 0, 1, 30, 40)
+    self.assertTilesCoverGrid(tiles, 100, 100)
+    for x0, y0, x1, y1 in tiles:
+      self.assertLessEqual(x1 - x0, 30)
+      self.assertLessEqual(y1 - y0, 40)
+
+  def test05_splitGrid_minimum_tiles(self):
+    """grid is split into unit tiles at most"""
+    self.assertEqual(splitGrid(2, 2, 1), [(0, 0, 1, 1), (1, 0, 2, 1), (0, 1, 1, 2), (1, 1, 2, 2)])
+
+  def test11_textureSize(self):
+    """texture size is scaled by factor"""
+    size = textureSize(1024, 512)
+    self.assertEqual((size.width(), size.height()), (1024, 512))
+
+    size = textureSize(1024, 512, 0.5)
+    self.assertEqual((size.width(), size.height()), (512, 256))
+
+    size = textureSize(1024, 512, 2)
+    self.assertEqual((size.width(), size.height()), (2048, 1024))
+
+  def test12_textureSize_minimum(self):
+    """smaller side of texture is not scaled down below MIN_TEXTURE_SIZE"""
+    size = textureSize(1024, 512, 0.001)
+    self.assertEqual(size.height(), MIN_TEXTURE_SIZE)
+    self.assertEqual(size.width(), MIN_TEXTURE_SIZE * 2)
+
+    # size which is already smaller than the minimum is kept
+    size = textureSize(MIN_TEXTURE_SIZE // 2, MIN_TEXTURE_SIZE // 4, 0.5)
+    self.assertEqual((size.width(), size.height()), (MIN_TEXTURE_SIZE // 2, MIN_TEXTURE_SIZE // 4))
+
+
+if __name__ == "__main__":
+  import unittest
+  unittest.main()
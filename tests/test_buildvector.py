@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+author : Qgis2threejs contributors
+begin  : 2026-10-19
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+import json
+from unittest import TestCase
+
+import numpy
+
+from Qgis2threejs.buildvector import attributeColumns, json_default, packFeatures
+from Qgis2threejs.geometry import CoordinateList
+
+
+class TestBuildVector(TestCase):
+
+  def features(self):
+    polygons = CoordinateList(numpy.arange(24, dtype=float).reshape(-1, 3),
+                              [numpy.array([0, 3, 5, 8]), numpy.array([0, 1, 3])])
+    triangles = {"v": CoordinateList(numpy.ones((3, 3))),
+                 "f": numpy.array([0, 1, 2], dtype=numpy.uint32)}
+    return [{"geom": {"polygons": polygons, "h": 2.5}, "mtl": 0},
+            {"geom": {"triangles": triangles, "h": 1}, "mtl": 1}]
+
+  def unpack(self, packed, coords, indices):
+    """converts a packed value into lists in the same way as the viewer does"""
+    if "indices" in packed:
+      start, length = packed["indices"]
+      return indices[start:start + length].tolist()
+
+    start, length = packed["coords"]
+    c = coords[start:start + length].tolist()
+    dim = packed["dim"]
+    if not packed["offsets"]:
+      return c
+
+    offsets = [indices[s:s + n].tolist() for s, n in packed["offsets"]]
+    lst = [c[i * dim:j * dim] for i, j in zip(offsets[0][:-1], offsets[0][1:])]
+    for o in offsets[1:]:
+      lst = [lst[i:j] for i, j in zip(o[:-1], o[1:])]
+    return lst
+
+  def flatten(self, lst):
+    """flattens vertex lists in a nested list in JSON (lists of coordinate lists)"""
+    if lst and isinstance(lst[0], list) and lst[0] and not isinstance(lst[0][0], list):
+      return [c for pt in lst for c in pt]
+    return [self.flatten(v) for v in lst]
+
+  def test01_packFeatures(self):
+    """packed coordinates and indices are restored to the same vertex lists as in JSON"""
+    features = self.features()
+    packed, coords, indices = packFeatures(features)
+
+    self.assertEqual(coords.dtype.str, "<f4")
+    self.assertEqual(indices.dtype.str, "<u4")
+    self.assertEqual(len(coords), 24 + 9)
+
+    expected = json.loads(json.dumps(features, default=json_default))
+    self.assertEqual(expected[0]["geom"]["polygons"][1][1], [[15, 16, 17], [18, 19, 20], [21, 22, 23]])
+
+    g = packed[0]["geom"]
+    self.assertEqual(g["h"], 2.5)
+    self.assertEqual(g["polygons"]["packed"]["dim"], 3)
+    self.assertEqual(self.unpack(g["polygons"]["packed"], coords, indices), self.flatten(expected[0]["geom"]["polygons"]))
+
+    g = packed[1]["geom"]["triangles"]
+    self.assertEqual(self.unpack(g["v"]["packed"], coords, indices), self.flatten(expected[1]["geom"]["triangles"]["v"]))
+    self.assertEqual(self.unpack(g["f"]["packed"], coords, indices), [0, 1, 2])
+
+    # input features are not modified
+    self.assertIsInstance(features[0]["geom"]["polygons"], CoordinateList)
+
+  def test02_packFeatures_2d(self):
+    """2D coordinates are packed with dim 2"""
+    coords = numpy.arange(12, dtype=float).reshape(-1, 3)
+    features = [{"geom": {"polygons": CoordinateList(coords[:, :2], [numpy.array([0, 4]), numpy.array([0, 1])])}}]
+    packed, c, i = packFeatures(features)
+
+    p = packed[0]["geom"]["polygons"]["packed"]
+    self.assertEqual(p["dim"], 2)
+    self.assertEqual(self.unpack(p, c, i), [[[0., 1., 3., 4., 6., 7., 9., 10.]]])
+
+  def test03_packFeatures_empty(self):
+    """features without coordinates"""
+    packed, coords, indices = packFeatures([])
+    self.assertEqual((packed, len(coords), len(indices)), ([], 0, 0))
+
+  def test11_attributeColumns(self):
+    """numeric columns have values, and other columns are dictionary-encoded"""
+    rows = [[1, "a", 0.5], [2, "b", None], [None, "a", 1.5], [4, "c", 2.5]]
+    columns = attributeColumns(rows, [True, False, True])
+
+    self.assertEqual(columns[0], {"values": [1, 2, None, 4]})
+    self.assertEqual(columns[1], {"idx": [0, 1, 0, 2], "dict": ["a", "b", "c"]})
+    self.assertEqual(columns[2], {"values": [0.5, None, 1.5, 2.5]})
+
+    # rows are restored from columns
+    for i, row in enumerate(rows):
+      self.assertEqual(columns[1]["dict"][columns[1]["idx"][i]], row[1])
+
+  def test12_attributeColumns_empty(self):
+    """no features"""
+    self.assertEqual(attributeColumns([], [True, False]), [{"values": []}, {"idx": [], "dict": []}])
+
+
+if __name__ == "__main__":
+  import unittest
+  unittest.main()
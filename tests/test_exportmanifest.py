@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+author : Qgis2threejs contributors
+begin  : 2026-10-19
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from Qgis2threejs.exportmanifest import ExportManifest
+
+URL_ROOT = "./data/test/"
+
+
+class TestExportManifest(TestCase):
+
+  def setUp(self):
+    self.dataDir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.dataDir)
+
+  def writeFiles(self, *filenames):
+    for filename in filenames:
+      with open(os.path.join(self.dataDir, filename), "w") as f:
+        f.write(filename)
+
+  def export(self, layers):
+    """layers: dictionary of layer id and file names. returns manifest and prefixes"""
+    manifest = ExportManifest(self.dataDir, URL_ROOT)
+    prefixes = {}
+    for layerId, filenames in layers.items():
+      prefix = prefixes[layerId] = manifest.prefix(layerId)
+      names = [prefix + name for name in filenames]
+      self.writeFiles(*names)
+      data = {"blocks": [{"url": URL_ROOT + name} for name in names]}
+      manifest.addLayer(layerId, prefix, "fp_" + layerId, data)
+    manifest.save()
+    return manifest, prefixes
+
+  def exists(self, filename):
+    return os.path.exists(os.path.join(self.dataDir, filename))
+
+  def test01_prefix(self):
+    """prefix of a layer is kept across exports, and a new layer gets an unused prefix"""
+    _, prefixes = self.export({"layer1": ["0.bin"], "layer2": ["0.bin"]})
+    self.assertNotEqual(prefixes["layer1"], prefixes["layer2"])
+
+    manifest = ExportManifest(self.dataDir, URL_ROOT)
+    self.assertEqual(manifest.prefix("layer2"), prefixes["layer2"])
+    self.assertNotIn(manifest.prefix("layer3"), prefixes.values())
+
+  def test02_layerData(self):
+    """layer data is reused only if fingerprint matches and files are not modified"""
+    _, prefixes = self.export({"layer1": ["0.bin", "1.bin"]})
+    filename = prefixes["layer1"] + "1.bin"
+
+    manifest = ExportManifest(self.dataDir, URL_ROOT)
+    self.assertIsNone(manifest.layerData("layer1", "fp_changed"))
+    self.assertIsNone(manifest.layerData("layer2"))
+    data = manifest.layerData("layer1", "fp_layer1")
+    self.assertEqual(data["blocks"][1]["url"], URL_ROOT + filename)
+
+    # modified file
+    with open(os.path.join(self.dataDir, filename), "w") as f:
+      f.write("modified")
+    manifest = ExportManifest(self.dataDir, URL_ROOT)
+    self.assertIsNone(manifest.layerData("layer1", "fp_layer1"))
+
+    # removed file
+    os.remove(os.path.join(self.dataDir, filename))
+    manifest = ExportManifest(self.dataDir, URL_ROOT)
+    self.assertIsNone(manifest.layerData("layer1", "fp_layer1"))
+
+  def test03_layerData_touched(self):
+    """file whose modification time has been changed but content has not is reused"""
+    _, prefixes = self.export({"layer1": ["0.bin"]})
+    path = os.path.join(self.dataDir, prefixes["layer1"] + "0.bin")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    manifest = ExportManifest(self.dataDir, URL_ROOT)
+    self.assertIsNotNone(manifest.layerData("layer1", "fp_layer1"))
+
+  def test04_remove_orphans(self):
+    """files which are no longer used are removed"""
+    _, prefixes = self.export({"layer1": ["0.bin", "1.bin"], "layer2": ["0.bin"]})
+    p1, p2 = prefixes["layer1"], prefixes["layer2"]
+
+    # layer1 has fewer blocks and layer2 is not exported
+    self.export({"layer1": ["0.bin"]})
+    self.assertTrue(self.exists(p1 + "0.bin"))
+    self.assertFalse(self.exists(p1 + "1.bin"))
+    self.assertFalse(self.exists(p2 + "0.bin"))
+
+  def test05_reused_files_kept(self):
+    """files of a reused layer are kept"""
+    _, prefixes = self.export({"layer1": ["0.bin"], "layer2": ["0.bin"]})
+
+    manifest = ExportManifest(self.dataDir, URL_ROOT)
+    self.assertIsNotNone(manifest.layerData("layer1", "fp_layer1"))
+    manifest.save()
+
+    self.assertTrue(self.exists(prefixes["layer1"] + "0.bin"))
+    self.assertFalse(self.exists(prefixes["layer2"] + "0.bin"))
+
+  def test06_inputs(self):
+    """layer is rebuilt if a local file read while building it has been modified"""
+    icon = os.path.join(self.dataDir, "icon.png")
+    self.writeFiles("icon.png")
+
+    manifest = ExportManifest(self.dataDir, URL_ROOT)
+    manifest.addLayer("layer1", manifest.prefix("layer1"), "fp", {}, [icon])
+    manifest.save()
+    self.assertIsNotNone(ExportManifest(self.dataDir, URL_ROOT).layerData("layer1", "fp"))
+
+    with open(icon, "w") as f:
+      f.write("modified icon")
+    self.assertIsNone(ExportManifest(self.dataDir, URL_ROOT).layerData("layer1", "fp"))
+
+  def test07_blockCache(self):
+    """block parts are reused if their fingerprints match and their files are not modified"""
+    def export(inputs, built):
+      manifest = ExportManifest(self.dataDir, URL_ROOT)
+      prefix = manifest.prefix("layer1")
+      cache = manifest.blockCache("layer1", inputs)
+      data = []
+      for i in range(2):
+        fp = cache.fingerprint("grid", [i])
+        part = cache.get("{0}grid".format(i), fp)
+        if part is None:
+          built.append(i)
+          filename = "{0}{1}.bin".format(prefix, i)
+          self.writeFiles(filename)
+          part = {"url": URL_ROOT + filename}
+          cache.put("{0}grid".format(i), fp, part)
+        data.append(part)
+      manifest.addLayer("layer1", prefix, None, data, blockCache=cache)
+      manifest.save()
+      return prefix
+
+    built = []
+    prefix = export({"grid": "a"}, built)
+    self.assertEqual(built, [0, 1])
+
+    built = []
+    export({"grid": "a"}, built)
+    self.assertEqual(built, [])
+
+    # modified file
+    with open(os.path.join(self.dataDir, prefix + "1.bin"), "w") as f:
+      f.write("modified")
+    export({"grid": "a"}, built)
+    self.assertEqual(built, [1])
+
+    # changed inputs, and inputs which cannot be fingerprinted
+    built = []
+    export({"grid": "b"}, built)
+    self.assertEqual(built, [0, 1])
+
+    built = []
+    export({"grid": None}, built)
+    export({"grid": None}, built)
+    self.assertEqual(built, [0, 1, 0, 1])
+
+
+if __name__ == "__main__":
+  import unittest
+  unittest.main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+author : Qgis2threejs contributors
+begin  : 2026-10-19
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+import struct
+from unittest import TestCase
+
+import numpy
+
+from Qgis2threejs.geometry import GeometryUtils, flattenArrays, replaceArrays, wkbCoordinateArrays
+
+
+def wkbHeader(wkbType, count=None):
+  h = struct.pack("<BI", 1, wkbType)
+  return h if count is None else h + struct.pack("<I", count)
+
+
+def wkbCoords(*coords):
+  return struct.pack("<%dd" % len(coords), *coords)
+
+
+class TestGeometry(TestCase):
+
+  def test01_hilbertIndex(self):
+    """quadrants are visited in Hilbert curve order"""
+    pts = [(0.25, 0.25), (0.25, 0.75), (0.75, 0.75), (0.75, 0.25)]
+    self.assertEqual([GeometryUtils.hilbertIndex(x, y, 1) for x, y in pts], [0, 1, 2, 3])
+
+  def test02_hilbertIndex_continuity(self):
+    """cells of a grid have unique indices, and cells with consecutive indices are adjacent"""
+    order = 4
+    n = 1 << order
+    cells = sorted((GeometryUtils.hilbertIndex((i + 0.5) / n, (j + 0.5) / n, order), i, j)
+                   for i in range(n) for j in range(n))
+
+    self.assertEqual([d for d, i, j in cells], list(range(n * n)))
+    for (d0, i0, j0), (d1, i1, j1) in zip(cells[:-1], cells[1:]):
+      self.assertEqual(abs(i1 - i0) + abs(j1 - j0), 1, (d0, d1))
+
+  def test03_hilbertIndex_clamp(self):
+    """points outside the unit square are clamped to the nearest cell"""
+    self.assertEqual(GeometryUtils.hilbertIndex(1.0, 0, 2), GeometryUtils.hilbertIndex(0.9, 0, 2))
+    self.assertEqual(GeometryUtils.hilbertIndex(-1, 2, 2), GeometryUtils.hilbertIndex(0, 0.9, 2))
+
+  def test11_wkbCoordinateArrays_point(self):
+    """point and multi-point"""
+    arrays = wkbCoordinateArrays(bytearray(wkbHeader(1) + wkbCoords(1, 2)))
+    self.assertEqual([a.tolist() for a in arrays], [[[1, 2]]])
+
+    arrays = wkbCoordinateArrays(bytearray(wkbHeader(1004, 2) + wkbHeader(1001) + wkbCoords(1, 2, 3) +
+                                           wkbHeader(1001) + wkbCoords(4, 5, 6)))
+    self.assertEqual([a.tolist() for a in arrays], [[[1, 2, 3]], [[4, 5, 6]]])
+
+  def test12_wkbCoordinateArrays_line(self):
+    """line string with z and m values"""
+    arrays = wkbCoordinateArrays(bytearray(wkbHeader(3002, 2) + wkbCoords(1, 2, 3, 4, 5, 6, 7, 8)))
+    self.assertEqual([a.tolist() for a in arrays], [[[1, 2, 3, 4], [5, 6, 7, 8]]])
+
+  def test13_wkbCoordinateArrays_nested(self):
+    """rings of polygons in a multi-polygon"""
+    ring = struct.pack("<I", 4) + wkbCoords(0, 0, 1, 0, 1, 1, 0, 0)
+    polygon1 = wkbHeader(3, 2) + ring + ring
+    polygon2 = wkbHeader(3, 1) + ring
+    wkb = bytearray(wkbHeader(6, 2) + polygon1 + polygon2)
+
+    arrays = wkbCoordinateArrays(wkb)
+    self.assertEqual(len(arrays), 3)
+    self.assertEqual(arrays[0].shape, (4, 2))
+
+    polygons = wkbCoordinateArrays(wkb, nested=True)
+    self.assertEqual([len(polygon) for polygon in polygons], [2, 1])
+    self.assertEqual(polygons[1][0].tolist(), [[0, 0], [1, 0], [1, 1], [0, 0]])
+
+  def test14_wkbCoordinateArrays_unsupported(self):
+    """None is returned for unsupported or broken WKB"""
+    self.assertIsNone(wkbCoordinateArrays(bytearray(wkbHeader(8, 3) + wkbCoords(0, 0, 1, 1, 2, 0))))   # CircularString
+    self.assertIsNone(wkbCoordinateArrays(bytearray(struct.pack(">BI", 0, 1) + struct.pack(">2d", 1, 2))))   # big-endian
+    self.assertIsNone(wkbCoordinateArrays(bytearray(wkbHeader(2, 3) + wkbCoords(1, 2))))   # truncated
+
+  def test15_wkbCoordinateArrays_25d(self):
+    """legacy 2.5D types with z and m flags in the high bits"""
+    arrays = wkbCoordinateArrays(bytearray(wkbHeader(0x80000001) + wkbCoords(1, 2, 3)))
+    self.assertEqual([a.tolist() for a in arrays], [[[1, 2, 3]]])
+
+    arrays = wkbCoordinateArrays(bytearray(wkbHeader(0xC0000002, 1) + wkbCoords(1, 2, 3, 4)))
+    self.assertEqual([a.tolist() for a in arrays], [[[1, 2, 3, 4]]])
+
+  def test16_wkbCoordinateArrays_ewkb(self):
+    """SRID of EWKB is skipped"""
+    wkb = struct.pack("<BII", 1, 0xA0000001, 4326) + wkbCoords(1, 2, 3)
+    arrays = wkbCoordinateArrays(bytearray(wkb))
+    self.assertEqual([a.tolist() for a in arrays], [[[1, 2, 3]]])
+
+  def test17_flattenArrays(self):
+    """nested coordinate arrays are flattened, and replaced keeping the structure"""
+    ring = struct.pack("<I", 2) + wkbCoords(0, 0, 1, 1)
+    wkb = bytearray(wkbHeader(6, 2) + wkbHeader(3, 2) + ring + ring + wkbHeader(3, 1) + ring)
+    polygons = wkbCoordinateArrays(wkb, nested=True)
+
+    arrays = flattenArrays(polygons)
+    self.assertEqual(len(arrays), 3)
+    self.assertEqual(replaceArrays(polygons, iter(range(3))), [[0, 1], [2]])
+
+  def test21_ringMoments(self):
+    """signed areas and first moments of rings"""
+    square = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]         # counter-clockwise
+    rect = [(2, 0), (2, 2), (6, 2), (6, 0), (2, 0)]           # clockwise
+    xs, ys = numpy.array(square + rect, dtype=float).T
+    areas, mx, my = GeometryUtils.ringMoments(xs, ys, numpy.array([0, 5, 10]))
+
+    self.assertEqual(areas.tolist(), [1, -8])
+    self.assertEqual((mx / areas).tolist(), [0.5, 4])
+    self.assertEqual((my / areas).tolist(), [0.5, 1])
+
+  def test22_orientRings(self):
+    """outer rings are clockwise and inner rings are counter-clockwise"""
+    outer = [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]]         # counter-clockwise
+    inner = [[1, 1], [1, 2], [2, 2], [2, 1], [1, 1]]         # clockwise
+    outer2 = [[5, 0], [5, 1], [6, 1], [6, 0], [5, 0]]        # clockwise
+    coords = numpy.array(outer + inner + outer2, dtype=float)
+    offsets = numpy.array([0, 5, 10, 15])
+
+    oriented = GeometryUtils.orientRings(coords, offsets, numpy.array([True, False, True]))
+    areas = GeometryUtils.ringMoments(oriented[:, 0], oriented[:, 1], offsets)[0]
+    self.assertEqual(areas.tolist(), [-16, 1, -1])
+    self.assertEqual(oriented[:5].tolist(), outer[::-1])
+    self.assertEqual(oriented[5:10].tolist(), inner[::-1])
+    self.assertEqual(oriented[10:].tolist(), outer2)
+
+    # already oriented
+    self.assertIs(GeometryUtils.orientRings(oriented, offsets, numpy.array([True, False, True])), oriented)
+
+
+if __name__ == "__main__":
+  import unittest
+  unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+author : Qgis2threejs contributors
+begin  : 2026-10-19
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+from unittest import TestCase
+from PyQt5.QtCore import QVariant
+from qgis.core import NULL, QgsExpression, QgsExpressionContext, QgsFeature, QgsField, QgsFields
+
+from Qgis2threejs.propertyreader import ColumnarExpression, PreparedExpression
+
+
+class TestColumnarExpression(TestCase):
+
+  def setUp(self):
+    fields = QgsFields()
+    fields.append(QgsField("a", QVariant.Double))
+    fields.append(QgsField("b", QVariant.Int))
+    fields.append(QgsField("name", QVariant.String))
+    self.fields = fields
+
+    self.feats = []
+    for fid, attrs in enumerate([[1.5, 2, "x"], [None, 3, "y"], [-4.0, None, "z"], [9.0, 0, None]]):
+      f = QgsFeature(fields, fid)
+      f.setAttributes(attrs)
+      self.feats.append(f)
+
+  def evaluateEach(self, expr):
+    """evaluates an expression for each feature with QgsExpression"""
+    context = QgsExpressionContext()
+    context.setFields(self.fields)
+    expr.prepare(context)
+
+    values = []
+    for f in self.feats:
+      context.setFeature(f)
+      v = expr.evaluate(context)
+      values.append(None if v == NULL or v is None else float(v))
+    return values
+
+  def test01_same_results(self):
+    """columnar evaluation returns the same values as QgsExpression"""
+    for expr_str in ["a + b", "a * 2 - b / 4", "-a", "b // 2", "a ^ 2", "a / (b - 2)", "3.5",
+                     "coalesce(a, b, 0)", "abs(a)", "sqrt(b)", "max(a, b)", "min(a, 1)"]:
+      expr = QgsExpression(expr_str)
+      columnar = ColumnarExpression.create(expr, self.fields)
+      self.assertIsNotNone(columnar, expr_str)
+
+      expected = self.evaluateEach(QgsExpression(expr_str))
+      values = columnar.evaluate(self.feats)
+      self.assertEqual(len(values), len(expected), expr_str)
+      for v, e in zip(values, expected):
+        if e is None:
+          self.assertIsNone(v, expr_str)
+        else:
+          self.assertAlmostEqual(v, e, msg=expr_str)
+
+  def test02_unsupported(self):
+    """expressions which cannot be evaluated in columnar way"""
+    for expr_str in ["name", "a > 1", "a + length(name)", "$area", "if(a > 0, a, b)", "a +"]:
+      self.assertIsNone(ColumnarExpression.create(QgsExpression(expr_str), self.fields), expr_str)
+
+  def test03_fieldIndices(self):
+    """only referenced fields are read"""
+    columnar = ColumnarExpression.create(QgsExpression("b * 2 + b"), self.fields)
+    self.assertEqual(columnar.fieldIndices, [1])
+
+  def test04_integer(self):
+    """results are integers if all the inputs are integers"""
+    values = ColumnarExpression.create(QgsExpression("b * 2 - 1"), self.fields).evaluate(self.feats)
+    self.assertEqual(values, [3, 5, None, -1])
+    self.assertTrue(all(isinstance(v, int) for v in values if v is not None))
+
+    for expr_str in ["b / 2", "a + b", "b + 0.5", "sqrt(b)"]:
+      self.assertFalse(ColumnarExpression.create(QgsExpression(expr_str), self.fields).isInteger, expr_str)
+
+  def test05_duplicate_ids(self):
+    """values evaluated for a chunk are looked up by position, so features with the same id get their own values"""
+    for f in self.feats:
+      f.setId(1)
+
+    context = QgsExpressionContext()
+    context.setFields(self.fields)
+    expr = PreparedExpression("b * 2", context, self.fields)
+    expr.prepareChunk(self.feats)
+    self.assertEqual([expr.evaluate(context, f) for f in self.feats], [4, 6, None, 0])
+
+
+if __name__ == "__main__":
+  import unittest
+  unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+author : Qgis2threejs contributors
+begin  : 2026-10-19
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+from unittest import TestCase
+from PyQt5.QtCore import QSize
+from qgis.core import QgsMapSettings, QgsPointXY, QgsRectangle
+
+from Qgis2threejs.qgis2threejscore import MapTo3D
+from Qgis2threejs.rotatedrect import RotatedRect
+
+
+class TestRotatedRect(TestCase):
+
+  def setUp(self):
+    self.center = QgsPointXY(100, 200)
+    self.rect = RotatedRect(self.center, 40, 20, 30)
+
+  def corner(self, dx, dy):
+    """corner of the rect. dx and dy are -1 or 1"""
+    pt = QgsPointXY(self.center.x() + dx * 20, self.center.y() + dy * 10)
+    return RotatedRect.rotatePoint(pt, 30, self.center)
+
+  def assertPointEqual(self, pt, x, y):
+    self.assertAlmostEqual(pt.x(), x)
+    self.assertAlmostEqual(pt.y(), y)
+
+  def test01_normalizePoint(self):
+    """corners of rotated rect are normalized to corners of unit square"""
+    for dx, dy, nx, ny in [(-1, -1, 0, 0), (1, -1, 1, 0), (1, 1, 1, 1), (-1, 1, 0, 1)]:
+      pt = self.corner(dx, dy)
+      self.assertPointEqual(self.rect.normalizePoint(pt.x(), pt.y()), nx, ny)
+
+    self.assertPointEqual(self.rect.normalizePoint(100, 200), 0.5, 0.5)
+
+  def test02_point(self):
+    """point() is inverse of normalizePoint()"""
+    for nx, ny in [(0, 0), (0.25, 0.75), (1, 0.5)]:
+      pt = self.rect.point(QgsPointXY(nx, ny))
+      self.assertPointEqual(self.rect.normalizePoint(pt.x(), pt.y()), nx, ny)
+
+    pt = self.corner(-1, 1)
+    self.assertPointEqual(self.rect.point(QgsPointXY(0, 0), y_inverted=True), pt.x(), pt.y())
+
+  def test03_transformArray(self):
+    """array transformation gives the same results as point transformation, and is inverted by inverseArray"""
+    xs, ys = [80, 100, 123.4], [190, 200, 215.6]
+    nxs, nys = self.rect.transformArray(xs, ys)
+    for x, y, nx, ny in zip(xs, ys, nxs.tolist(), nys.tolist()):
+      self.assertPointEqual(self.rect.normalizePoint(x, y), nx, ny)
+
+    mxs, mys = self.rect.inverseArray(nxs, nys)
+    for x, y, mx, my in zip(xs, ys, mxs.tolist(), mys.tolist()):
+      self.assertAlmostEqual(mx, x)
+      self.assertAlmostEqual(my, y)
+
+  def test04_update(self):
+    """matrices are updated when the rect is rotated or scaled"""
+    rect = RotatedRect(self.center, 40, 20).rotate(30).scale(0.5)
+    pt = self.corner(1, 1)
+    pt = QgsPointXY((pt.x() + 100) / 2, (pt.y() + 200) / 2)   # scaled toward center
+    self.assertPointEqual(rect.normalizePoint(pt.x(), pt.y()), 1, 1)
+
+
+class TestMapTo3D(TestCase):
+
+  def setUp(self):
+    mapSettings = QgsMapSettings()
+    mapSettings.setOutputSize(QSize(400, 200))
+    mapSettings.setExtent(QgsRectangle(0, 0, 2000, 1000))
+    self.mapTo3d = MapTo3D(mapSettings, planeWidth=100, verticalExaggeration=2, verticalShift=-10)
+
+  def test01_transform(self):
+    """extent is mapped to a plane centered at the origin"""
+    m = self.mapTo3d
+    self.assertAlmostEqual(m.planeHeight, 50)
+
+    pt = m.transform(1000, 500, 10)
+    self.assertAlmostEqual(pt.x, 0)
+    self.assertAlmostEqual(pt.y, 0)
+    self.assertAlmostEqual(pt.z, 0)
+
+    pt = m.transform(2000, 0, 20)
+    self.assertAlmostEqual(pt.x, 50)
+    self.assertAlmostEqual(pt.y, -25)
+    self.assertAlmostEqual(pt.z, 10 * m.multiplierZ)
+
+  def test02_transformArray(self):
+    """array transformation gives the same results as point transformation, and is inverted by inverseArray"""
+    xs, ys, zs = [0, 1000, 1234.5], [0, 500, 987.6], [0, 10, -5]
+    v = self.mapTo3d.transformArray(xs, ys, zs)
+    self.assertEqual(v.shape, (3, 3))
+
+    for (x, y, z), p in zip(zip(xs, ys, zs), v.tolist()):
+      pt = self.mapTo3d.transform(x, y, z)
+      self.assertAlmostEqual(p[0], pt.x)
+      self.assertAlmostEqual(p[1], pt.y)
+      self.assertAlmostEqual(p[2], pt.z)
+
+    u = self.mapTo3d.inverseArray(v[:, 0], v[:, 1], v[:, 2])
+    for (x, y, z), p in zip(zip(xs, ys, zs), u.tolist()):
+      self.assertAlmostEqual(p[0], x)
+      self.assertAlmostEqual(p[1], y)
+      self.assertAlmostEqual(p[2], z)
+
+
+if __name__ == "__main__":
+  import unittest
+  unittest.main()
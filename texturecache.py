@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ TextureCache
+                              -------------------
+        begin                : 2026-10-19
+        copyright            : (C) 2026 Qgis2threejs contributors
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+import glob
+import hashlib
+import os
+
+from PyQt5.QtGui import QColor, QImage
+from qgis.core import QgsMapLayer, QgsMapLayerStyle
+
+from .conf import DEBUG_MODE, TEXTURE_CACHE_SIZE
+from .qgis2threejstools import cacheDir, logMessage
+
+
+def layerFingerprint(layer):
+  """returns a string which changes when data or style of the layer is changed.
+     returns None if the data source is not a local file (e.g. database, WMS/XYZ/WCS and other
+     web services, memory layer), whose modification cannot be detected, or if the layer has
+     unsaved edits or is a plugin layer, e.g. tile layer, whose data might be changed or incompletely rendered"""
+  layerType = layer.type()
+  if layerType == QgsMapLayer.PluginLayer or (layerType == QgsMapLayer.VectorLayer and layer.isModified()):
+    return None
+
+  path = layer.source().split("|")[0]
+  if not os.path.isfile(path):
+    return None
+
+  style = QgsMapLayerStyle()
+  style.readFromLayer(layer)
+
+  items = [layer.id(), layer.source(), style.xmlData()]
+
+  # modification state of data source file and its sidecar files (e.g. .dbf, .shx and .prj of shapefile,
+  # -wal of GeoPackage and .aux.xml of raster)
+  for p in sorted(set([path] + glob.glob(glob.escape(os.path.splitext(path)[0]) + ".*"))):
+    try:
+      stat = os.stat(p)
+    except OSError:
+      continue
+    items += [os.path.basename(p), str(stat.st_mtime), str(stat.st_size)]
+
+  return "\n".join(items)
+
+
+def mapSettingsFingerprint(mapSettings):
+  """returns a string which changes when map settings for rendering, other than layers, are changed"""
+  size = mapSettings.outputSize()
+  return "\n".join([mapSettings.extent().toString(12),
+                    str(mapSettings.rotation()),
+                    "{0}x{1}".format(size.width(), size.height()),
+                    str(mapSettings.outputDpi()),
+                    mapSettings.backgroundColor().name(QColor.HexArgb),
+                    mapSettings.destinationCrs().toWkt(),
+                    str(int(mapSettings.flags()))])
+
+
+class TextureCache:
+  """disk cache of rendered texture images.
+     a cache file is identified by a fingerprint of map settings for rendering, which consists of
+     layer ids, layer styles, modification state of data sources, extent, rotation, image size,
+     background color and so on. least recently used files are removed when total size of cache
+     files exceeds the limit."""
+
+  def __init__(self, directory=None, maxBytes=TEXTURE_CACHE_SIZE):
+    self.directory = directory or cacheDir("textures")
+    self.maxBytes = maxBytes
+    self._layerFingerprints = {}
+
+  def clearFingerprints(self):
+    """forget layer fingerprints, which are calculated once per layer until this method is called"""
+    self._layerFingerprints = {}
+
+  def layerFingerprint(self, layer):
+    """returns None if images of the layer cannot be cached. see layerFingerprint() function"""
+    fp = self._layerFingerprints.get(layer.id(), "")
+    if fp == "":
+      fp = self._layerFingerprints[layer.id()] = layerFingerprint(layer)
+    return fp
+
+  def key(self, mapSettings):
+    """returns a cache key for an image rendered with given map settings, or None if it cannot be cached"""
+    items = []
+    for layer in mapSettings.layers():
+      fp = self.layerFingerprint(layer)
+      if fp is None:
+        return None
+      items.append(fp)
+
+    items.append(mapSettingsFingerprint(mapSettings))
+    return hashlib.sha1("\n".join(items).encode("utf-8")).hexdigest()
+
+  def filePath(self, key):
+    return os.path.join(self.directory, key + ".png")
+
+  def get(self, key):
+    """returns a cached QImage or None"""
+    path = self.filePath(key)
+    if not os.path.isfile(path):
+      return None
+
+    image = QImage(path)
+    if image.isNull():
+      return None
+
+    try:
+      os.utime(path)    # update access order
+    except OSError:
+      pass
+
+    if DEBUG_MODE:
+      logMessage("Texture cache hit: {0}".format(key))
+    return image
+
+  def put(self, key, image):
+    try:
+      os.makedirs(self.directory, exist_ok=True)
+      image.save(self.filePath(key), "PNG")
+    except OSError as e:
+      logMessage("Failed to write a texture cache file: " + str(e))
+
+  def clear(self):
+    """remove all cache files"""
+    try:
+      entries = [e for e in os.scandir(self.directory) if e.is_file() and e.name.endswith(".png")]
+    except OSError:
+      return
+
+    for e in entries:
+      try:
+        os.remove(e.path)
+      except OSError:
+        pass
+
+  def evict(self):
+    """remove least recently used cache files while total size exceeds the limit"""
+    try:
+      entries = [e for e in os.scandir(self.directory) if e.is_file() and e.name.endswith(".png")]
+    except OSError:
+      return
+
+    stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+    total = sum(s[1] for s in stats)
+    for mtime, size, path in sorted(stats):
+      if total <= self.maxBytes:
+        break
+      try:
+        os.remove(path)
+        total -= size
+      except OSError:
+        pass
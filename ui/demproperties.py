@@ -41,6 +41,15 @@ class Ui_DEMPropertiesWidget(object):
         self.label_ResamplingLevel.setObjectName("label_ResamplingLevel")
         self.horizontalLayout_Resampling.addWidget(self.label_ResamplingLevel)
         self.verticalLayout_6.addLayout(self.horizontalLayout_Resampling)
+        self.horizontalLayout_MaxBlockVertices = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_MaxBlockVertices.setObjectName("horizontalLayout_MaxBlockVertices")
+        self.label_MaxBlockVertices = QtWidgets.QLabel(self.groupBox_Geometry)
+        self.label_MaxBlockVertices.setObjectName("label_MaxBlockVertices")
+        self.horizontalLayout_MaxBlockVertices.addWidget(self.label_MaxBlockVertices)
+        self.comboBox_MaxBlockVertices = QtWidgets.QComboBox(self.groupBox_Geometry)
+        self.comboBox_MaxBlockVertices.setObjectName("comboBox_MaxBlockVertices")
+        self.horizontalLayout_MaxBlockVertices.addWidget(self.comboBox_MaxBlockVertices)
+        self.verticalLayout_6.addLayout(self.horizontalLayout_MaxBlockVertices)
         self.verticalLayout_Surroundings = QtWidgets.QVBoxLayout()
         self.verticalLayout_Surroundings.setObjectName("verticalLayout_Surroundings")
         self.checkBox_Surroundings = QtWidgets.QCheckBox(self.groupBox_Geometry)
@@ -70,6 +79,13 @@ class Ui_DEMPropertiesWidget(object):
         self.label_2.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
         self.label_2.setObjectName("label_2")
         self.gridLayout_Surroundings.addWidget(self.label_2, 0, 0, 1, 1)
+        self.label_TextureFalloff = QtWidgets.QLabel(self.groupBox_Geometry)
+        self.label_TextureFalloff.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
+        self.label_TextureFalloff.setObjectName("label_TextureFalloff")
+        self.gridLayout_Surroundings.addWidget(self.label_TextureFalloff, 1, 0, 1, 1)
+        self.comboBox_TextureFalloff = QtWidgets.QComboBox(self.groupBox_Geometry)
+        self.comboBox_TextureFalloff.setObjectName("comboBox_TextureFalloff")
+        self.gridLayout_Surroundings.addWidget(self.comboBox_TextureFalloff, 1, 1, 1, 3)
         self.verticalLayout_Surroundings.addLayout(self.gridLayout_Surroundings)
         self.verticalLayout_6.addLayout(self.verticalLayout_Surroundings)
         self.verticalLayout_Clip = QtWidgets.QVBoxLayout()
@@ -181,6 +197,23 @@ class Ui_DEMPropertiesWidget(object):
         self.comboBox_TextureSize = QtWidgets.QComboBox(self.groupBox_Material)
         self.comboBox_TextureSize.setObjectName("comboBox_TextureSize")
         self.gridLayout.addWidget(self.comboBox_TextureSize, 0, 1, 1, 3)
+        self.label_MaxTextureSize = QtWidgets.QLabel(self.groupBox_Material)
+        self.label_MaxTextureSize.setObjectName("label_MaxTextureSize")
+        self.gridLayout.addWidget(self.label_MaxTextureSize, 3, 0, 1, 1)
+        self.comboBox_MaxTextureSize = QtWidgets.QComboBox(self.groupBox_Material)
+        self.comboBox_MaxTextureSize.setObjectName("comboBox_MaxTextureSize")
+        self.gridLayout.addWidget(self.comboBox_MaxTextureSize, 3, 1, 1, 3)
+        self.label_ImageFormat = QtWidgets.QLabel(self.groupBox_Material)
+        self.label_ImageFormat.setObjectName("label_ImageFormat")
+        self.gridLayout.addWidget(self.label_ImageFormat, 1, 0, 1, 1)
+        self.comboBox_ImageFormat = QtWidgets.QComboBox(self.groupBox_Material)
+        self.comboBox_ImageFormat.setObjectName("comboBox_ImageFormat")
+        self.gridLayout.addWidget(self.comboBox_ImageFormat, 1, 1, 1, 2)
+        self.spinBox_ImageQuality = QtWidgets.QSpinBox(self.groupBox_Material)
+        self.spinBox_ImageQuality.setMaximum(100)
+        self.spinBox_ImageQuality.setProperty("value", 85)
+        self.spinBox_ImageQuality.setObjectName("spinBox_ImageQuality")
+        self.gridLayout.addWidget(self.spinBox_ImageQuality, 1, 3, 1, 1)
         self.verticalLayout_4.addLayout(self.gridLayout)
         self.checkBox_TransparentBackground = QtWidgets.QCheckBox(self.groupBox_Material)
         self.checkBox_TransparentBackground.setObjectName("checkBox_TransparentBackground")
@@ -189,6 +222,9 @@ class Ui_DEMPropertiesWidget(object):
         self.checkBox_Shading.setChecked(True)
         self.checkBox_Shading.setObjectName("checkBox_Shading")
         self.verticalLayout_4.addWidget(self.checkBox_Shading)
+        self.checkBox_PrecomputeNormals = QtWidgets.QCheckBox(self.groupBox_Material)
+        self.checkBox_PrecomputeNormals.setObjectName("checkBox_PrecomputeNormals")
+        self.verticalLayout_4.addWidget(self.checkBox_PrecomputeNormals)
         self.verticalLayout_2.addWidget(self.groupBox_Material)
         self.groupBox_Others = QtWidgets.QGroupBox(DEMPropertiesWidget)
         self.groupBox_Others.setObjectName("groupBox_Others")
@@ -211,6 +247,7 @@ class Ui_DEMPropertiesWidget(object):
         self.verticalLayout_2.addItem(spacerItem)
 
         self.retranslateUi(DEMPropertiesWidget)
+        self.checkBox_Shading.toggled['bool'].connect(self.checkBox_PrecomputeNormals.setEnabled)
         self.checkBox_Clip.toggled['bool'].connect(self.comboBox_ClipLayer.setVisible)
         self.radioButton_LayerImage.toggled['bool'].connect(self.label_LayerImage.setEnabled)
         self.radioButton_LayerImage.toggled['bool'].connect(self.toolButton_SelectLayer.setEnabled)
@@ -222,10 +259,12 @@ class Ui_DEMPropertiesWidget(object):
         self.spinBox_Opacity.valueChanged['int'].connect(self.horizontalSlider_Opacity.setValue)
         self.radioButton_SolidColor.toggled['bool'].connect(self.colorButton_Color.setEnabled)
         QtCore.QMetaObject.connectSlotsByName(DEMPropertiesWidget)
-        DEMPropertiesWidget.setTabOrder(self.horizontalSlider_DEMSize, self.checkBox_Surroundings)
+        DEMPropertiesWidget.setTabOrder(self.horizontalSlider_DEMSize, self.comboBox_MaxBlockVertices)
+        DEMPropertiesWidget.setTabOrder(self.comboBox_MaxBlockVertices, self.checkBox_Surroundings)
         DEMPropertiesWidget.setTabOrder(self.checkBox_Surroundings, self.spinBox_Size)
         DEMPropertiesWidget.setTabOrder(self.spinBox_Size, self.spinBox_Roughening)
-        DEMPropertiesWidget.setTabOrder(self.spinBox_Roughening, self.checkBox_Clip)
+        DEMPropertiesWidget.setTabOrder(self.spinBox_Roughening, self.comboBox_TextureFalloff)
+        DEMPropertiesWidget.setTabOrder(self.comboBox_TextureFalloff, self.checkBox_Clip)
         DEMPropertiesWidget.setTabOrder(self.checkBox_Clip, self.comboBox_ClipLayer)
         DEMPropertiesWidget.setTabOrder(self.comboBox_ClipLayer, self.radioButton_MapCanvas)
         DEMPropertiesWidget.setTabOrder(self.radioButton_MapCanvas, self.radioButton_LayerImage)
@@ -235,11 +274,15 @@ class Ui_DEMPropertiesWidget(object):
         DEMPropertiesWidget.setTabOrder(self.lineEdit_ImageFile, self.toolButton_ImageFile)
         DEMPropertiesWidget.setTabOrder(self.toolButton_ImageFile, self.radioButton_SolidColor)
         DEMPropertiesWidget.setTabOrder(self.radioButton_SolidColor, self.comboBox_TextureSize)
-        DEMPropertiesWidget.setTabOrder(self.comboBox_TextureSize, self.horizontalSlider_Opacity)
+        DEMPropertiesWidget.setTabOrder(self.comboBox_TextureSize, self.comboBox_ImageFormat)
+        DEMPropertiesWidget.setTabOrder(self.comboBox_ImageFormat, self.spinBox_ImageQuality)
+        DEMPropertiesWidget.setTabOrder(self.spinBox_ImageQuality, self.horizontalSlider_Opacity)
         DEMPropertiesWidget.setTabOrder(self.horizontalSlider_Opacity, self.spinBox_Opacity)
-        DEMPropertiesWidget.setTabOrder(self.spinBox_Opacity, self.checkBox_TransparentBackground)
+        DEMPropertiesWidget.setTabOrder(self.spinBox_Opacity, self.comboBox_MaxTextureSize)
+        DEMPropertiesWidget.setTabOrder(self.comboBox_MaxTextureSize, self.checkBox_TransparentBackground)
         DEMPropertiesWidget.setTabOrder(self.checkBox_TransparentBackground, self.checkBox_Shading)
-        DEMPropertiesWidget.setTabOrder(self.checkBox_Shading, self.checkBox_Sides)
+        DEMPropertiesWidget.setTabOrder(self.checkBox_Shading, self.checkBox_PrecomputeNormals)
+        DEMPropertiesWidget.setTabOrder(self.checkBox_PrecomputeNormals, self.checkBox_Sides)
         DEMPropertiesWidget.setTabOrder(self.checkBox_Sides, self.checkBox_Frame)
         DEMPropertiesWidget.setTabOrder(self.checkBox_Frame, self.checkBox_Visible)
 
@@ -249,8 +292,11 @@ class Ui_DEMPropertiesWidget(object):
         self.groupBox_Geometry.setTitle(_translate("DEMPropertiesWidget", "&Geometry"))
         self.label_Resampling.setText(_translate("DEMPropertiesWidget", "Resampling level"))
         self.label_ResamplingLevel.setText(_translate("DEMPropertiesWidget", "2"))
+        self.label_MaxBlockVertices.setText(_translate("DEMPropertiesWidget", "Max vertices per block"))
         self.checkBox_Surroundings.setText(_translate("DEMPropertiesWidget", "Surroundings"))
         self.label_3.setText(_translate("DEMPropertiesWidget", "Roughening"))
+        self.label_TextureFalloff.setText(_translate("DEMPropertiesWidget", "Texture"))
+        self.comboBox_TextureFalloff.setToolTip(_translate("DEMPropertiesWidget", "Texture resolution of surrounding blocks"))
         self.label_2.setText(_translate("DEMPropertiesWidget", "Size"))
         self.checkBox_Clip.setText(_translate("DEMPropertiesWidget", "Clip DEM with polygon layer"))
         self.groupBox_Material.setTitle(_translate("DEMPropertiesWidget", "&Material"))
@@ -263,8 +309,14 @@ class Ui_DEMPropertiesWidget(object):
         self.radioButton_SolidColor.setText(_translate("DEMPropertiesWidget", "Solid color"))
         self.label_17.setText(_translate("DEMPropertiesWidget", "Opacity (%)"))
         self.label_TextureSize.setText(_translate("DEMPropertiesWidget", "Resolution"))
+        self.label_MaxTextureSize.setText(_translate("DEMPropertiesWidget", "Max texture size"))
+        self.comboBox_MaxTextureSize.setToolTip(_translate("DEMPropertiesWidget", "Blocks are split into sub-blocks so that width and height of each texture do not exceed this size"))
+        self.label_ImageFormat.setText(_translate("DEMPropertiesWidget", "Image format"))
+        self.spinBox_ImageQuality.setToolTip(_translate("DEMPropertiesWidget", "JPEG/WebP quality (not used for PNG)"))
         self.checkBox_TransparentBackground.setText(_translate("DEMPropertiesWidget", "Transparent background"))
         self.checkBox_Shading.setText(_translate("DEMPropertiesWidget", "Enable shading"))
+        self.checkBox_PrecomputeNormals.setToolTip(_translate("DEMPropertiesWidget", "Calculate vertex normals in advance and export them with grid data"))
+        self.checkBox_PrecomputeNormals.setText(_translate("DEMPropertiesWidget", "Precompute normals"))
         self.groupBox_Others.setTitle(_translate("DEMPropertiesWidget", "&Other Options"))
         self.checkBox_Sides.setText(_translate("DEMPropertiesWidget", "Build sides"))
         self.checkBox_Frame.setText(_translate("DEMPropertiesWidget", "Build frame"))
@@ -30,6 +30,15 @@ class Ui_SettingsDialog(object):
         self.pushButton_Browse.setObjectName("pushButton_Browse")
         self.horizontalLayout.addWidget(self.pushButton_Browse)
         self.verticalLayout_2.addLayout(self.horizontalLayout)
+        self.horizontalLayout_TextureCache = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_TextureCache.setObjectName("horizontalLayout_TextureCache")
+        self.checkBox_TextureCache = QtWidgets.QCheckBox(self.groupBox)
+        self.checkBox_TextureCache.setObjectName("checkBox_TextureCache")
+        self.horizontalLayout_TextureCache.addWidget(self.checkBox_TextureCache)
+        self.pushButton_ClearCache = QtWidgets.QPushButton(self.groupBox)
+        self.pushButton_ClearCache.setObjectName("pushButton_ClearCache")
+        self.horizontalLayout_TextureCache.addWidget(self.pushButton_ClearCache)
+        self.verticalLayout_2.addLayout(self.horizontalLayout_TextureCache)
         self.verticalLayout_3.addWidget(self.groupBox)
         self.groupBox_2 = QtWidgets.QGroupBox(SettingsDialog)
         self.groupBox_2.setObjectName("groupBox_2")
@@ -68,7 +77,9 @@ class Ui_SettingsDialog(object):
         self.buttonBox.rejected.connect(SettingsDialog.reject)
         QtCore.QMetaObject.connectSlotsByName(SettingsDialog)
         SettingsDialog.setTabOrder(self.lineEdit_BrowserPath, self.pushButton_Browse)
-        SettingsDialog.setTabOrder(self.pushButton_Browse, self.tableWidget_Plugins)
+        SettingsDialog.setTabOrder(self.pushButton_Browse, self.checkBox_TextureCache)
+        SettingsDialog.setTabOrder(self.checkBox_TextureCache, self.pushButton_ClearCache)
+        SettingsDialog.setTabOrder(self.pushButton_ClearCache, self.tableWidget_Plugins)
         SettingsDialog.setTabOrder(self.tableWidget_Plugins, self.textBrowser_Plugin)
         SettingsDialog.setTabOrder(self.textBrowser_Plugin, self.buttonBox)
 
@@ -78,6 +89,9 @@ class Ui_SettingsDialog(object):
         self.groupBox.setTitle(_translate("SettingsDialog", "General"))
         self.label.setText(_translate("SettingsDialog", "Web browser path"))
         self.pushButton_Browse.setText(_translate("SettingsDialog", "Browse..."))
+        self.checkBox_TextureCache.setToolTip(_translate("SettingsDialog", "Keep rendered texture images of local file layers on disk and reuse them in later exports"))
+        self.checkBox_TextureCache.setText(_translate("SettingsDialog", "Cache rendered textures on disk"))
+        self.pushButton_ClearCache.setText(_translate("SettingsDialog", "Clear cache"))
         self.groupBox_2.setTitle(_translate("SettingsDialog", "Optional Features"))
         self.label_2.setText(_translate("SettingsDialog", "Description"))
         self.label_3.setText(_translate("SettingsDialog", "The changes will be reflected after restarting the exporter.\n"
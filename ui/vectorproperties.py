@@ -109,6 +109,10 @@ class Ui_VectorPropertiesWidget(object):
         self.checkBox_ExportAttrs.setChecked(False)
         self.checkBox_ExportAttrs.setObjectName("checkBox_ExportAttrs")
         self.verticalLayout_4.addWidget(self.checkBox_ExportAttrs)
+        self.checkBox_AttrsOnQuery = QtWidgets.QCheckBox(self.groupBox_Attrs)
+        self.checkBox_AttrsOnQuery.setEnabled(False)
+        self.checkBox_AttrsOnQuery.setObjectName("checkBox_AttrsOnQuery")
+        self.verticalLayout_4.addWidget(self.checkBox_AttrsOnQuery)
         self.formLayout_Label = QtWidgets.QFormLayout()
         self.formLayout_Label.setObjectName("formLayout_Label")
         self.label = QtWidgets.QLabel(self.groupBox_Attrs)
@@ -139,6 +143,49 @@ class Ui_VectorPropertiesWidget(object):
         self.checkBox_Visible.setChecked(True)
         self.checkBox_Visible.setObjectName("checkBox_Visible")
         self.verticalLayout.addWidget(self.checkBox_Visible)
+        self.checkBox_BinaryBlocks = QtWidgets.QCheckBox(self.groupBox_Others)
+        self.checkBox_BinaryBlocks.setObjectName("checkBox_BinaryBlocks")
+        self.verticalLayout.addWidget(self.checkBox_BinaryBlocks)
+        self.checkBox_SpatialOrder = QtWidgets.QCheckBox(self.groupBox_Others)
+        self.checkBox_SpatialOrder.setObjectName("checkBox_SpatialOrder")
+        self.verticalLayout.addWidget(self.checkBox_SpatialOrder)
+        self.formLayout_Blocks = QtWidgets.QFormLayout()
+        self.formLayout_Blocks.setObjectName("formLayout_Blocks")
+        self.label_BlockVertices = QtWidgets.QLabel(self.groupBox_Others)
+        self.label_BlockVertices.setMinimumSize(QtCore.QSize(60, 0))
+        self.label_BlockVertices.setObjectName("label_BlockVertices")
+        self.formLayout_Blocks.setWidget(0, QtWidgets.QFormLayout.LabelRole, self.label_BlockVertices)
+        self.comboBox_BlockVertices = QtWidgets.QComboBox(self.groupBox_Others)
+        self.comboBox_BlockVertices.setObjectName("comboBox_BlockVertices")
+        self.formLayout_Blocks.setWidget(0, QtWidgets.QFormLayout.FieldRole, self.comboBox_BlockVertices)
+        self.label_BlockSize = QtWidgets.QLabel(self.groupBox_Others)
+        self.label_BlockSize.setObjectName("label_BlockSize")
+        self.formLayout_Blocks.setWidget(1, QtWidgets.QFormLayout.LabelRole, self.label_BlockSize)
+        self.comboBox_BlockSize = QtWidgets.QComboBox(self.groupBox_Others)
+        self.comboBox_BlockSize.setObjectName("comboBox_BlockSize")
+        self.formLayout_Blocks.setWidget(1, QtWidgets.QFormLayout.FieldRole, self.comboBox_BlockSize)
+        self.label_GeometryThreads = QtWidgets.QLabel(self.groupBox_Others)
+        self.label_GeometryThreads.setObjectName("label_GeometryThreads")
+        self.formLayout_Blocks.setWidget(2, QtWidgets.QFormLayout.LabelRole, self.label_GeometryThreads)
+        self.spinBox_GeometryThreads = QtWidgets.QSpinBox(self.groupBox_Others)
+        self.spinBox_GeometryThreads.setMaximum(64)
+        self.spinBox_GeometryThreads.setObjectName("spinBox_GeometryThreads")
+        self.formLayout_Blocks.setWidget(2, QtWidgets.QFormLayout.FieldRole, self.spinBox_GeometryThreads)
+        self.label_ImageFormat = QtWidgets.QLabel(self.groupBox_Others)
+        self.label_ImageFormat.setObjectName("label_ImageFormat")
+        self.formLayout_Blocks.setWidget(3, QtWidgets.QFormLayout.LabelRole, self.label_ImageFormat)
+        self.horizontalLayout_ImageFormat = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_ImageFormat.setObjectName("horizontalLayout_ImageFormat")
+        self.comboBox_ImageFormat = QtWidgets.QComboBox(self.groupBox_Others)
+        self.comboBox_ImageFormat.setObjectName("comboBox_ImageFormat")
+        self.horizontalLayout_ImageFormat.addWidget(self.comboBox_ImageFormat)
+        self.spinBox_ImageQuality = QtWidgets.QSpinBox(self.groupBox_Others)
+        self.spinBox_ImageQuality.setMaximum(100)
+        self.spinBox_ImageQuality.setProperty("value", 85)
+        self.spinBox_ImageQuality.setObjectName("spinBox_ImageQuality")
+        self.horizontalLayout_ImageFormat.addWidget(self.spinBox_ImageQuality)
+        self.formLayout_Blocks.setLayout(3, QtWidgets.QFormLayout.FieldRole, self.horizontalLayout_ImageFormat)
+        self.verticalLayout.addLayout(self.formLayout_Blocks)
         self.verticalLayout_2.addWidget(self.groupBox_Others)
         spacerItem = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
         self.verticalLayout_2.addItem(spacerItem)
@@ -154,8 +201,16 @@ class Ui_VectorPropertiesWidget(object):
         VectorPropertiesWidget.setTabOrder(self.radioButton_AllFeatures, self.radioButton_IntersectingFeatures)
         VectorPropertiesWidget.setTabOrder(self.radioButton_IntersectingFeatures, self.checkBox_Clip)
         VectorPropertiesWidget.setTabOrder(self.checkBox_Clip, self.checkBox_ExportAttrs)
-        VectorPropertiesWidget.setTabOrder(self.checkBox_ExportAttrs, self.comboBox_Label)
+        VectorPropertiesWidget.setTabOrder(self.checkBox_ExportAttrs, self.checkBox_AttrsOnQuery)
+        VectorPropertiesWidget.setTabOrder(self.checkBox_AttrsOnQuery, self.comboBox_Label)
         VectorPropertiesWidget.setTabOrder(self.comboBox_Label, self.checkBox_Visible)
+        VectorPropertiesWidget.setTabOrder(self.checkBox_Visible, self.checkBox_BinaryBlocks)
+        VectorPropertiesWidget.setTabOrder(self.checkBox_BinaryBlocks, self.checkBox_SpatialOrder)
+        VectorPropertiesWidget.setTabOrder(self.checkBox_SpatialOrder, self.comboBox_BlockVertices)
+        VectorPropertiesWidget.setTabOrder(self.comboBox_BlockVertices, self.comboBox_BlockSize)
+        VectorPropertiesWidget.setTabOrder(self.comboBox_BlockSize, self.spinBox_GeometryThreads)
+        VectorPropertiesWidget.setTabOrder(self.spinBox_GeometryThreads, self.comboBox_ImageFormat)
+        VectorPropertiesWidget.setTabOrder(self.comboBox_ImageFormat, self.spinBox_ImageQuality)
 
     def retranslateUi(self, VectorPropertiesWidget):
         _translate = QtCore.QCoreApplication.translate
@@ -174,8 +229,23 @@ class Ui_VectorPropertiesWidget(object):
         self.checkBox_Clip.setText(_translate("VectorPropertiesWidget", "Clip geometries"))
         self.groupBox_Attrs.setTitle(_translate("VectorPropertiesWidget", "&Attribute and label"))
         self.checkBox_ExportAttrs.setText(_translate("VectorPropertiesWidget", "Export attributes"))
+        self.checkBox_AttrsOnQuery.setToolTip(_translate("VectorPropertiesWidget", "Attributes are written to separate files, which are loaded when a feature is queried. Not available with labels"))
+        self.checkBox_AttrsOnQuery.setText(_translate("VectorPropertiesWidget", "Load attributes on query"))
         self.label.setText(_translate("VectorPropertiesWidget", "Label field"))
         self.groupBox_Others.setTitle(_translate("VectorPropertiesWidget", "Other Options"))
         self.checkBox_Visible.setText(_translate("VectorPropertiesWidget", "Visible on load"))
+        self.checkBox_BinaryBlocks.setToolTip(_translate("VectorPropertiesWidget", "Feature coordinates are written in binary format, which is smaller and faster to load than JSON"))
+        self.checkBox_BinaryBlocks.setText(_translate("VectorPropertiesWidget", "Write blocks in binary format"))
+        self.checkBox_SpatialOrder.setToolTip(_translate("VectorPropertiesWidget", "Features are sorted along a Hilbert curve so that features in each block are close to each other. Features are read twice"))
+        self.checkBox_SpatialOrder.setText(_translate("VectorPropertiesWidget", "Group nearby features into blocks"))
+        self.label_BlockVertices.setText(_translate("VectorPropertiesWidget", "Vertices per block"))
+        self.comboBox_BlockVertices.setToolTip(_translate("VectorPropertiesWidget", "A block of features is closed when the number of vertices reaches this count"))
+        self.label_BlockSize.setText(_translate("VectorPropertiesWidget", "Block size"))
+        self.comboBox_BlockSize.setToolTip(_translate("VectorPropertiesWidget", "A block of features is closed when its estimated data size reaches this size"))
+        self.label_GeometryThreads.setText(_translate("VectorPropertiesWidget", "Worker threads"))
+        self.spinBox_GeometryThreads.setToolTip(_translate("VectorPropertiesWidget", "Number of threads which convert feature geometries in parallel. 0 to convert them on the main thread"))
+        self.label_ImageFormat.setText(_translate("VectorPropertiesWidget", "Image format"))
+        self.comboBox_ImageFormat.setToolTip(_translate("VectorPropertiesWidget", "Format of image files of materials, e.g. rendered overlay textures"))
+        self.spinBox_ImageQuality.setToolTip(_translate("VectorPropertiesWidget", "JPEG/WebP quality (not used for PNG)"))
 
 from qgis.gui import QgsFieldExpressionWidget
@@ -19,10 +19,11 @@
  *                                                                         *
  ***************************************************************************/
 """
+import numpy
 from qgis.core import QgsWkbTypes
 
 from Qgis2threejs.stylewidget import StyleWidget, ColorWidgetFunc, OptionalColorWidgetFunc, ColorTextureWidgetFunc
-from Qgis2threejs.geometry import IndexedTriangles2D, IndexedTriangles3D
+from Qgis2threejs.geometry import CoordinateList, IndexedTriangles2D, IndexedTriangles3D
 
 
 _objectTypeRegistry = None
@@ -112,7 +113,7 @@ class SphereType(PointBasicTypeBase):
 
   @classmethod
   def geometry(cls, settings, layer, feat, geom):
-    return {"pts": geom.asList(),
+    return {"pts": geom.asCoordinateList(),
             "r": feat.values[2] * settings.mapTo3d().multiplier}
 
 
@@ -130,7 +131,7 @@ class CylinderType(PointBasicTypeBase):
   def geometry(cls, settings, layer, feat, geom):
     mapTo3d = settings.mapTo3d()
     r = feat.values[2] * mapTo3d.multiplier
-    return {"pts": geom.asList(),
+    return {"pts": geom.asCoordinateList(),
             "r": r,
             "h": feat.values[3] * mapTo3d.multiplierZ}
 
@@ -155,7 +156,7 @@ class BoxType(PointBasicTypeBase):
   @classmethod
   def geometry(cls, settings, layer, feat, geom):
     mapTo3d = settings.mapTo3d()
-    return {"pts": geom.asList(),
+    return {"pts": geom.asCoordinateList(),
             "w": feat.values[2] * mapTo3d.multiplier,
             "d": feat.values[3] * mapTo3d.multiplier,
             "h": feat.values[4] * mapTo3d.multiplierZ}
@@ -184,7 +185,7 @@ class DiskType(PointBasicTypeBase):
     if rotation:
       dd = (dd + rotation) % 360
 
-    return {"pts": geom.asList(),
+    return {"pts": geom.asCoordinateList(),
             "r": feat.values[2] * settings.mapTo3d().multiplier,
             "d": feat.values[3],
             "dd": dd}
@@ -214,7 +215,7 @@ class PlaneType(PointBasicTypeBase):
     if rotation:
       dd = (dd + rotation) % 360
 
-    return {"pts": geom.asList(),
+    return {"pts": geom.asCoordinateList(),
             "w": feat.values[2] * settings.mapTo3d().multiplier,
             "l": feat.values[3] * settings.mapTo3d().multiplier,
             "d": feat.values[4],
@@ -248,7 +249,7 @@ class LineType(LineBasicTypeBase):
 
   @classmethod
   def geometry(cls, settings, layer, feat, geom):
-    return {"lines": geom.asList()}
+    return {"lines": geom.asCoordinateList()}
 
 
 class PipeType(LineBasicTypeBase):
@@ -267,7 +268,7 @@ class PipeType(LineBasicTypeBase):
   @classmethod
   def geometry(cls, settings, layer, feat, geom):
     r = feat.values[2] * settings.mapTo3d().multiplier
-    return {"lines": geom.asList(),
+    return {"lines": geom.asCoordinateList(),
             "r": r}
 
 
@@ -294,7 +295,7 @@ class BoxLineType(LineBasicTypeBase):
   @classmethod
   def geometry(cls, settings, layer, feat, geom):
     multiplier = settings.mapTo3d().multiplier
-    return {"lines": geom.asList(),
+    return {"lines": geom.asCoordinateList(),
             "w": feat.values[2] * multiplier,
             "h": feat.values[3] * multiplier}
 
@@ -314,7 +315,7 @@ class ProfileType(LineBasicTypeBase):
 
   @classmethod
   def geometry(cls, settings, layer, feat, geom):
-    return {"lines": geom.asList(),
+    return {"lines": geom.asCoordinateList(),
             "bh": feat.values[2] * settings.mapTo3d().multiplierZ}
 
 
@@ -323,8 +324,8 @@ class PolygonBasicTypeBase(PolygonTypeBase):
 
   @classmethod
   def geometry(cls, settings, layer, feat, geom):
-    return {"polygons": [[[[pt.x, pt.y] for pt in bnd] for bnd in poly] for poly in geom.polygons],
-            "centroids": [[pt.x, pt.y, pt.z] for pt in geom.centroids]}
+    return {"polygons": geom.asCoordinateList2(),
+            "centroids": CoordinateList(geom.centroids)}
 
 
 class ExtrudedType(PolygonBasicTypeBase):
@@ -393,19 +394,20 @@ class OverlayType(PolygonBasicTypeBase):
       for polygon in geom.polygons:
         boundary = polygon[0]
         if len(polygon) == 1 and len(boundary) == 4:
+          boundary = boundary.tolist()
           triangles.addTriangle(boundary[0], boundary[2], boundary[1])    # vertex order should be counter-clockwise
         else:
-          bnds = [[[pt.x, pt.y, pt.z] for pt in bnd] for bnd in polygon]
-          polygons.append(bnds)
+          polygons.append(polygon)
 
       if triangles.vertices:
-        g["triangles"] = {"v": [[pt.x, pt.y, pt.z] for pt in triangles.vertices], "f": triangles.faces}
+        g["triangles"] = {"v": CoordinateList(numpy.array(triangles.vertices, dtype=float)),
+                          "f": numpy.array(triangles.faces, dtype=numpy.uint32)}
 
       if polygons:
-        g["split_polygons"] = polygons
+        g["split_polygons"] = CoordinateList.fromArrays(polygons)
 
-      if geom.centroids:
-        g["centroids"] = [[pt.x, pt.y, pt.z] for pt in geom.centroids]
+      if len(geom.centroids):
+        g["centroids"] = CoordinateList(geom.centroids)
 
     else:
       g = PolygonBasicTypeBase.geometry(settings, layer, feat, geom)
@@ -435,20 +437,13 @@ class TriangularMeshType(PolygonBasicTypeBase):
   def geometry(cls, settings, layer, feat, geom):
     triangles = IndexedTriangles3D()
     for polygon in geom.polygons:
-      boundary = polygon[0]
+      boundary = polygon[0][:3].tolist()
       triangles.addTriangle(boundary[0], boundary[1], boundary[2])
 
-    v = []
-    for pt in triangles.vertices:
-      v.extend([pt.x, pt.y, pt.z])
-
-    f = []
-    for s in triangles.faces:
-      f.extend(s)
-
-    g = {"v": v, "f": f}
-    if geom.centroids:
-      g["centroids"] = [[pt.x, pt.y, pt.z] for pt in geom.centroids]
+    g = {"v": CoordinateList(numpy.array(triangles.vertices, dtype=float).reshape(-1, 3), flat=True),
+         "f": numpy.array(triangles.faces, dtype=numpy.uint32).ravel()}
+    if len(geom.centroids):
+      g["centroids"] = CoordinateList(geom.centroids)
     return g
 
 
@@ -474,7 +469,7 @@ class IconType(PointTypeBase):
 
   @classmethod
   def geometry(cls, settings, layer, feat, geom):
-    return {"pts": geom.asList(),
+    return {"pts": geom.asCoordinateList(),
             "scale": feat.values[2]}
 
 
@@ -510,7 +505,7 @@ class ModelFileType(PointTypeBase):
     if rotation:
       rz = (rz - rotation) % 360    # map rotation is clockwise
 
-    return {"pts": geom.asList(),
+    return {"pts": geom.asCoordinateList(),
             "rotateX": feat.values[2],
             "rotateY": feat.values[3],
             "rotateZ": rz,